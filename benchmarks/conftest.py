@@ -0,0 +1,14 @@
+"""Benchmarks configuration.
+
+The benchmarks use pytest-benchmark (see `requirements-benchmark.txt`); run them with:
+
+    pytest benchmarks/
+
+The service is imported with placeholder environment variables (unless already set); no benchmark here reaches Valhalla (the transport benchmarks request the stub).
+"""
+
+import os
+
+os.environ.setdefault('FLASK_APP', 'transport_service')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ.setdefault('VALHALLA_URL', 'http://localhost:8002')
@@ -0,0 +1,356 @@
+"""Load test of the service against the local Valhalla stub.
+
+The service runs under gunicorn (as in the container), pointing to a Valhalla stub (`valhalla_stub.py`) started in-process. A number of concurrent clients replay a weighted mix of routing, isochrone and map matching requests for a fixed duration; the report includes the throughput and the latency percentiles of each scenario, the CPU time of the service per request and its memory.
+
+With `--adaptive-limit`, the adaptive concurrency limit of the requests to Valhalla is enabled, and its value (per worker) is sampled every second from `/metrics`, to follow its convergence.
+
+The report can be saved as a baseline, and later runs compared against it; the comparison fails (exit status 1) when a metric regresses by more than the tolerance.
+
+Usage:
+
+    python benchmarks/loadtest.py --duration 30 --concurrency 16 --save-baseline benchmarks/baseline.json
+    python benchmarks/loadtest.py --duration 30 --concurrency 16 --baseline benchmarks/baseline.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import argparse
+import platform
+import threading
+import subprocess
+import requests
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from valhalla_stub import StubConfig, serve
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CENTER = (37.983841, 23.735741)
+
+
+def _point(rng: random.Random, spread: float=0.1) -> dict:
+    return {"lat": round(CENTER[0] + rng.uniform(-spread, spread), 6), "lon": round(CENTER[1] + rng.uniform(-spread, spread), 6)}
+
+
+def _trace(rng: random.Random) -> list:
+    start = _point(rng)
+    heading = rng.uniform(0, 6.28)
+    shape = []
+    for i in range(rng.randint(50, 500)):
+        heading += rng.gauss(0, 0.2)
+        start = {"lat": round(start["lat"] + 1e-4 * math.sin(heading), 6), "lon": round(start["lon"] + 1e-4 * math.cos(heading), 6)}
+        shape.append({**start, "time": i * 5})
+    shape[0]["type"] = shape[-1]["type"] = "break"
+    return shape
+
+
+def route_auto(rng):
+    locations = [_point(rng) for _ in range(rng.randint(2, 4))]
+    locations[0]["city"] = "Athens"
+    return 'POST', '/route/auto', {"json": {"locations": locations, "units": "kilometers", "use_tolls": 0.2, "toll_booth_penalty": 100}}
+
+
+def route_truck(rng):
+    locations = [{**_point(rng), "radius": 20, "side": {"preferred_side": "same"}} for _ in range(rng.randint(2, 4))]
+    return 'POST', '/route/truck', {"json": {"locations": locations, "weight": 12.5, "height": 3.8, "hazmat": rng.random() < 0.2, "language": "el-GR"}}
+
+
+def isochrone(rng):
+    point = _point(rng)
+    return 'GET', '/isoline/isochrone', {"params": [("lat", point["lat"]), ("lon", point["lon"]), ("costing", "auto"), ("range-0", 10), ("range-1", 20), ("range-2", 30), ("polygons", "true")]}
+
+
+def trace_route(rng):
+    return 'POST', '/map_matching/trace_route', {"json": {"shape": _trace(rng), "costing": "auto", "shape_match": "map_snap"}}
+
+
+def trace_attributes(rng):
+    return 'POST', '/map_matching/trace_attributes', {"json": {"shape": _trace(rng), "costing": "bicycle", "filters": ["edge.names", "edge.length", "edge.speed", "matched.point"]}}
+
+
+SCENARIOS = {
+    'route_auto': (route_auto, 30),
+    'route_truck': (route_truck, 10),
+    'isochrone': (isochrone, 25),
+    'trace_route': (trace_route, 20),
+    'trace_attributes': (trace_attributes, 15)
+}
+"""dict: Request generator and weight of each scenario."""
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait(url: str, service: subprocess.Popen, timeout: float=30.):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if service.poll() is not None:
+            raise RuntimeError('Service exited with status {}.'.format(service.returncode))
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError('Service did not start in {} seconds.'.format(timeout))
+
+
+def _processes(pid: int) -> list:
+    parent = psutil.Process(pid)
+    return [parent] + parent.children(recursive=True)
+
+
+def _cpu(pid: int) -> float:
+    total = 0.
+    for process in _processes(pid):
+        try:
+            times = process.cpu_times()
+            total += times.user + times.system
+        except psutil.NoSuchProcess:
+            pass
+    return total
+
+
+def _memory(pid: int) -> dict:
+    rss, uss = 0, 0
+    for process in _processes(pid):
+        try:
+            info = process.memory_full_info()
+            rss += info.rss
+            uss += info.uss
+        except psutil.NoSuchProcess:
+            pass
+    return {"rss_mb": round(rss / 2 ** 20, 1), "uss_mb": round(uss / 2 ** 20, 1)}
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def _client(base_url: str, seed: int, deadline: float, warmup_until: float, results: list):
+    rng = random.Random(seed)
+    names = list(SCENARIOS.keys())
+    weights = [SCENARIOS[name][1] for name in names]
+    session = requests.Session()
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        name = rng.choices(names, weights)[0]
+        method, path, kwargs = SCENARIOS[name][0](rng)
+        start = time.perf_counter()
+        try:
+            status = session.request(method, base_url + path, timeout=60, **kwargs).status_code
+        except requests.RequestException:
+            status = None
+        elapsed = time.perf_counter() - start
+        if now >= warmup_until:
+            results.append((name, elapsed, status))
+
+
+def _sample_limits(base_url: str, deadline: float, samples: list):
+    start = time.monotonic()
+    while time.monotonic() < deadline:
+        try:
+            # A new connection each time, to sample any worker
+            text = requests.get(base_url + '/metrics', timeout=5).text
+        except requests.RequestException:
+            text = ''
+        for line in text.splitlines():
+            if line.startswith('valhalla_concurrency_limit{'):
+                pid = line.split('pid="', 1)[1].split('"', 1)[0]
+                samples.append({"t": round(time.monotonic() - start, 1), "pid": int(pid), "limit": float(line.rsplit(' ', 1)[1])})
+        time.sleep(1)
+
+
+def run(duration: float=30., warmup: float=5., concurrency: int=16, workers: int=4, threads: int=1, stub: StubConfig=None, preload: bool=False, seed: int=0, adaptive_limit: bool=False) -> dict:
+    """Run the load test.
+
+    Arguments:
+        duration (float): Duration of the measurement in seconds.
+        warmup (float): Duration of the warm-up (not measured) in seconds.
+        concurrency (int): Number of concurrent clients.
+        workers (int): Number of gunicorn workers.
+        threads (int): Number of threads per gunicorn worker.
+        stub (StubConfig): The Valhalla stub configuration.
+        preload (bool): Whether to preload the app in the gunicorn master.
+        seed (int): Seed of the request generators.
+        adaptive_limit (bool): Whether to enable (and sample) the adaptive concurrency limit of the requests to Valhalla.
+
+    Returns:
+        (dict) The report.
+    """
+    stub = stub or StubConfig(seed=seed)
+    stub_port, port = _free_port(), _free_port()
+    stub_server = serve(stub_port, stub)
+    threading.Thread(target=stub_server.serve_forever, daemon=True).start()
+
+    env = {
+        **os.environ,
+        'FLASK_APP': 'transport_service',
+        'SECRET_KEY': 'loadtest',
+        'VALHALLA_URL': 'http://127.0.0.1:{}'.format(stub_port),
+        'PRELOAD': 'true' if preload else 'false',
+        'VALHALLA_ADAPTIVE_LIMIT': 'true' if adaptive_limit else 'false',
+        'METRICS': 'true' if adaptive_limit else os.environ.get('METRICS', 'false'),
+        'PYTHONPATH': ROOT + os.pathsep + os.environ.get('PYTHONPATH', '')
+    }
+    command = [sys.executable, '-c', 'from gunicorn.app.wsgiapp import run; run()', '--workers', str(workers), '--threads', str(threads), '--bind', '127.0.0.1:{}'.format(port), '--log-level', 'warning']
+    if preload:
+        command.append('--preload')
+    service = subprocess.Popen(command + ['transport_service:create_app()'], cwd=ROOT, env=env)
+    base_url = 'http://127.0.0.1:{}'.format(port)
+    try:
+        _wait(base_url + '/health', service)
+        results = []
+        start = time.monotonic()
+        warmup_until, deadline = start + warmup, start + warmup + duration
+        clients = [threading.Thread(target=_client, args=(base_url, seed + i, deadline, warmup_until, results)) for i in range(concurrency)]
+        limits = []
+        if adaptive_limit:
+            clients.append(threading.Thread(target=_sample_limits, args=(base_url, deadline, limits)))
+        for client in clients:
+            client.start()
+        time.sleep(max(0., warmup_until - time.monotonic()))
+        cpu_start = _cpu(service.pid)
+        for client in clients:
+            client.join()
+        cpu = _cpu(service.pid) - cpu_start
+        memory = _memory(service.pid)
+    finally:
+        service.terminate()
+        service.wait(timeout=30)
+        stub_server.shutdown()
+
+    scenarios = {}
+    for name in SCENARIOS:
+        latencies = [elapsed * 1000 for scenario, elapsed, _ in results if scenario == name]
+        errors = sum(1 for scenario, _, status in results if scenario == name and status != 200)
+        scenarios[name] = {
+            "requests": len(latencies),
+            "errors": errors,
+            "throughput": round(len(latencies) / duration, 2),
+            "p50_ms": round(_percentile(latencies, 50), 2) if latencies else None,
+            "p95_ms": round(_percentile(latencies, 95), 2) if latencies else None,
+            "p99_ms": round(_percentile(latencies, 99), 2) if latencies else None
+        }
+    latencies = [elapsed * 1000 for _, elapsed, _ in results]
+    report = {
+        "config": {
+            "duration": duration, "concurrency": concurrency, "workers": workers, "threads": threads, "preload": preload, "seed": seed, "adaptive_limit": adaptive_limit,
+            "stub": {"latency_median": stub.latency_median, "latency_sigma": stub.latency_sigma, "size_median": stub.size_median, "size_sigma": stub.size_sigma},
+            "machine": {"python": platform.python_version(), "cpus": os.cpu_count(), "platform": platform.platform()}
+        },
+        "total": {
+            "requests": len(results),
+            "errors": sum(1 for _, _, status in results if status != 200),
+            "throughput": round(len(results) / duration, 2),
+            "p50_ms": round(_percentile(latencies, 50), 2) if latencies else None,
+            "p95_ms": round(_percentile(latencies, 95), 2) if latencies else None,
+            "p99_ms": round(_percentile(latencies, 99), 2) if latencies else None,
+            "cpu_ms_per_request": round(1000 * cpu / len(results), 3) if results else None,
+            **memory
+        },
+        "scenarios": scenarios
+    }
+    if adaptive_limit:
+        report["limits"] = limits
+    return report
+
+
+HIGHER_IS_WORSE = ['p50_ms', 'p95_ms', 'p99_ms', 'cpu_ms_per_request', 'rss_mb']
+LOWER_IS_WORSE = ['throughput']
+
+def compare(report: dict, baseline: dict, tolerance: float=0.2) -> list:
+    """Compare a report against a baseline.
+
+    Arguments:
+        report (dict): The report of the current run.
+        baseline (dict): The baseline report.
+        tolerance (float): The relative change of a metric considered a regression.
+
+    Returns:
+        (list) The regressions, as messages.
+    """
+    regressions = []
+    pairs = [('total', report['total'], baseline['total'])] + [(name, report['scenarios'][name], baseline['scenarios'][name]) for name in report['scenarios'] if name in baseline.get('scenarios', {})]
+    for name, current, base in pairs:
+        if current['errors'] > 0 and base['errors'] == 0:
+            regressions.append('{}.errors: 0 -> {}'.format(name, current['errors']))
+        for metric in HIGHER_IS_WORSE + LOWER_IS_WORSE:
+            if current.get(metric) is None or not base.get(metric):
+                continue
+            change = (current[metric] - base[metric]) / base[metric]
+            if (metric in HIGHER_IS_WORSE and change > tolerance) or (metric in LOWER_IS_WORSE and change < -tolerance):
+                regressions.append('{}.{}: {} -> {} ({:+.0%})'.format(name, metric, base[metric], current[metric], change))
+    return regressions
+
+
+def _print(report: dict):
+    columns = ['requests', 'errors', 'throughput', 'p50_ms', 'p95_ms', 'p99_ms']
+    print('{:<18}'.format('scenario') + ''.join('{:>12}'.format(column) for column in columns))
+    for name, metrics in list(report['scenarios'].items()) + [('total', report['total'])]:
+        print('{:<18}'.format(name) + ''.join('{:>12}'.format(str(metrics[column])) for column in columns))
+    total = report['total']
+    print('CPU per request: {} ms, RSS: {} MB, USS: {} MB'.format(total['cpu_ms_per_request'], total['rss_mb'], total['uss_mb']))
+    if report.get('limits'):
+        last = {}
+        for sample in report['limits']:
+            last[sample['pid']] = sample['limit']
+        print('Final concurrency limits: ' + ', '.join('{}={}'.format(pid, limit) for pid, limit in sorted(last.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--duration', type=float, default=30., help='Duration of the measurement in seconds.')
+    parser.add_argument('--warmup', type=float, default=5., help='Duration of the warm-up in seconds.')
+    parser.add_argument('--concurrency', type=int, default=16, help='Number of concurrent clients.')
+    parser.add_argument('--workers', type=int, default=4, help='Number of gunicorn workers.')
+    parser.add_argument('--threads', type=int, default=1, help='Number of threads per gunicorn worker.')
+    parser.add_argument('--preload', action='store_true', help='Preload the app in the gunicorn master.')
+    parser.add_argument('--latency-median', type=float, default=20., help='Median latency of the Valhalla stub in milliseconds.')
+    parser.add_argument('--latency-sigma', type=float, default=0.5)
+    parser.add_argument('--size-median', type=int, default=50, help='Median size of the Valhalla stub responses.')
+    parser.add_argument('--size-sigma', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--adaptive-limit', action='store_true', help='Enable the adaptive concurrency limit of the requests to Valhalla, and sample it.')
+    parser.add_argument('--output', help='Write the report (JSON) to this file.')
+    parser.add_argument('--save-baseline', help='Write the report as baseline to this file.')
+    parser.add_argument('--baseline', help='Compare the report against the baseline in this file.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Relative change of a metric considered a regression.')
+    args = parser.parse_args()
+
+    stub = StubConfig(args.latency_median, args.latency_sigma, args.size_median, args.size_sigma, seed=args.seed)
+    report = run(args.duration, args.warmup, args.concurrency, args.workers, args.threads, stub=stub, preload=args.preload, seed=args.seed, adaptive_limit=args.adaptive_limit)
+    _print(report)
+    for path in [args.output, args.save_baseline]:
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['config']['machine'] != report['config']['machine']:
+            print('Warning: the baseline was recorded on a different machine.')
+        regressions = compare(report, baseline, tolerance=args.tolerance)
+        if regressions:
+            print('Regressions against {}:'.format(args.baseline))
+            for regression in regressions:
+                print('  ' + regression)
+            sys.exit(1)
+        print('No regressions against {}.'.format(args.baseline))
+
+
+if __name__ == '__main__':
+    main()
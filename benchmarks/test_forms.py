@@ -0,0 +1,72 @@
+"""Benchmarks of request validation: WTForms forms against the compiled forms."""
+
+import pytest
+from flask import Flask
+from transport_service.api.forms.compiled import compile_form
+from transport_service.api.forms.routing import TruckForm
+from transport_service.api.forms.mapmatch import TraceRouteBodyForm
+
+app = Flask(__name__)
+app.config['SECRET_KEY'] = 'benchmark'
+
+
+def _route_payload(n):
+    return {
+        "locations": [{"lat": 37.9 + i * 1e-3, "lon": 23.7 + i * 1e-3, "type": "break", "radius": 10, "side": {"preferred_side": "same"}} for i in range(n)],
+        "language": "el-GR",
+        "units": "miles",
+        "toll_booth_penalty": 100,
+        "use_tolls": 0.5,
+        "weight": 10.5,
+        "hazmat": True
+    }
+
+
+def _trace_payload(n):
+    return {
+        "shape": [{"lat": 37.9 + i * 1e-5, "lon": 23.7 + i * 1e-5, "time": i, "type": "via"} for i in range(n)],
+        "costing": "bicycle",
+        "gps_accuracy": 5
+    }
+
+
+def _wtforms(Form, payload):
+    with app.test_request_context(method='POST', json=payload):
+        form = Form()
+        form.validate_on_submit()
+        return form.data, form.errors
+
+
+@pytest.mark.parametrize('n', [2, 20, 200])
+def test_route_wtforms(benchmark, n):
+    payload = _route_payload(n)
+    benchmark.group = 'route-{}'.format(n)
+    data, errors = benchmark(_wtforms, TruckForm, payload)
+    assert not errors
+
+
+@pytest.mark.parametrize('n', [2, 20, 200])
+def test_route_compiled(benchmark, n):
+    payload = _route_payload(n)
+    compiled = compile_form(TruckForm)
+    benchmark.group = 'route-{}'.format(n)
+    data, errors = benchmark(compiled.validate, payload)
+    assert errors is None
+    assert (data, {}) == _wtforms(TruckForm, payload)
+
+
+@pytest.mark.parametrize('n', [100, 10000])
+def test_trace_wtforms(benchmark, n):
+    payload = _trace_payload(n)
+    benchmark.group = 'trace-{}'.format(n)
+    data, errors = benchmark(_wtforms, TraceRouteBodyForm, payload)
+    assert not errors
+
+
+@pytest.mark.parametrize('n', [100, 10000])
+def test_trace_compiled(benchmark, n):
+    payload = _trace_payload(n)
+    compiled = compile_form(TraceRouteBodyForm)
+    benchmark.group = 'trace-{}'.format(n)
+    data, errors = benchmark(compiled.validate, payload)
+    assert errors is None
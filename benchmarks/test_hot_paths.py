@@ -0,0 +1,158 @@
+"""Benchmarks of the request-shaping hot paths, over synthetic inputs of 10 to 100k points / locations."""
+
+import io
+import copy
+import random
+import pytest
+from flask import Flask
+from werkzeug.datastructures import FileStorage
+from wtforms.validators import ValidationError
+from transport_service.api.requests.routing import _dropNones, _flattenLocations, _prepare_parameters
+from transport_service.api.requests.mapmatch import _readShape
+from transport_service.api.forms.validators import ListForm, JSONForm, SomeOf, ShapeCSV
+from transport_service.api.forms.routing import LocationsForm, SideParameters
+from transport_service.api.forms.mapmatch import ShapeFormWithType, filters_enum
+from transport_service.api.valhalla import Valhalla
+from transport_service.api.regions import RegionIndex
+from transport_service.api.coverage import Coverage
+
+SIZES = [10, 1000, 100000]
+
+app = Flask(__name__)
+app.config['SECRET_KEY'] = 'benchmark'
+
+
+class _Field:
+    def __init__(self, data):
+        self.data = data
+
+
+def _locations(n):
+    rng = random.Random(n)
+    return [{
+        "lat": 37.9 + rng.random() * 0.1,
+        "lon": 23.7 + rng.random() * 0.1,
+        "type": "break" if i in (0, n - 1) else "via",
+        "heading": None,
+        "radius": rng.choice([None, 10]),
+        "side": {"preferred_side": "same", "display_lat": None, "display_lon": None},
+        "search_filter": None,
+        "name": None
+    } for i in range(n)]
+
+
+def _shape(n):
+    rng = random.Random(n)
+    return [{"lat": 37.9 + rng.random() * 0.1, "lon": 23.7 + rng.random() * 0.1, "time": i, "type": "via"} for i in range(n)]
+
+
+def _run(benchmark, n, function, make_args):
+    """Benchmark a function on fresh arguments in each round (the functions may mutate them)."""
+    rounds = 3 if n >= 100000 else (20 if n >= 1000 else 200)
+    benchmark.group = '{}-{}'.format(function.__name__, n)
+    return benchmark.pedantic(function, setup=lambda: (make_args(), {}), rounds=rounds)
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_drop_nones(benchmark, n):
+    locations = _locations(n)
+    result = _run(benchmark, n, _dropNones, lambda: (locations,))
+    assert len(result) == n
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_flatten_locations(benchmark, n):
+    locations = _dropNones(_locations(n))
+    result = _run(benchmark, n, _flattenLocations, lambda: (copy.deepcopy(locations),))
+    assert 'preferred_side' in result[0]
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_prepare_parameters(benchmark, n):
+    data = {"locations": _locations(n), "units": "kilometers", "language": "en-US", "directions_type": "instructions", "date_time": None, "use_tolls": 0.5, "top_speed": None}
+    locations, directions_options, _ = _run(benchmark, n, _prepare_parameters, lambda: (copy.deepcopy(data),))
+    assert len(locations) == n and 'date_time' not in directions_options
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_read_shape_csv(benchmark, n):
+    content = ('lat,lon,time,type\n' + ''.join('{lat},{lon},{time},{type}\n'.format(**point) for point in _shape(n))).encode()
+    def make_file():
+        file = FileStorage(io.BytesIO(content), filename='shape.csv', content_type='text/csv')
+        ShapeCSV()(None, _Field(file))
+        return (file,)
+    result = _run(benchmark, n, _readShape, make_file)
+    assert len(result) == n
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_list_form(benchmark, n):
+    validator = ListForm(ShapeFormWithType)
+    shape = _shape(n)
+    def list_form(field):
+        with app.app_context():
+            validator(None, field)
+    _run(benchmark, n, list_form, lambda: (_Field(shape),))
+
+
+@pytest.mark.parametrize('n', [10, 1000])
+def test_list_form_nested(benchmark, n):
+    """ListForm of locations, each one validating its `side` with JSONForm."""
+    validator = ListForm(LocationsForm)
+    locations = _dropNones(_locations(n))
+    def list_form_nested(field):
+        with app.app_context():
+            validator(None, field)
+    _run(benchmark, n, list_form_nested, lambda: (_Field(locations),))
+
+
+def test_json_form(benchmark):
+    validator = JSONForm(SideParameters)
+    def json_form(field):
+        with app.app_context():
+            validator(None, field)
+    _run(benchmark, 1, json_form, lambda: (_Field({"preferred_side": "opposite", "display_lat": 37.9, "display_lon": 23.7, "node_snap_tolerance": 5}),))
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_some_of(benchmark, n):
+    validator = SomeOf(filters_enum)
+    filters = [filters_enum[i % len(filters_enum)] for i in range(n)]
+    def some_of(field):
+        validator(None, field)
+    _run(benchmark, n, some_of, lambda: (_Field(filters),))
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_create_contours(benchmark, n):
+    valhalla = Valhalla(url='http://localhost:8002')
+    range_ = list(range(1, n + 1))
+    color = ['ff0000'] * (n // 2)
+    def create_contours(range_, color):
+        return valhalla._createCountours('time', range_, color)
+    result = _run(benchmark, n, create_contours, lambda: (range_, color))
+    assert len(result) == n
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_locate_region(benchmark, n):
+    """The region of a shape, among 100 regions (a grid of complex polygons)."""
+    from shapely.geometry import Point
+    polygons = [Point(i % 10, i // 10).buffer(0.5, quad_segs=256) for i in range(100)]
+    polygons[88] = Point(23.75, 37.95).buffer(0.5, quad_segs=256)
+    regions = RegionIndex([str(i) for i in range(100)], polygons, ['http://{}:8002'.format(i) for i in range(100)])
+    shape = _shape(n)
+    def locate_region(data):
+        return regions.backend(data)
+    assert _run(benchmark, n, locate_region, lambda: ({'shape': shape},)) == 'http://88:8002'
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_check_coverage(benchmark, n):
+    """The coverage check of a shape, against a complex coverage polygon."""
+    from shapely.geometry import Point
+    coverage = Coverage(Point(23.75, 37.95).buffer(1, quad_segs=4096))
+    shape = _shape(n)
+    def check_coverage(data):
+        return coverage.check(data)
+    _run(benchmark, n, check_coverage, lambda: ({'shape': shape},))
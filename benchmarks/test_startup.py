@@ -0,0 +1,31 @@
+"""Benchmarks of the startup: app creation in a fresh interpreter, and the first documentation request."""
+
+import os
+import sys
+import subprocess
+import pytest
+
+CREATE_APP = "import transport_service; transport_service.create_app()"
+FIRST_SPEC = "import transport_service; transport_service.create_app().test_client().get('/')"
+
+
+def _run(code, **env):
+    subprocess.run([sys.executable, '-c', code], env={**os.environ, **env}, check=True, capture_output=True)
+
+
+@pytest.mark.parametrize('preload', ['false', 'true'])
+def test_create_app(benchmark, preload):
+    benchmark.group = 'create_app'
+    benchmark.pedantic(_run, args=(CREATE_APP,), kwargs={'PRELOAD': preload}, rounds=5, warmup_rounds=1)
+
+
+def test_first_spec_request(benchmark):
+    benchmark.group = 'first spec request'
+    benchmark.pedantic(_run, args=(FIRST_SPEC,), rounds=5, warmup_rounds=1)
+
+
+def test_first_spec_request_cached(benchmark, tmp_path):
+    path = str(tmp_path / 'spec.json')
+    _run(FIRST_SPEC, SPEC_CACHE=path)
+    benchmark.group = 'first spec request'
+    benchmark.pedantic(_run, args=(FIRST_SPEC,), kwargs={'SPEC_CACHE': path}, rounds=5, warmup_rounds=1)
@@ -0,0 +1,56 @@
+"""Benchmarks of the transports to a co-located Valhalla (the stub, without latency): a new TCP connection per request (as before), persistent TCP connections, and a Unix domain socket.
+
+HTTP/2 (`VALHALLA_HTTP2`) is not covered, since the stub (as Valhalla) speaks HTTP/1.1 only; it needs an HTTP/2 proxy in front of it.
+"""
+
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import requests
+from transport_service.api.backends import HTTPBackend, dumps
+from valhalla_stub import StubConfig, serve, serve_unix
+
+TRANSPORTS = ['tcp-new-connection', 'tcp', 'unix']
+
+ROUTE = {"locations": [{"lat": 37.9, "lon": 23.7}, {"lat": 38.0, "lon": 23.8}], "costing": "auto"}
+
+
+@pytest.fixture(scope='module')
+def stubs():
+    config = StubConfig(latency_median=0, size_median=20, seed=1)
+    path = os.path.join(tempfile.mkdtemp(), 'valhalla.sock')
+    servers = [serve(0, config), serve_unix(path, config)]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield {'tcp': 'http://127.0.0.1:{}'.format(servers[0].server_address[1]), 'unix': 'unix://' + path}
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _request(transport, stubs):
+    if transport == 'tcp-new-connection':
+        url = stubs['tcp'] + '/route'
+        return lambda: requests.post(url, data=dumps(ROUTE), headers={'Content-Type': 'application/json'})
+    backend = HTTPBackend(stubs[transport])
+    return lambda: backend.request('POST', 'route', ROUTE)
+
+
+@pytest.mark.parametrize('transport', TRANSPORTS)
+def test_request(benchmark, stubs, transport):
+    benchmark.group = 'transport-request'
+    request = _request(transport, stubs)
+    assert benchmark(request).status_code == 200
+
+
+@pytest.mark.parametrize('transport', TRANSPORTS)
+def test_concurrent_requests(benchmark, stubs, transport):
+    """100 requests from 8 threads."""
+    benchmark.group = 'transport-concurrent'
+    request = _request(transport, stubs)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        def run():
+            return [r.status_code for r in executor.map(lambda _: request(), range(100))]
+        assert set(benchmark(run)) == {200}
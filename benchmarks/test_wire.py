@@ -0,0 +1,61 @@
+"""Benchmarks of the wire format of the Valhalla calls: encoding the requests, decoding the responses and serializing them to the client, with the standard `json` module (as before) and with `transport_service.api.valhalla` (*orjson* if installed, and the pass-through of routing responses).
+
+The responses are synthetic long routes (maneuvers) and trace attributes (edges) of the Valhalla stub.
+"""
+
+import json
+import random
+import pytest
+from flask import Flask, make_response
+from transport_service.api.valhalla import dumps, loads
+from valhalla_stub import _trip, _trace_attributes
+
+SIZES = [100, 5000]
+
+app = Flask(__name__)
+app.config['JSON_SORT_KEYS'] = False
+
+
+def _shape(n):
+    rng = random.Random(n)
+    return [{"lat": round(37.9 + rng.random() * 0.1, 6), "lon": round(23.7 + rng.random() * 0.1, 6), "time": i, "type": "via"} for i in range(n)]
+
+
+def _route(n):
+    return json.dumps(_trip([{"lat": 37.9, "lon": 23.7}, {"lat": 38.0, "lon": 23.8}], n)).encode()
+
+
+def _attributes(n):
+    return json.dumps(_trace_attributes({"shape": _shape(n)}, n)).encode()
+
+
+@pytest.mark.parametrize('n', SIZES)
+@pytest.mark.parametrize('codec', ['json', 'service'])
+def test_encode_trace_request(benchmark, codec, n):
+    data = {"shape": _shape(n * 10), "costing": "auto", "shape_match": "map_snap", "filters": {"attributes": ["edge.names", "edge.length"], "action": "include"}}
+    benchmark.group = 'encode-trace-{}'.format(n * 10)
+    encode = (lambda data: json.dumps(data).encode()) if codec == 'json' else dumps
+    assert json.loads(benchmark(encode, data)) == data
+
+
+@pytest.mark.parametrize('n', SIZES)
+@pytest.mark.parametrize('codec', ['json', 'service'])
+def test_trace_attributes_response(benchmark, codec, n):
+    content = _attributes(n)
+    benchmark.group = 'trace-attributes-{}'.format(n)
+    decode = json.loads if codec == 'json' else loads
+    assert len(benchmark(decode, content)['edges']) == n
+
+
+@pytest.mark.parametrize('n', SIZES)
+@pytest.mark.parametrize('codec', ['json', 'service'])
+def test_route_response(benchmark, codec, n):
+    """A routing response: decoded and re-encoded to the client (before), or passed through."""
+    content = _route(n)
+    benchmark.group = 'route-{}'.format(n)
+    def respond():
+        with app.app_context():
+            if codec == 'json':
+                return make_response(json.loads(content), 200)
+            return make_response(content, 200, {'Content-Type': 'application/json'})
+    assert len(json.loads(benchmark(respond).get_data())['trip']['legs'][0]['maneuvers']) == n
@@ -0,0 +1,226 @@
+"""A local stand-in for Valhalla, with configurable latency and response size.
+
+It answers the endpoints used by the service (*route*, *isochrone*, *trace_route*, *trace_attributes*, *sources_to_targets* and *status*) with synthetic responses shaped as Valhalla's. The latency and the size of each response (number of maneuvers, contour vertices or edges) are drawn from log-normal distributions.
+
+Usage:
+
+    python benchmarks/valhalla_stub.py --port 8002 --latency-median 20 --size-median 50
+    python benchmarks/valhalla_stub.py --unix /tmp/valhalla.sock
+"""
+
+import os
+import json
+import math
+import random
+import string
+import time
+import argparse
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+class StubConfig:
+    """The distributions of the stub responses.
+
+    Attributes:
+        latency_median (float): Median latency in milliseconds.
+        latency_sigma (float): Shape (sigma) of the log-normal latency distribution.
+        size_median (int): Median number of elements (maneuvers, vertices, edges) of a response.
+        size_sigma (float): Shape (sigma) of the log-normal size distribution.
+        seed (int): Seed of the random generator.
+    """
+
+    def __init__(self, latency_median: float=20., latency_sigma: float=0.5, size_median: int=50, size_sigma: float=0.5, seed: int=None):
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.size_median = size_median
+        self.size_sigma = size_sigma
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def latency(self) -> float:
+        """Draw a latency in seconds."""
+        if self.latency_median <= 0:
+            return 0.
+        with self._lock:
+            return self._random.lognormvariate(math.log(self.latency_median), self.latency_sigma) / 1000.
+
+    def size(self) -> int:
+        """Draw a response size (number of elements)."""
+        with self._lock:
+            return max(1, int(self._random.lognormvariate(math.log(self.size_median), self.size_sigma)))
+
+
+def _shape(n: int) -> str:
+    """A placeholder encoded polyline of (about) `n` points."""
+    return ''.join(random.choice(string.ascii_letters + string.digits + '_@?') for _ in range(n * 8))
+
+
+def _trip(locations: list, size: int, units: str='kilometers') -> dict:
+    maneuvers = [{
+        "type": 1 if i == 0 else (4 if i == size - 1 else 10),
+        "instruction": "Drive along the street for {} meters.".format(100 + i),
+        "verbal_pre_transition_instruction": "Drive along the street.",
+        "street_names": ["Street {}".format(i)],
+        "time": 12.5,
+        "length": 0.215,
+        "cost": 15.1,
+        "begin_shape_index": i * 4,
+        "end_shape_index": (i + 1) * 4,
+        "travel_mode": "drive",
+        "travel_type": "car"
+    } for i in range(size)]
+    summary = {"has_time_restrictions": False, "min_lat": 37.9, "min_lon": 23.7, "max_lat": 38.1, "max_lon": 23.9, "time": 12.5 * size, "length": 0.215 * size, "cost": 15.1 * size}
+    return {"trip": {
+        "locations": [{**location, "type": location.get("type", "break"), "original_index": i} for i, location in enumerate(locations)],
+        "legs": [{"maneuvers": maneuvers, "summary": summary, "shape": _shape(size * 4)}],
+        "summary": summary,
+        "status_message": "Found route between points",
+        "status": 0,
+        "units": units,
+        "language": "en-US"
+    }}
+
+
+def _isochrone(data: dict, size: int) -> dict:
+    location = data["locations"][0]
+    features = []
+    for contour in data.get("contours", []):
+        value = contour.get("time", contour.get("distance", 10))
+        radius = 0.002 * value
+        ring = [[round(location["lon"] + radius * math.cos(2 * math.pi * k / size), 6), round(location["lat"] + radius * math.sin(2 * math.pi * k / size), 6)] for k in range(size)]
+        ring.append(ring[0])
+        geometry = {"type": "Polygon", "coordinates": [ring]} if data.get("polygons") else {"type": "LineString", "coordinates": ring}
+        features.append({"type": "Feature", "properties": {"contour": value, "color": "#" + (contour.get("color") or "bf4040"), "fill": "#bf4040", "fillOpacity": 0.33, "metric": "time" if "time" in contour else "distance"}, "geometry": geometry})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def _trace_attributes(data: dict, size: int) -> dict:
+    edges = [{"names": ["Street {}".format(i)], "length": 0.05, "speed": 40, "road_class": "residential", "begin_heading": 90, "end_heading": 91, "begin_shape_index": i, "end_shape_index": i + 1, "traversability": "both", "use": "road", "way_id": 1000 + i, "id": 2000 + i, "weighted_grade": 0.0} for i in range(size)]
+    matched_points = [{"lat": point["lat"], "lon": point["lon"], "type": "matched", "edge_index": min(i, size - 1), "distance_along_edge": 0.5, "distance_from_trace_point": 1.2} for i, point in enumerate(data.get("shape", []))]
+    return {"edges": edges, "matched_points": matched_points, "shape": _shape(size), "units": "kilometers", "admins": [{"country_code": "GR", "country_text": "Greece", "state_code": "", "state_text": "Attica"}]}
+
+
+def _matrix(data: dict) -> dict:
+    sources, targets = data.get("sources", []), data.get("targets", [])
+    return {"sources_to_targets": [[{
+        "from_index": i,
+        "to_index": j,
+        "time": int(60 * math.hypot(s["lat"] - t["lat"], s["lon"] - t["lon"]) * 100),
+        "distance": round(math.hypot(s["lat"] - t["lat"], s["lon"] - t["lon"]) * 111, 3)
+    } for j, t in enumerate(targets)] for i, s in enumerate(sources)], "units": "kilometers"}
+
+
+def respond(endpoint: str, data: dict, config: StubConfig) -> tuple:
+    """Build the stub response of an endpoint.
+
+    Returns:
+        (tuple) The response (dict) and the status code.
+    """
+    if endpoint == 'status':
+        return {"version": "3.1.4", "tileset_last_modified": 1650000000, "available_actions": ["status", "route", "sources_to_targets", "isochrone", "trace_route", "trace_attributes"]}, 200
+    if data is None:
+        return {"error_code": 100, "error": "Failed to parse json request", "status_code": 400, "status": "Bad Request"}, 400
+    if endpoint == 'route':
+        return _trip(data.get("locations", []), config.size(), data.get("units", "kilometers")), 200
+    if endpoint == 'trace_route':
+        shape = data.get("shape", [])
+        return _trip([shape[0], shape[-1]] if shape else [], config.size()), 200
+    if endpoint == 'trace_attributes':
+        return _trace_attributes(data, config.size()), 200
+    if endpoint == 'isochrone':
+        return _isochrone(data, config.size()), 200
+    if endpoint == 'sources_to_targets':
+        return _matrix(data), 200
+    return {"error_code": 106, "error": "Try any of: '/route' '/isochrone' '/trace_route' '/trace_attributes' '/sources_to_targets' '/status'", "status_code": 404, "status": "Not Found"}, 404
+
+
+def make_handler(config: StubConfig):
+    """Create the request handler class of the stub server."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _handle(self, data):
+            endpoint = urlsplit(self.path).path.strip('/')
+            time.sleep(config.latency())
+            response, status = respond(endpoint, data, config)
+            body = json.dumps(response).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            query = parse_qs(urlsplit(self.path).query)
+            try:
+                data = json.loads(query['json'][0]) if 'json' in query else {}
+            except ValueError:
+                data = None
+            self._handle(data)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                data = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                data = None
+            self._handle(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(port: int, config: StubConfig, host: str='127.0.0.1') -> ThreadingHTTPServer:
+    """Create the stub server (call `serve_forever` on the result to start it)."""
+    handler = make_handler(config)
+    # The headers and the body are written separately: without TCP_NODELAY, persistent connections stall on delayed ACKs
+    handler.disable_nagle_algorithm = True
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """An HTTP server on a Unix domain socket."""
+    daemon_threads = True
+
+
+def serve_unix(path: str, config: StubConfig) -> ThreadingUnixHTTPServer:
+    """Create the stub server on a Unix domain socket (call `serve_forever` on the result to start it)."""
+    if os.path.exists(path):
+        os.remove(path)
+    return ThreadingUnixHTTPServer(path, make_handler(config))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8002)
+    parser.add_argument('--unix', default=None, help='Listen on this Unix domain socket instead.')
+    parser.add_argument('--latency-median', type=float, default=20., help='Median latency in milliseconds (0 for no latency).')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='Shape of the log-normal latency distribution.')
+    parser.add_argument('--size-median', type=int, default=50, help='Median number of maneuvers / contour vertices / edges of a response.')
+    parser.add_argument('--size-sigma', type=float, default=0.5, help='Shape of the log-normal size distribution.')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    config = StubConfig(args.latency_median, args.latency_sigma, args.size_median, args.size_sigma, args.seed)
+    if args.unix:
+        server = serve_unix(args.unix, config)
+        print('Valhalla stub listening on unix://{}'.format(args.unix), flush=True)
+    else:
+        server = serve(args.port, config, host=args.host)
+        print('Valhalla stub listening on http://{}:{}'.format(args.host, args.port), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -35,16 +35,21 @@ fi
 num_workers="4"
 server_port="5000"
 timeout="1200"
-num_threads="1"
+num_threads="${NUM_THREADS:-1}"
 gunicorn_ssl_options=
+gunicorn_preload_options=
 if [ -n "${TLS_CERTIFICATE}" ] && [ -n "${TLS_KEY}" ]; then
     gunicorn_ssl_options="--keyfile ${TLS_KEY} --certfile ${TLS_CERTIFICATE}"
     server_port="5443"
 fi
+if [ "${PRELOAD}" = "true" ]; then
+    # Create the app (with all deferred modules and the OpenAPI specification) once, to be shared among workers
+    gunicorn_preload_options="--preload"
+fi
 
 exec gunicorn --log-config ${LOGGING_FILE_CONFIG} --access-logfile - \
   --workers ${num_workers} \
   -t ${timeout} \
   --threads ${num_threads} \
-  --bind "0.0.0.0:${server_port}" ${gunicorn_ssl_options} \
+  --bind "0.0.0.0:${server_port}" ${gunicorn_ssl_options} ${gunicorn_preload_options} \
   "transport_service:create_app()"
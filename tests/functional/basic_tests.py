@@ -1,4 +1,5 @@
 import os
+import unittest
 from transport_service import create_app
 
 # Setup/Teardown
@@ -179,3 +180,24 @@ def test_routes_1():
         assert r['trip'].get('summary') is not None
         assert r['trip'].get('status') is not None
         assert r['trip']['status'] == 0
+
+def test_embedded_backend_1():
+    """Functional - Test the embedded backend with the Valhalla Python bindings on a local tileset"""
+    from transport_service.api.backends import EmbeddedBackend, loads
+    config = os.getenv('VALHALLA_TEST_CONFIG')
+    try:
+        import valhalla
+    except ImportError:
+        raise unittest.SkipTest('The Valhalla Python bindings (pyvalhalla) are not installed.')
+    if not config:
+        raise unittest.SkipTest('No Valhalla configuration of a test tileset (VALHALLA_TEST_CONFIG).')
+    backend = EmbeddedBackend(config, actors=2)
+    res = backend.request('GET', 'status')
+    assert res.status_code == 200
+    assert loads(res.content).get('version') is not None
+    res = backend.request('POST', 'route', {"locations": routes_input['locations'], "costing": "auto"})
+    assert res.status_code == 200
+    assert loads(res.content)['trip']['status'] == 0
+    res = backend.request('POST', 'route', {"locations": [], "costing": "auto"})
+    assert res.status_code == 400
+    assert loads(res.content).get('error') is not None
@@ -28,3 +28,715 @@ def test_drop_nones():
     assert None in values
     values = list(get_all_values(_dropNones(test_data)))
     assert None not in values
+
+def test_preprocess_shape():
+    """Unit - Test trace pre-processing"""
+    from transport_service.api.preprocessing import preprocess_shape
+    shape = [
+        {"lat": 37.983841, "lon": 23.735741, "time": 0, "type": "break"},
+        {"lat": 37.983841, "lon": 23.735741, "time": 1},
+        {"lat": 37.983704, "lon": 23.735298, "time": 10},
+        {"lat": 38.083704, "lon": 23.835298, "time": 11},
+        {"lat": 37.983578, "lon": 23.734848, "time": 20},
+        {"lat": 37.983551, "lon": 23.734253, "time": 30, "type": "break"}
+    ]
+    processed, indices = preprocess_shape(shape)
+    assert indices == [0, 2, 3, 4, 5]
+    processed, indices = preprocess_shape(shape, max_speed=50)
+    assert indices == [0, 2, 4, 5]
+    assert processed == [shape[i] for i in indices]
+    processed, indices = preprocess_shape(shape, max_speed=50, simplify='douglas_peucker', tolerance=1000)
+    assert indices == [0, 5]
+    processed, indices = preprocess_shape(shape, max_speed=50, simplify='distance', tolerance=45)
+    assert indices == [0, 4, 5]
+    processed, indices = preprocess_shape(shape, simplify='distance', tolerance=0)
+    assert indices == [0, 2, 3, 4, 5]
+
+def test_preprocess_trace_request():
+    """Unit - Test trace pre-processing through the map matching endpoints"""
+    import io
+    from transport_service import create_app
+    from transport_service.api.requests import mapmatch
+    class Valhalla:
+        def traceRoute(self, shape, **kwargs):
+            return {'shape': shape}, 200
+        traceAttributes = traceRoute
+    original, mapmatch.Valhalla = mapmatch.Valhalla, Valhalla
+    try:
+        client = create_app().test_client()
+        shape = [{'lat': 37.98, 'lon': 23.73 + i * 0.0001} for i in range(50)]
+        options = {'preprocess': True, 'simplify': 'douglas_peucker', 'simplify_tolerance': 100}
+        for path in ['/map_matching/trace_route', '/map_matching/trace_attributes']:
+            r = client.post(path, json={'shape': shape, **options})
+            assert r.status_code == 200 and r.get_json()['preprocessing']['original_indices'] == [0, 49]
+        shape[20]['type'] = 'break'
+        r = client.post('/map_matching/trace_route', json={'shape': shape, **options})
+        assert r.get_json()['preprocessing']['original_indices'] == [0, 20, 49]
+        csv = b'lat,lon,time\n37.98,23.73,0\n37.98,23.7301,\n37.98,23.7302,2\n'
+        r = client.post('/map_matching/trace_route', data={'shape': (io.BytesIO(csv), 'shape.csv', 'text/csv'), 'preprocess': 'true', 'max_speed': '50'}, content_type='multipart/form-data')
+        assert r.status_code == 400 and 'shape' in r.get_json()
+    finally:
+        mapmatch.Valhalla = original
+
+def test_postprocess_isoline():
+    """Unit - Test isoline post-processing and vector tile encoding"""
+    import mapbox_vector_tile
+    from transport_service.api.postprocessing import postprocess_isoline, isoline_tile
+    ring = [[23.7 + 0.01 * i / 100, 37.9] for i in range(100)] + [[23.71, 37.91], [23.7, 37.91], [23.7, 37.9]]
+    geojson = {"type": "FeatureCollection", "features": [{"type": "Feature", "properties": {"contour": 15, "metric": "time"}, "geometry": {"type": "Polygon", "coordinates": [ring]}}]}
+    processed = postprocess_isoline(geojson, simplify=10, precision=3)
+    coordinates = processed['features'][0]['geometry']['coordinates'][0]
+    assert len(coordinates) == 5
+    assert all(round(c, 3) == c for point in coordinates for c in point)
+    assert postprocess_isoline(geojson) is geojson
+    tile = mapbox_vector_tile.decode(isoline_tile(geojson, 12, 2317, 1581))
+    assert tile['isoline']['features'][0]['properties']['contour'] == 15
+    assert len(mapbox_vector_tile.decode(isoline_tile(geojson, 12, 0, 0))['isoline']['features']) == 0
+
+def test_isoline_tile_request():
+    """Unit - Test the vector tile endpoints and the bounds of the tile coordinates"""
+    import mapbox_vector_tile
+    from transport_service import create_app
+    from transport_service.api.requests import isoline
+    ring = [[23.7, 37.9], [23.71, 37.9], [23.71, 37.91], [23.7, 37.91], [23.7, 37.9]]
+    class Valhalla:
+        def isochrone(self, **kwargs):
+            return {"type": "FeatureCollection", "features": [{"type": "Feature", "properties": {"contour": 15, "metric": "time"}, "geometry": {"type": "Polygon", "coordinates": [ring]}}]}, 200
+        isodistance = isochrone
+    original, isoline.Valhalla = isoline.Valhalla, Valhalla
+    try:
+        client = create_app().test_client()
+        query = {'lat': 37.905, 'lon': 23.705, 'range-0': 15, 'polygons': 'true'}
+        for metric in ['isochrone', 'isodistance']:
+            r = client.get('/isoline/{}/12/2317/1581.mvt'.format(metric), query_string=query)
+            assert r.status_code == 200 and r.headers['Content-Type'] == 'application/vnd.mapbox-vector-tile'
+            assert mapbox_vector_tile.decode(r.data)['isoline']['features'][0]['properties']['contour'] == 15
+            r = client.get('/isoline/{}/12/4096/0.mvt'.format(metric), query_string=query)
+            assert r.status_code == 400 and r.get_json() == {'tile': ['Tile coordinates out of range.']}
+            r = client.get('/isoline/{}/100000000/0/0.mvt'.format(metric), query_string=query)
+            assert r.status_code == 400 and 'Zoom level' in r.get_json()['tile'][0]
+        assert client.get('/isoline/isochrone/{}/0/0.mvt'.format(isoline.MAX_ZOOM), query_string=query).status_code == 200
+    finally:
+        isoline.Valhalla = original
+
+def test_isoline_store():
+    """Unit - Test precomputed isoline store"""
+    import tempfile
+    import numpy as np
+    from transport_service.api.isoline_store import build_store, IsolineStore, lattice
+    assert lattice([23.7, 37.9, 23.71, 37.91], 500).shape[0] == 6
+    def compute(profile, lat, lon):
+        features = [{"type": "Feature", "properties": {"contour": r, "metric": profile['metric']}, "geometry": {"type": "Point", "coordinates": [lon, lat]}} for r in profile['range']]
+        return {"type": "FeatureCollection", "features": features}
+    config = {"areas": [[23.7, 37.9, 23.71, 37.91]], "lattice": "hex", "spacing": 500, "profiles": [{"costing": "pedestrian", "metric": "time", "range": [10, 5]}]}
+    with tempfile.TemporaryDirectory() as path:
+        assert build_store(path, config, compute, workers=2) > 0
+        store = IsolineStore(path)
+        result = store.lookup('time', 37.9001, 23.7001, range_=[5], costing='pedestrian')
+        assert [feature['properties']['contour'] for feature in result['features']] == [5]
+        assert store.lookup('distance', 37.9001, 23.7001, range_=[5], costing='pedestrian') is None
+        assert store.lookup('time', 37.9001, 23.7001, range_=[15], costing='pedestrian') is None
+        assert store.lookup('time', 38.5, 23.7, range_=[5], costing='pedestrian') is None
+        # A store built on another tileset version is bypassed
+        from transport_service import cache
+        previous = cache._tileset_version
+        try:
+            build_store(path, config, compute, workers=2, version='1650000000')
+            store = IsolineStore(path)
+            cache._tileset_version = '1650000000'
+            assert store.lookup('time', 37.9001, 23.7001, range_=[5], costing='pedestrian') is not None
+            cache._tileset_version = '1660000000'
+            assert store.outdated() and store.lookup('time', 37.9001, 23.7001, range_=[5], costing='pedestrian') is None
+        finally:
+            cache._tileset_version = previous
+        # The grid index finds the same origin as the distances to all origins
+        assert store.nearest(38.5, 23.7) == (None, None)
+        for lat, lon in [(37.9001, 23.7001), (37.905, 23.706), (37.9102, 23.7098)]:
+            distances = np.hypot(np.radians(store.origins[:, 1] - lon) * np.cos(np.radians(lat)), np.radians(store.origins[:, 0] - lat))
+            assert store.nearest(lat, lon)[0] == int(np.argmin(distances))
+
+def test_union_isolines():
+    """Unit - Test multi-origin isoline union"""
+    from shapely.geometry import shape, box, mapping
+    from transport_service.api.union import union_isolines
+    results = [{"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"contour": 10}, "geometry": mapping(box(i, 0, i + 2, 2))},
+        {"type": "Feature", "properties": {"contour": 5}, "geometry": mapping(box(i + 0.5, 0.5, i + 1.5, 1.5))}
+    ]} for i in range(3)]
+    geojson = union_isolines(results, [5, 10], 'time', overlap=True)
+    bands = [feature for feature in geojson['features'] if 'origins' in feature['properties']]
+    assert [feature['properties']['contour'] for feature in bands] == [10, 5]
+    assert shape(bands[0]['geometry']).area == 8
+    overlaps = {feature['properties']['count']: shape(feature['geometry']).area for feature in geojson['features'] if feature['properties'].get('contour') == 10 and 'count' in feature['properties']}
+    assert overlaps == {1: 4, 2: 4}
+
+def test_optimize_order():
+    """Unit - Test stop ordering optimization"""
+    import itertools
+    import numpy as np
+    from transport_service.api.optimization import optimize_order, tour_cost
+    rng = np.random.default_rng(0)
+    points = rng.random((8, 2))
+    matrix = np.linalg.norm(points[:, None] - points[None, :], axis=-1)
+    best = min(tour_cost(matrix, [0, *p, 0]) for p in itertools.permutations(range(1, 8)))
+    order = optimize_order(matrix, roundtrip=True)
+    assert order[0] == order[-1] == 0 and sorted(order[:-1]) == list(range(8))
+    assert tour_cost(matrix, order) <= best * 1.05
+    order = optimize_order(matrix, fixed_end=True)
+    assert order[0] == 0 and order[-1] == 7 and sorted(order) == list(range(8))
+    order = optimize_order(matrix)
+    assert order[0] == 0 and sorted(order) == list(range(8))
+
+def test_compiled_form():
+    """Unit - Test compiled validation against WTForms"""
+    from flask import Flask
+    from transport_service.api.forms.compiled import compile_form
+    from transport_service.api.forms.routing import TruckForm
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'test'
+    location = {"lat": 37.9, "lon": 23.7}
+    payloads = [
+        {"locations": [location, {**location, "type": "via"}], "hazmat": True, "weight": 10},
+        {"locations": [location, {"lat": 100, "lon": 23.7}], "units": "inches"},
+        {"locations": "invalid", "use_tolls": 2},
+        {"units": "miles"}
+    ]
+    compiled = compile_form(TruckForm)
+    for payload in payloads:
+        with app.test_request_context(method='POST', json=payload):
+            form = TruckForm()
+            valid = form.validate_on_submit()
+            data, errors = compiled.validate(payload)
+            assert data == form.data
+            assert (errors or {}) == form.errors
+            assert valid == (errors is None)
+    # Unhashable filters are invalid values, as with WTForms
+    from transport_service.api.forms.mapmatch import TraceAttributesBodyForm
+    payload = {"shape": [location, location], "filters": [{"a": 1}]}
+    with app.test_request_context(method='POST', json=payload):
+        form = TraceAttributesBodyForm()
+        assert not form.validate_on_submit()
+        assert compile_form(TraceAttributesBodyForm).validate(payload)[1] == form.errors
+    # Integers overflowing (e.g. 1e999 parsed as infinity) are invalid
+    _, errors = compiled.validate({"locations": [{**location, "heading": float('inf')}, location]})
+    assert list(errors) == ['locations'] and 'Not a valid integer value' in str(errors['locations'])
+    # Ranges must be integers, and the locations of a union are bounded
+    from transport_service.api.forms.isoline import IsolineUnionForm, UNION_MAX_LOCATIONS
+    payloads = [
+        {"locations": [location], "range": [5, 10]},
+        {"locations": [location], "range": [2.5]},
+        {"locations": [location] * (UNION_MAX_LOCATIONS + 1), "range": [5]}
+    ]
+    compiled = compile_form(IsolineUnionForm)
+    for payload in payloads:
+        with app.test_request_context(method='POST', json=payload):
+            form = IsolineUnionForm()
+            valid = form.validate_on_submit()
+            data, errors = compiled.validate(payload)
+            assert (errors or {}) == form.errors
+            assert valid == (errors is None) == (payload is payloads[0])
+
+def test_costing_options_registry():
+    """Unit - Test costing forms generated from the options registry"""
+    from transport_service.api.schema import COSTING_OPTIONS
+    from transport_service.api.forms.routing import costing_forms
+    from transport_service.api.forms.compiled import compile_form
+    location = {"lat": 37.9, "lon": 23.7}
+    for costing, Form in costing_forms.items():
+        options = COSTING_OPTIONS['vehicle' if costing in ['auto', 'taxi', 'bus'] else costing]
+        compiled = compile_form(Form)
+        assert set(options).issubset(attr for attr, *_ in compiled._plan)
+        for name, schema in options.items():
+            if schema.get('maximum') is not None:
+                _, errors = compiled.validate({"locations": [location, location], name: schema['maximum'] + 1})
+                assert list(errors) == [name]
+
+class _CollectingExporter:
+    spans = []
+    def export(self, span):
+        self.spans.append(span)
+
+def test_tracing():
+    """Unit - Test tracing spans and propagation"""
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+    from transport_service import tracing
+    os.environ['TRACING_EXPORTER'] = __name__ + ':_CollectingExporter'
+    try:
+        root = tracing.Span('root', trace_id='0af7651916cd43dd8448eb211c80319c')
+        token = tracing._current.set(root)
+        with tracing.span('child') as child:
+            assert tracing.headers() == {'traceparent': '00-0af7651916cd43dd8448eb211c80319c-{}-01'.format(child.span_id)}
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                assert executor.submit(tracing.propagate(tracing.current_span)).result() is child
+        tracing._current.reset(token)
+        assert tracing.headers() == {}
+        spans = {span['name']: span for span in _CollectingExporter.spans}
+        assert spans['child']['parent_id'] == root.span_id
+        assert spans['child']['trace_id'] == root.trace_id
+    finally:
+        del os.environ['TRACING_EXPORTER']
+
+def test_persistent_cache():
+    """Unit - Test the persistent (second tier) cache"""
+    import os
+    import tempfile
+    from transport_service.cache import LRUCache, SQLiteCache, TieredCache
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'cache.sqlite')
+        cache = SQLiteCache(path, max_size=2048, namespace='v1')
+        cache.set('a', b'route' * 100, ttl=60)
+        cache.set('expired', b'route', ttl=-1)
+        assert cache.get('a') == b'route' * 100
+        assert cache.get('expired') is None
+        # Shared with other instances (e.g. workers) of the same namespace
+        assert SQLiteCache(path, namespace='v1').get('a') == b'route' * 100
+        tiered = TieredCache(LRUCache(maxsize=10), SQLiteCache(path, namespace='v1'))
+        assert tiered.get('a') == b'route' * 100
+        assert tiered.first.get('a') == b'route' * 100
+        # Bounded size: the least recently accessed entries are evicted
+        cache.max_size = 1024
+        for i in range(20):
+            cache.set(str(i), os.urandom(200), ttl=60)
+        cache.evict()
+        assert cache.get('0') is None and cache.get('19') is not None
+        # Entries of other namespaces (e.g. tileset versions) are not visible, but kept for the workers still using them
+        assert SQLiteCache(path, namespace='v2').get('19') is None
+        assert cache.get('19') is not None
+    # The in-process cache is bounded by the size of the values too
+    memory = LRUCache(maxsize=10, max_bytes=1000)
+    for i in range(4):
+        memory.set(str(i), b'x' * 300)
+    assert memory.get('0') is None and memory.get('3') is not None and memory.size == 900
+    memory.set('large', b'x' * 1001)
+    assert memory.get('large') is None and len(memory) == 3
+    # Other values (e.g. GeoJSON results) are measured by their JSON serialization
+    geojson = {'type': 'FeatureCollection', 'features': [{'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [23.7, 37.9]}}] * 20}
+    memory.set('result', (geojson, 200))
+    assert memory.get('result') is None and memory.size == 900
+    memory.set('result', ({'type': 'FeatureCollection', 'features': []}, 200))
+    assert memory.get('result') is not None and 900 < memory.size < 1000
+
+def test_stale_while_revalidate():
+    """Unit - Test stale cache entries and their background refresh"""
+    import time
+    import threading
+    from transport_service.cache import LRUCache, revalidate
+    cache = LRUCache(maxsize=10, ttl=60, grace=60)
+    cache.set('a', 1, ttl=-1)
+    assert cache.get('a') is None
+    value, expires_in = cache.lookup('a')
+    assert value == 1 and expires_in < 0
+    release = threading.Event()
+    def refresh():
+        release.wait(1)
+        cache.set('a', 2)
+    assert revalidate('a', refresh)
+    assert not revalidate('a', refresh)
+    release.set()
+    for _ in range(100):
+        if cache.get('a') == 2:
+            break
+        time.sleep(0.01)
+    assert cache.get('a') == 2
+
+def test_warmup_requests():
+    """Unit - Test reading the requests replayed to warm the caches"""
+    import os
+    import tempfile
+    from transport_service.warmup import read_requests
+    lines = [
+        '{"path": "/isoline/isochrone", "query": {"lat": 37.97, "lon": 23.72, "range-0": 10}}',
+        '127.0.0.1 - - [19/Oct/2026:10:00:00 +0000] "GET /isoline/isochrone?lat=37.97&lon=23.72&range-0=10 HTTP/1.1" 200 512',
+        '127.0.0.1 - - [19/Oct/2026:10:00:01 +0000] "POST /route/auto HTTP/1.1" 200 512',
+        '{"method": "POST", "path": "/route/auto", "json": {"locations": []}}'
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'requests.log')
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines))
+        requests = read_requests(path, top=1)
+        assert requests == [({'method': 'GET', 'path': '/isoline/isochrone', 'query': [('lat', '37.97'), ('lon', '23.72'), ('range-0', '10')], 'json': None}, 2)]
+        assert len(read_requests(path)) == 2
+
+def test_tileset_version():
+    """Unit - Test keying and invalidation of the caches by tileset version"""
+    from transport_service import cache
+    from transport_service.api.valhalla import track_tileset
+    previous = cache._tileset_version
+    try:
+        assert track_tileset({'version': '3.1.4', 'tileset_last_modified': 1650000000}) == '1650000000'
+        key = cache.make_key('route', {'costing': 'auto'})
+        cache.get_cache('route').set(key, 1)
+        assert not cache.set_tileset_version('1650000000')
+        assert cache.get_cache('route').get(key) == 1
+        assert cache.set_tileset_version('1660000000')
+        assert cache.get_cache('route').get(key) is None
+        assert cache.make_key('route', {'costing': 'auto'}) != key
+        assert track_tileset({}) is None and cache.tileset_version() == '1660000000'
+        # The health check does not track the tileset version
+        from flask import Flask
+        from transport_service.api.backends import BackendResponse
+        from transport_service.api.requests import misc
+        responses = [BackendResponse(b'{"version": "3.1.4", "tileset_last_modified": 1670000000}', 200)]
+        class Backend:
+            name = 'fake'
+            def request(self, method, endpoint, data=None, headers=None, timeout=None):
+                return responses[-1]
+        app = Flask(__name__)
+        app.register_blueprint(misc.bp)
+        get_backends, misc.get_backends = misc.get_backends, lambda: [Backend()]
+        try:
+            r = app.test_client().get('/health')
+            assert r.status_code == 200 and r.get_json() == {'status': 'OK', 'details': {'valhalla': 'OK'}}
+            responses.append(BackendResponse(b'{"error_code": 199, "error": "Unknown", "status_code": 500}', 500))
+            assert app.test_client().get('/health').get_json()['status'] == 'FAILED'
+            responses.append(BackendResponse(b'<html>Bad Gateway</html>', 502))
+            assert app.test_client().get('/health').get_json()['status'] == 'FAILED'
+        finally:
+            misc.get_backends = get_backends
+        assert cache.tileset_version() == '1660000000'
+    finally:
+        cache._tileset_version = previous
+
+def test_hedging():
+    """Unit - Test hedging of slow requests to a second replica"""
+    import os
+    import time
+    from transport_service.api.hedging import Hedger, HEDGES, HEDGE_WINS
+    os.environ['VALHALLA_HEDGE_DELAY'] = '20'
+    try:
+        hedger = Hedger()
+    finally:
+        del os.environ['VALHALLA_HEDGE_DELAY']
+    latencies = {'slow': 0.5, 'fast': 0.001}
+    def call(replica):
+        time.sleep(latencies[replica])
+        return replica, latencies[replica]
+    hedges, wins = HEDGES.get(operation='test'), HEDGE_WINS.get(operation='test')
+    assert hedger.call('test', call, ['fast', 'slow']) == ('fast', False)
+    start = time.perf_counter()
+    assert hedger.call('test', call, ['slow', 'fast']) == ('fast', True)
+    assert time.perf_counter() - start < 0.4
+    assert HEDGES.get(operation='test') == hedges + 1 and HEDGE_WINS.get(operation='test') == wins + 1
+    # The budget limits the hedges
+    hedger.budget._tokens = 0
+    assert hedger.call('test', call, ['slow', 'fast']) == ('slow', False)
+
+def test_bulkhead():
+    """Unit - Test the concurrency limit and fast rejection of a bulkhead"""
+    import threading
+    from transport_service.bulkhead import Bulkhead, BulkheadFull, REJECTED
+    bulkhead = Bulkhead('test', limit=1, queue=1, timeout=5)
+    bulkhead.acquire()
+    admitted = threading.Event()
+    def waiter():
+        bulkhead.acquire()
+        admitted.set()
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    while bulkhead.waiting == 0:
+        pass
+    rejected = REJECTED.get(**{'class': 'test'})
+    try:
+        bulkhead.acquire()
+        assert False, 'Not rejected by full bulkhead.'
+    except BulkheadFull:
+        pass
+    assert REJECTED.get(**{'class': 'test'}) == rejected + 1
+    bulkhead.release()
+    assert admitted.wait(1)
+    thread.join()
+    assert bulkhead.active == 1 and bulkhead.waiting == 0
+    bulkhead.timeout = 0.01
+    try:
+        bulkhead.acquire()
+        assert False, 'Not rejected after the queue timeout.'
+    except BulkheadFull:
+        pass
+
+def test_adaptive_limiter():
+    """Unit - Test the gradient concurrency limiter"""
+    from transport_service.api.limiter import AdaptiveLimiter, LimitExceeded
+    limiter = AdaptiveLimiter(initial=4, max_limit=50, timeout=0.01)
+    def load(latency, n=50):
+        for _ in range(n):
+            for _ in range(int(limiter.limit)):
+                limiter.acquire()
+            for _ in range(int(limiter.limit)):
+                limiter.release('route', latency)
+    load(0.01)
+    assert limiter.baseline('route') == 0.01
+    grown = limiter.limit
+    assert grown > 10
+    # Latencies far above the baseline shrink the limit
+    load(0.1)
+    assert limiter.limit < grown / 2
+    # Requests over the limit are shed
+    for _ in range(int(limiter.limit)):
+        limiter.acquire()
+    try:
+        limiter.acquire()
+        assert False, 'Not shed over the limit.'
+    except LimitExceeded:
+        pass
+    limit = limiter.limit
+    limiter.release('route', 0, success=False)
+    assert limiter.limit < limit
+
+def test_deadline():
+    """Unit - Test the request deadline and its propagation to worker threads"""
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from transport_service import deadline, tracing
+    deadline.set_timeout(0.05)
+    try:
+        deadline.check()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            budgets = list(executor.map(tracing.propagate(lambda _: deadline.remaining()), range(2)))
+            assert all(0 < budget <= 0.05 for budget in budgets)
+            assert executor.submit(deadline.remaining).result() is None
+        time.sleep(0.06)
+        try:
+            deadline.check()
+            assert False, 'Deadline not exceeded.'
+        except deadline.DeadlineExceeded:
+            pass
+    finally:
+        deadline.set_timeout(None)
+    from transport_service import create_app
+    client = create_app().test_client()
+    for value in ['nan', 'inf', '-1', '0', 'soon']:
+        r = client.get('/health', headers={deadline.HEADER: value})
+        assert r.status_code == 400 and deadline.HEADER in r.get_json()
+
+def test_embedded_backend():
+    """Unit - Test the embedded Valhalla backend, with a fake actor"""
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+    from transport_service.api.backends import EmbeddedBackend
+    from transport_service.deadline import DeadlineExceeded
+    class Actor:
+        def __init__(self, config):
+            self.config = config
+        def route(self, request):
+            request = json.loads(request)
+            if not request.get('locations'):
+                raise RuntimeError(json.dumps({'error_code': 130, 'error': 'Failed to parse locations', 'status_code': 400}))
+            return json.dumps({'trip': {'status': 0, 'locations': request['locations']}})
+        def matrix(self, request):
+            raise RuntimeError('Invalid tileset')
+    actors = []
+    backend = EmbeddedBackend('valhalla.json', actor_factory=lambda config: actors.append(Actor(config)) or actors[-1], actors=2)
+    r = backend.request('POST', 'route', {'locations': [{'lat': 37.9, 'lon': 23.7}]})
+    assert r.status_code == 200 and json.loads(r.content)['trip']['locations'] == [{'lat': 37.9, 'lon': 23.7}]
+    r = backend.request('POST', 'route', {'locations': []})
+    assert r.status_code == 400 and json.loads(r.content)['error_code'] == 130
+    r = backend.request('POST', 'sources_to_targets', {})
+    assert r.status_code == 400 and json.loads(r.content)['error'] == 'Invalid tileset'
+    assert backend.request('GET', 'optimized_route', {}).status_code == 404
+    # A bounded pool of actors, shared by all threads
+    for _ in range(3):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            assert {r.status_code for r in executor.map(lambda _: backend.request('POST', 'route', {'locations': [{}]}), range(50))} == {200}
+    assert 1 <= len(actors) <= 2 and actors[0].config == 'valhalla.json'
+    busy = [backend._acquire() for _ in range(2)]
+    try:
+        backend.request('POST', 'route', {'locations': [{}]}, timeout=0.01)
+        assert False, 'No actor should be available.'
+    except DeadlineExceeded:
+        pass
+    for actor in busy:
+        backend._release(actor)
+    assert backend.request('POST', 'route', {'locations': [{}]}, timeout=0.01).status_code == 200
+
+def test_unix_socket_backend():
+    """Unit - Test requesting Valhalla over a Unix domain socket"""
+    import os
+    import json
+    import tempfile
+    import threading
+    import socketserver
+    from concurrent.futures import ThreadPoolExecutor
+    from http.server import BaseHTTPRequestHandler
+    import requests
+    from transport_service.api.backends import HTTPBackend
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        def do_POST(self):
+            data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            body = json.dumps({'path': self.path, 'costing': data['costing']}).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        def log_message(self, format, *args):
+            pass
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+    path = os.path.join(tempfile.mkdtemp(), 'valhalla.sock')
+    server = Server(path, Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        backend = HTTPBackend('unix://' + path)
+        for _ in range(2):
+            r = backend.request('POST', 'route', {'costing': 'auto'}, timeout=1)
+            assert r.status_code == 200 and r.json() == {'path': '/route', 'costing': 'auto'}
+        # A single session (and connection pool) shared by all threads
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            assert set(executor.map(lambda _: backend._session(), range(8))) == {backend._session()}
+        # The connection hook of requests >= 2.32 is routed to the socket too
+        adapter = backend._session().get_adapter('http://localhost/route')
+        request = requests.Request('POST', 'http://localhost/route').prepare()
+        assert adapter.get_connection_with_tls_context(request, True) is adapter.get_connection(request.url)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_http2_backend():
+    """Unit - Test requesting Valhalla over HTTP/2, with a mocked httpx transport"""
+    import json
+    import unittest
+    import requests
+    try:
+        import httpx
+    except ImportError:
+        raise unittest.SkipTest('httpx is not installed.')
+    from transport_service.api.backends import HTTP2Backend
+    from transport_service.deadline import DeadlineExceeded
+    sent = []
+    def handler(request):
+        sent.append(request)
+        if request.url.path == '/timeout':
+            raise httpx.ReadTimeout('Timed out', request=request)
+        if request.url.path == '/down':
+            raise httpx.ConnectError('Connection refused', request=request)
+        return httpx.Response(200, json={'path': request.url.path, 'data': json.loads(request.content or request.url.params.get('json', 'null'))})
+    backend = HTTP2Backend('http://valhalla:8002', transport=httpx.MockTransport(handler))
+    r = backend.request('POST', 'route', {'costing': 'auto'}, timeout=1)
+    assert r.status_code == 200 and r.json() == {'path': '/route', 'data': {'costing': 'auto'}}
+    assert sent[-1].headers['Content-Type'] == 'application/json'
+    r = backend.request('GET', 'status', {'verbose': True})
+    assert r.status_code == 200 and r.json() == {'path': '/status', 'data': {'verbose': True}}
+    assert backend._get_client() is backend._get_client()
+    try:
+        backend.request('POST', 'timeout', {}, timeout=1)
+        assert False, 'Deadline not exceeded.'
+    except DeadlineExceeded:
+        pass
+    try:
+        backend.request('POST', 'down', {})
+        assert False, 'Connection error not raised.'
+    except requests.ConnectionError:
+        pass
+
+def test_regions():
+    """Unit - Test locating requests in regions"""
+    import numpy as np
+    from shapely.geometry import box
+    from transport_service.api.regions import RegionIndex, request_coordinates
+    regions = RegionIndex(['gr', 'cy'], [box(19, 34, 30, 42), box(32, 34.5, 34.6, 35.7)], ['http://gr:8002', 'http://cy-1:8002,http://cy-2:8002'])
+    athens, thessaloniki, nicosia = {'lat': 37.98, 'lon': 23.73}, {'lat': 40.64, 'lon': 22.94}, {'lat': 35.17, 'lon': 33.36}
+    assert regions.backend({'locations': [athens, thessaloniki]}) == 'http://gr:8002'
+    assert regions.backend({'shape': [nicosia] * 3}) == 'http://cy-1:8002,http://cy-2:8002'
+    assert regions.backend({'sources': [athens], 'targets': [nicosia]}) is None
+    assert regions.backend({'locations': [{'lat': 48.85, 'lon': 2.35}]}) is None
+    assert regions.backend({'encoded_polyline': 'abc'}) is None
+    assert request_coordinates({'shape': [{'lat': 1.}]}) is None
+    assert regions.locate(np.array([[19., 34.]])) == 0
+
+def test_coverage():
+    """Unit - Test rejecting coordinates outside the coverage"""
+    import json
+    import tempfile
+    from shapely.geometry import box, mapping
+    from transport_service.api.coverage import Coverage, OutOfCoverage
+    with tempfile.NamedTemporaryFile('w', suffix='.geojson') as f:
+        json.dump({'type': 'FeatureCollection', 'features': [{'type': 'Feature', 'properties': {}, 'geometry': mapping(box(19, 34, 30, 42))}]}, f)
+        f.flush()
+        coverage = Coverage.from_file(f.name)
+    with tempfile.NamedTemporaryFile('w', suffix='.wkb') as f:
+        f.write(box(19, 34, 30, 42).wkb_hex)
+        f.flush()
+        assert Coverage.from_file(f.name).geometry.equals(coverage.geometry)
+    inside, outside = {'lat': 37.98, 'lon': 23.73}, {'lat': 48.85, 'lon': 2.35}
+    coverage.check({'locations': [inside, inside], 'lat': 40, 'lon': 19})
+    coverage.check({'shape': [{'lat': 'x', 'lon': '2.35'}]})
+    try:
+        coverage.check({'shape': [inside] + [outside] * 12, 'locations': [inside]})
+        assert False, 'Not rejected.'
+    except OutOfCoverage as e:
+        assert e.errors == {'shape': ['Outside of the coverage: points 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, ....']}
+    try:
+        coverage.check(outside)
+        assert False, 'Not rejected.'
+    except OutOfCoverage as e:
+        assert set(e.errors) == {'lat', 'lon'}
+
+def test_negative_cache():
+    """Unit - Test caching deterministic Valhalla errors, but not transient ones"""
+    import os
+    import json
+    from transport_service.api.backends import BackendResponse
+    from transport_service.api.valhalla import Valhalla, is_deterministic_error
+    class Backend:
+        name = 'fake'
+        def __init__(self):
+            self.calls = 0
+        def request(self, method, endpoint, data=None, headers=None, timeout=None):
+            self.calls += 1
+            if data['costing'] == 'pedestrian':
+                return BackendResponse(json.dumps({'error_code': 171, 'error': 'No suitable edges near location', 'status_code': 400}).encode(), 400)
+            return BackendResponse(json.dumps({'error_code': 503, 'error': 'Service unavailable', 'status_code': 503}).encode(), 503)
+    assert is_deterministic_error(400, b'{"error_code": 442}') and not is_deterministic_error(400, b'{"error_code": 503}')
+    assert not is_deterministic_error(503, b'{"error_code": 171}') and not is_deterministic_error(400, b'<html>')
+    os.environ['TILESET_VERSION'] = 'negative-cache-test'
+    try:
+        valhalla = Valhalla(url='http://localhost:8002')
+        valhalla.backends = [Backend()]
+        locations = [{'lat': 37.9, 'lon': 23.7}, {'lat': 37.91, 'lon': 23.71}]
+        for _ in range(3):
+            result, status = valhalla.routing('pedestrian', locations, raw=True)
+            assert status == 400 and result['error_code'] == 171
+        assert valhalla.backends[0].calls == 1
+        for _ in range(2):
+            assert valhalla.routing('auto', locations)[1] == 503
+        assert valhalla.backends[0].calls == 3
+    finally:
+        del os.environ['TILESET_VERSION']
+
+def test_profiling_sampler():
+    """Unit - Test stack sampling of a thread"""
+    import time
+    from transport_service.profiling import Sampler
+    def busy_wait(seconds):
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+    sampler = Sampler(interval=0.001)
+    stacks = sampler.start()
+    busy_wait(0.1)
+    sampler.stop()
+    samples = sum(stacks.values())
+    assert samples > 0
+    assert any(stack.endswith(__name__ + ':busy_wait') for stack in stacks)
+    busy_wait(0.05)
+    assert sum(stacks.values()) == samples
+
+def test_profiling_admin_token():
+    """Unit - Test the admin token of the profiling endpoints"""
+    import os
+    from flask import Flask
+    from transport_service import profiling
+    app = Flask(__name__)
+    app.register_blueprint(profiling.bp)
+    client = app.test_client()
+    os.environ['ADMIN_TOKEN'] = 'secret'
+    try:
+        assert client.get('/admin/profiles').status_code == 401
+        assert client.get('/admin/profiles', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+        assert client.get('/admin/profiles', headers={'Authorization': 'Bearer s\u00e9cret'}).status_code == 401
+        assert client.get('/admin/profiles', headers={'Authorization': 'Bearer secret'}).status_code == 200
+    finally:
+        del os.environ['ADMIN_TOKEN']
+    assert client.get('/admin/profiles').status_code == 404
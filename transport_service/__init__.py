@@ -10,33 +10,31 @@
 """
 
 import os, sys
-from apispec import APISpec
-from apispec_webframeworks.flask import FlaskPlugin
+import json
+import threading
 from ._version import __version__
-from .api.doc_components import add_components
 from .logging import mainLogger, exception_as_rfc5424_structured_data
 
-# OpenAPI documentation
-mainLogger.debug('Initializing OpenAPI specification.')
-spec = APISpec(
-    title="Transport API",
-    version=__version__,
-    info=dict(
-        description=__doc__,
-        contact={"email": "pmitropoulos@getmap.gr"}
-    ),
-    externalDocs={"description": "GitHub", "url": "https://github.com/OpertusMundi/transport-service"},
-    openapi_version="3.0.2",
-    plugins=[FlaskPlugin()],
-)
-mainLogger.debug('Adding OpenAPI specification components.')
-add_components(spec)
+DEFERRED_MODULES = [
+    'transport_service.api.postprocessing',
+    'transport_service.api.isoline_store',
+    'transport_service.api.union',
+    'transport_service.api.preprocessing',
+    'transport_service.api.optimization',
+    'transport_service.api.regions',
+    'transport_service.api.coverage'
+]
+"""list: Modules with heavy dependencies, imported on first use (or at app creation, when preloading)."""
 
 # Check environment variables
 if os.getenv('SECRET_KEY') is None:
     mainLogger.fatal('Environment variable not set [variable="SECRET_KEY"]')
     sys.exit(1)
-if os.getenv('VALHALLA_URL') is None:
+if os.getenv('VALHALLA_BACKEND', 'http') == 'embedded':
+    if os.getenv('VALHALLA_CONFIG') is None:
+        mainLogger.fatal('Environment variable not set [variable="VALHALLA_CONFIG"]')
+        sys.exit(1)
+elif os.getenv('VALHALLA_URL') is None:
     mainLogger.fatal('Environment variable not set [variable="VALHALLA_URL"]')
     sys.exit(1)
 if os.getenv('CORS') is None:
@@ -44,12 +42,84 @@ if os.getenv('CORS') is None:
     mainLogger.info('Set environment variable [CORS="*"]')
 
 
+_spec = None
+_spec_lock = threading.Lock()
+
+def _build_spec(app) -> dict:
+    """Build the OpenAPI specification from the documentation components and the docstrings of the views."""
+    from apispec import APISpec
+    from apispec_webframeworks.flask import FlaskPlugin
+    from .api.doc_components import add_components
+
+    mainLogger.debug('Initializing OpenAPI specification.')
+    spec = APISpec(
+        title="Transport API",
+        version=__version__,
+        info=dict(
+            description=__doc__,
+            contact={"email": "pmitropoulos@getmap.gr"}
+        ),
+        externalDocs={"description": "GitHub", "url": "https://github.com/OpertusMundi/transport-service"},
+        openapi_version="3.0.2",
+        plugins=[FlaskPlugin()],
+    )
+    mainLogger.debug('Adding OpenAPI specification components.')
+    add_components(spec)
+    mainLogger.debug('Registering documentation.')
+    with app.test_request_context():
+        for endpoint, view in app.view_functions.items():
+            if endpoint != 'index' and not endpoint.startswith(('admin.', 'metrics.')):
+                spec.path(view=view)
+    return spec.to_dict()
+
+def get_spec(app) -> dict:
+    """Get the OpenAPI specification, generated on first use.
+
+    If the environment variable `SPEC_CACHE` is set, the specification is loaded from this file, as long as it was generated by the same version of the service; otherwise, it is generated and written to this file.
+
+    Arguments:
+        app (Flask): The application.
+
+    Returns:
+        (dict) The OpenAPI specification.
+    """
+    global _spec
+    with _spec_lock:
+        if _spec is not None:
+            return _spec
+        path = os.getenv('SPEC_CACHE')
+        if path and os.path.isfile(path):
+            try:
+                with open(path) as specfile:
+                    cached = json.load(specfile)
+                if cached.get('info', {}).get('version') == __version__:
+                    mainLogger.info('Loaded OpenAPI specification [path="%s"]', path)
+                    _spec = cached
+                    return _spec
+            except (OSError, ValueError) as e:
+                mainLogger.warning('Failed to load OpenAPI specification [path="%s", error="%s"]', path, e)
+        mainLogger.info('Generating the OpenAPI document...')
+        _spec = _build_spec(app)
+        if path:
+            try:
+                with open(path, 'w') as specfile:
+                    json.dump(_spec, specfile)
+            except OSError as e:
+                mainLogger.warning('Failed to write OpenAPI specification [path="%s", error="%s"]', path, e)
+        return _spec
+
+
 def create_app():
     """Create flask app."""
+    import importlib
     from flask import Flask, make_response, g, request
     from flask_cors import CORS
     from werkzeug.exceptions import HTTPException, InternalServerError
-    from transport_service.api import isoline, mapmatch, routing, misc
+    from transport_service.api import isoline, mapmatch, routing, optimized_route, misc
+    from transport_service import tracing, deadline
+    from transport_service.cache import tileset_version
+    from transport_service.api.valhalla import Valhalla
+    from transport_service.api.limiter import LimitExceeded
 
     mainLogger.debug('Initializing app.')
     app = Flask(__name__)
@@ -71,19 +141,67 @@ def create_app():
     app.register_blueprint(isoline.bp)
     app.register_blueprint(mapmatch.bp)
     app.register_blueprint(routing.bp)
+    app.register_blueprint(optimized_route.bp)
     app.register_blueprint(misc.bp)
 
-    # Register documentation
-    mainLogger.debug('Registering documentation.')
-    with app.test_request_context():
-        for view in app.view_functions.values():
-            spec.path(view=view)
+    # Request tracing
+    tracing.init_app(app)
+
+    # Request deadlines
+    deadline.init_app(app)
+
+    # Bulkheads isolating the request classes
+    if os.getenv('BULKHEADS', 'false').lower() == 'true':
+        from transport_service import bulkhead
+        bulkhead.init_app(app)
+
+    # Tileset version (checked before the API requests, so that stale cached results are invalidated)
+    @app.before_request
+    def check_tileset():
+        if request.blueprint in ('isoline', 'mapmatch', 'routing', 'optimized_route'):
+            Valhalla().checkTileset()
+
+    @app.after_request
+    def add_tileset_version(response):
+        version = tileset_version()
+        if version:
+            response.headers['X-Tileset-Version'] = version
+        return response
+
+    # Metrics
+    if os.getenv('METRICS', 'false').lower() == 'true':
+        from transport_service import metrics
+        app.register_blueprint(metrics.bp)
+
+    # Profiling of (slow) requests
+    if os.getenv('PROFILING', 'false').lower() == 'true':
+        from transport_service import profiling
+        profiling.init_app(app)
 
     @app.route("/", methods=['GET'])
     def index():
         """The index route, returns the JSON OpenAPI specification."""
-        mainLogger.info('Generating the OpenAPI document...')
-        return make_response(spec.to_dict(), 200)
+        return make_response(get_spec(app), 200)
+
+    # Regions of the Valhalla backends (loaded at startup)
+    if os.getenv('VALHALLA_REGIONS'):
+        from transport_service.api.regions import get_regions
+        get_regions()
+
+    # Coverage of the tileset (loaded at startup); requests outside it are rejected
+    if os.getenv('COVERAGE_FILE'):
+        from transport_service.api.coverage import get_coverage, OutOfCoverage
+        get_coverage()
+
+        @app.errorhandler(OutOfCoverage)
+        def handle_out_of_coverage(ex):
+            return make_response(ex.errors, 422)
+
+    if os.getenv('PRELOAD', 'false').lower() == 'true':
+        mainLogger.debug('Preloading deferred modules and OpenAPI specification.')
+        for module in DEFERRED_MODULES:
+            importlib.import_module(module)
+        get_spec(app)
 
     # Register cli commands
     with app.app_context():
@@ -104,5 +222,11 @@ def create_app():
         else:
             return InternalServerError(exc_message)
 
+    # Requests shed by the concurrency limiter of Valhalla requests are retryable
+    @app.errorhandler(LimitExceeded)
+    def handle_limit_exceeded(ex):
+        mainLogger.warning('Request shed by the Valhalla concurrency limiter [path="%s"]', request.path)
+        return make_response({'error': 'Too many concurrent requests; try again later.'}, 503, {'Retry-After': '1'})
+
     mainLogger.debug('Created app.')
     return app
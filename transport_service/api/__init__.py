@@ -1 +1 @@
-from .requests import isoline, mapmatch, routing, misc
+from .requests import isoline, mapmatch, routing, optimized_route, misc
@@ -0,0 +1,352 @@
+"""Backends executing the Valhalla requests.
+
+- `HTTPBackend` (default): requests a Valhalla service over HTTP/1.1, with a pool of persistent connections (per process), over TCP or over a Unix domain socket (`unix://<path>` urls, e.g. for a Valhalla in the same pod).
+- `HTTP2Backend`: requests a Valhalla service (or a proxy in front of it) over HTTP/2 with prior knowledge, with *httpx* (`httpx[http2]`); a single connection per process multiplexes the concurrent requests of all threads.
+- `EmbeddedBackend`: calls the Valhalla Python bindings (the `valhalla` package, i.e. *pyvalhalla*) in-process, on a local tileset; with a tile extract (`mjolnir.tile_extract` in the Valhalla configuration), the tiles are memory-mapped, thus shared by all the worker processes through the page cache.
+
+The backend is selected by the environment variable `VALHALLA_BACKEND` (`http` or `embedded`), and HTTP/2 by `VALHALLA_HTTP2`; the embedded backend is configured by the Valhalla configuration file given by `VALHALLA_CONFIG`.
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+from collections import namedtuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import httpx
+except ImportError:
+    httpx = None
+from transport_service import deadline
+
+
+BackendResponse = namedtuple('BackendResponse', ['content', 'status_code'])
+"""A response of a backend: the (JSON) body as bytes, and the HTTP status code."""
+
+
+def dumps(data) -> bytes:
+    """Encode a request body as (compact) JSON, with *orjson* if installed."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode()
+
+
+def loads(content: bytes):
+    """Decode a JSON response body, with *orjson* if installed."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+UNIX_SCHEME = 'unix://'
+
+
+class _UnixConnection(HTTPConnection):
+    """An HTTP connection over a Unix domain socket."""
+
+    def __init__(self, path: str, *args, **kwargs):
+        super().__init__('localhost', *args, **kwargs)
+        self.path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+            sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        self.sock = sock
+
+
+class _UnixConnectionPool(HTTPConnectionPool):
+    """A pool of HTTP connections over a Unix domain socket."""
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__('localhost', **kwargs)
+        self.path = path
+
+    def _new_conn(self):
+        return _UnixConnection(self.path, timeout=self.timeout.connect_timeout)
+
+
+class UnixSocketAdapter(HTTPAdapter):
+    """A *requests* transport adapter sending all the requests to a Unix domain socket.
+
+    Attributes:
+        path (str): The path of the socket.
+    """
+
+    def __init__(self, path: str, **kwargs):
+        self.path = path
+        self._pool = None
+        super().__init__(**kwargs)
+
+    def get_connection(self, url, proxies=None):
+        if self._pool is None:
+            self._pool = _UnixConnectionPool(self.path, maxsize=self._pool_maxsize)
+        return self._pool
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        # The hook replacing `get_connection` since requests 2.32
+        return self.get_connection(request.url, proxies)
+
+    def close(self):
+        super().close()
+        if self._pool is not None:
+            self._pool.close()
+
+
+class HTTPBackend:
+    """Requests a Valhalla service over HTTP/1.1.
+
+    Each process keeps a single session, shared by all threads, with a pool of persistent connections of size `VALHALLA_POOL_SIZE` (default: 32); connections beyond it are closed after their request.
+
+    Attributes:
+        url (str): The Valhalla service url; `unix://<path>` for a Unix domain socket.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self._shared = None
+        self._shared_pid = None
+        self._shared_lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.url
+
+    def _base_url(self) -> str:
+        return 'http://localhost' if self.url.startswith(UNIX_SCHEME) else self.url
+
+    def _session(self) -> requests.Session:
+        with self._shared_lock:
+            # Connections are not shared with forked processes
+            if self._shared is None or self._shared_pid != os.getpid():
+                session = requests.Session()
+                size = int(os.getenv('VALHALLA_POOL_SIZE', 32))
+                if self.url.startswith(UNIX_SCHEME):
+                    session.mount('http://', UnixSocketAdapter(self.url[len(UNIX_SCHEME):], pool_maxsize=size))
+                else:
+                    session.mount('http://', HTTPAdapter(pool_maxsize=size))
+                    session.mount('https://', HTTPAdapter(pool_maxsize=size))
+                self._shared, self._shared_pid = session, os.getpid()
+            return self._shared
+
+    def request(self, method: str, endpoint: str, data: dict=None, headers: dict=None, timeout: float=None):
+        """Request a Valhalla endpoint.
+
+        The timeout is also forwarded (in milliseconds) with the header named by the environment variable `VALHALLA_DEADLINE_HEADER`, if set (e.g. for a proxy in front of Valhalla).
+
+        Raises:
+            DeadlineExceeded: If the request timed out.
+
+        Returns:
+            (Response) The response (having the `content` and `status_code` attributes).
+        """
+        url = "{url}/{endpoint}".format(url=self._base_url(), endpoint=endpoint)
+        headers = _headers(headers, timeout)
+        try:
+            if method == 'GET':
+                params = {'json': dumps(data).decode()} if data is not None else None
+                return self._session().get(url, params=params, headers=headers, timeout=timeout)
+            headers['Content-Type'] = 'application/json'
+            return self._session().post(url, data=dumps(data), headers=headers, timeout=timeout)
+        except requests.Timeout as e:
+            raise deadline.DeadlineExceeded() from e
+
+
+class HTTP2Backend(HTTPBackend):
+    """Requests a Valhalla service over HTTP/2, with *httpx*.
+
+    The requests are sent with prior knowledge of HTTP/2 (i.e. `h2c` for `http` urls), thus the service (or a proxy in front of it, since Valhalla itself speaks HTTP/1.1) must accept HTTP/2. Each process keeps a single client, multiplexing the requests of all threads over one connection.
+
+    Attributes:
+        transport (httpx.BaseTransport): The transport of the client (default: HTTP/2 over TCP, or over the Unix domain socket), e.g. a mock transport.
+    """
+
+    def __init__(self, url: str, transport=None):
+        if httpx is None:
+            raise ValueError('HTTP/2 requires httpx (install "httpx[http2]").')
+        super().__init__(url)
+        self.transport = transport
+        self._client = None
+        self._client_pid = None
+        self._client_lock = threading.Lock()
+
+    def _get_client(self):
+        with self._client_lock:
+            if self._client is None or self._client_pid != os.getpid():
+                transport = self.transport
+                if transport is None:
+                    uds = self.url[len(UNIX_SCHEME):] if self.url.startswith(UNIX_SCHEME) else None
+                    transport = httpx.HTTPTransport(http1=False, http2=True, uds=uds)
+                self._client = httpx.Client(transport=transport)
+                self._client_pid = os.getpid()
+            return self._client
+
+    def request(self, method: str, endpoint: str, data: dict=None, headers: dict=None, timeout: float=None):
+        url = "{url}/{endpoint}".format(url=self._base_url(), endpoint=endpoint)
+        headers = _headers(headers, timeout)
+        try:
+            if method == 'GET':
+                params = {'json': dumps(data).decode()} if data is not None else None
+                return self._get_client().get(url, params=params, headers=headers, timeout=timeout)
+            headers['Content-Type'] = 'application/json'
+            return self._get_client().post(url, content=dumps(data), headers=headers, timeout=timeout)
+        except httpx.TimeoutException as e:
+            raise deadline.DeadlineExceeded() from e
+        except httpx.TransportError as e:
+            # Failures are handled alike for all the transports
+            raise requests.ConnectionError(str(e)) from e
+
+
+def _headers(headers: dict, timeout: float) -> dict:
+    headers = dict(headers or {})
+    if timeout is not None and os.getenv('VALHALLA_DEADLINE_HEADER'):
+        headers[os.getenv('VALHALLA_DEADLINE_HEADER')] = str(int(timeout * 1000))
+    return headers
+
+
+class EmbeddedBackend:
+    """Calls the Valhalla Python bindings in-process.
+
+    Since actors are not thread-safe, each process keeps a bounded pool of actors, created on demand and shared by all threads; a call takes an idle actor, or waits for one if all are in use. The tiles of a tile extract are memory-mapped, thus loaded once. The calls cannot be interrupted, thus the timeout only bounds the wait for an actor.
+
+    Attributes:
+        config (str): The Valhalla configuration file.
+        actors (int): Maximum number of actors per process (default: environment variable `VALHALLA_EMBEDDED_ACTORS`, or the number of CPUs).
+    """
+
+    ACTIONS = {
+        'route': 'route',
+        'isochrone': 'isochrone',
+        'trace_route': 'trace_route',
+        'trace_attributes': 'trace_attributes',
+        'sources_to_targets': 'matrix',
+        'status': 'status'
+    }
+    """dict: The actor method of each Valhalla endpoint."""
+
+    def __init__(self, config: str, actor_factory=None, actors: int=None):
+        self.config = config
+        self.actors = actors if actors is not None else int(os.getenv('VALHALLA_EMBEDDED_ACTORS', os.cpu_count() or 4))
+        self._actor_factory = actor_factory
+        self._condition = threading.Condition()
+        self._idle = []
+        self._created = 0
+        self._pid = os.getpid()
+
+    @property
+    def name(self) -> str:
+        return 'embedded'
+
+    def _acquire(self, timeout: float=None):
+        """Take an idle actor, create one if the pool is not full, or else wait for one.
+
+        Raises:
+            DeadlineExceeded: If no actor became available within the timeout.
+        """
+        end = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            # Actors do not survive forking (e.g. of preloaded gunicorn workers)
+            if self._pid != os.getpid():
+                self._idle, self._created, self._pid = [], 0, os.getpid()
+            while not self._idle and self._created >= self.actors:
+                remaining = end - time.monotonic() if end is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise deadline.DeadlineExceeded()
+                self._condition.wait(remaining)
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        try:
+            if self._actor_factory is None:
+                from valhalla import Actor
+                self._actor_factory = Actor
+            return self._actor_factory(self.config)
+        except BaseException:
+            with self._condition:
+                self._created -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, actor) -> None:
+        """Return an actor to the pool."""
+        with self._condition:
+            if self._pid == os.getpid():
+                self._idle.append(actor)
+                self._condition.notify()
+
+    def request(self, method: str, endpoint: str, data: dict=None, headers: dict=None, timeout: float=None) -> BackendResponse:
+        """Call the Valhalla action of an endpoint.
+
+        Errors raised by Valhalla are returned as Valhalla's error responses.
+
+        Returns:
+            (BackendResponse) The response.
+        """
+        action = self.ACTIONS.get(endpoint)
+        if action is None:
+            return BackendResponse(dumps({'error_code': 106, 'error': 'Unsupported action', 'status_code': 404, 'status': 'Not Found'}), 404)
+        actor = self._acquire(timeout)
+        try:
+            result = getattr(actor, action)(dumps(data or {}).decode())
+        except RuntimeError as e:
+            return BackendResponse(*self._error(str(e)))
+        finally:
+            self._release(actor)
+        return BackendResponse(result.encode() if isinstance(result, str) else dumps(result), 200)
+
+    @staticmethod
+    def _error(message: str) -> tuple:
+        """Convert the message of a Valhalla error to a response body and status."""
+        try:
+            error = json.loads(message)
+        except ValueError:
+            error = None
+        if not isinstance(error, dict):
+            error = {'error': message, 'status_code': 400, 'status': 'Bad Request'}
+        return dumps(error), int(error.get('status_code', 400))
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backends(url: str=None) -> list:
+    """Get the backends configured by the environment.
+
+    The backends are created once per configuration, so that their connections are reused.
+
+    Arguments:
+        url (str): Valhalla url, or comma-separated urls of replicas (default: environment variable `VALHALLA_URL`); used by the HTTP backends.
+
+    Raises:
+        ValueError: If the environment variable `VALHALLA_BACKEND` has an invalid value, or HTTP/2 is enabled (`VALHALLA_HTTP2`) without *httpx*.
+
+    Returns:
+        (list) The backends (one per replica).
+    """
+    kind = os.getenv('VALHALLA_BACKEND', 'http')
+    if kind == 'embedded':
+        key = (kind, os.environ['VALHALLA_CONFIG'])
+    elif kind == 'http':
+        url = url if url is not None else os.environ['VALHALLA_URL']
+        key = (kind, os.getenv('VALHALLA_HTTP2', 'false').lower() == 'true', url)
+    else:
+        raise ValueError('Invalid Valhalla backend "{}".'.format(kind))
+    with _backends_lock:
+        backends = _backends.get(key)
+        if backends is None:
+            if kind == 'embedded':
+                backends = [EmbeddedBackend(key[1])]
+            else:
+                backend = HTTP2Backend if key[1] else HTTPBackend
+                backends = [backend(replica.strip().rstrip('/')) for replica in url.split(',') if replica.strip()]
+            _backends[key] = backends
+        return backends
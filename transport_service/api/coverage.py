@@ -0,0 +1,119 @@
+"""Local rejection of coordinates outside the coverage of the tileset.
+
+The coverage is a (multi)polygon, read at startup from the file given by the environment variable `COVERAGE_FILE`: a GeoJSON geometry, feature or feature collection (the union of its polygons), or a WKB geometry (binary or hex). The points of a validated request (`lat`/`lon`, `locations` and `shape`) are tested against the prepared coverage at once, and a request with points outside it is rejected with *422 Unprocessable Entity*, without a round trip to Valhalla.
+"""
+
+import os
+import json
+import threading
+import numpy as np
+import shapely
+from shapely.geometry import shape
+from transport_service.logging import mainLogger
+
+COORDINATES = ['locations', 'shape']
+"""list: The request parameters holding lists of coordinates."""
+
+MAX_REPORTED = 10
+"""int: The maximum number of indices of points outside the coverage reported per parameter."""
+
+
+class OutOfCoverage(Exception):
+    """Raised when a request has coordinates outside the coverage.
+
+    Attributes:
+        errors (dict): The errors per request parameter, as the validation errors.
+    """
+
+    def __init__(self, errors: dict):
+        super().__init__(errors)
+        self.errors = errors
+
+
+class Coverage:
+    """The area covered by the tileset.
+
+    Attributes:
+        geometry (shapely.Geometry): The (prepared) coverage polygon.
+    """
+
+    def __init__(self, geometry):
+        if geometry.geom_type not in ['Polygon', 'MultiPolygon']:
+            raise ValueError('The coverage must be a polygon.')
+        self.geometry = geometry
+        shapely.prepare(self.geometry)
+
+    @classmethod
+    def from_file(cls, path: str):
+        """Read the coverage from a GeoJSON or WKB file."""
+        with open(path, 'rb') as f:
+            content = f.read()
+        if content.lstrip().startswith(b'{'):
+            geojson = json.loads(content)
+            features = geojson['features'] if geojson.get('type') == 'FeatureCollection' else [geojson]
+            geometries = [shape(feature['geometry'] if feature.get('type') == 'Feature' else feature) for feature in features]
+            return cls(shapely.unary_union(geometries))
+        # Hex WKB is text, binary WKB is not
+        return cls(shapely.from_wkb(content.strip().decode() if content.strip().isalnum() else content))
+
+    def contains(self, coordinates: np.ndarray) -> np.ndarray:
+        """Test whether points are covered (on the boundary too).
+
+        Arguments:
+            coordinates (numpy.ndarray): The points, as an array of (lon, lat).
+
+        Returns:
+            (numpy.ndarray) A boolean for each point.
+        """
+        return shapely.intersects_xy(self.geometry, coordinates[:, 0], coordinates[:, 1])
+
+    def check(self, data: dict) -> None:
+        """Check the coordinates of validated request data.
+
+        Coordinates that are not numbers (e.g. unvalidated CSV values) are left to Valhalla.
+
+        Raises:
+            OutOfCoverage: If some points are outside the coverage.
+        """
+        errors = {}
+        if data.get('lat') is not None and data.get('lon') is not None:
+            try:
+                point = np.array([[data['lon'], data['lat']]], dtype=float)
+            except (TypeError, ValueError):
+                point = None
+            if point is not None and not self.contains(point)[0]:
+                errors['lat'] = errors['lon'] = ['Outside of the coverage.']
+        for parameter in COORDINATES:
+            points = data.get(parameter)
+            if not points:
+                continue
+            try:
+                coordinates = np.array([(point['lon'], point['lat']) for point in points], dtype=float)
+            except (KeyError, TypeError, ValueError):
+                continue
+            outside = np.flatnonzero(~self.contains(coordinates))
+            if outside.size > 0:
+                indices = ', '.join(str(i) for i in outside[:MAX_REPORTED]) + (', ...' if outside.size > MAX_REPORTED else '')
+                errors[parameter] = ['Outside of the coverage: points {}.'.format(indices)]
+        if errors:
+            raise OutOfCoverage(errors)
+
+
+_coverage = None
+_coverage_lock = threading.Lock()
+
+def get_coverage() -> Coverage:
+    """Get the coverage, read from the file given by the environment variable `COVERAGE_FILE`.
+
+    Returns:
+        (Coverage) The coverage, or None if not configured.
+    """
+    global _coverage
+    path = os.getenv('COVERAGE_FILE')
+    if not path:
+        return None
+    with _coverage_lock:
+        if _coverage is None:
+            _coverage = Coverage.from_file(path)
+            mainLogger.info('Loaded coverage [file="%s", bounds=%s]', path, list(shapely.bounds(_coverage.geometry)))
+        return _coverage
@@ -5,6 +5,9 @@ def add_components(spec):
         spec (obj): The apispec object.
     """
     import copy
+    from .schema import COSTING_OPTIONS
+    from .forms.isoline import UNION_MAX_LOCATIONS
+    from .requests.isoline import MAX_ZOOM
 
     # Parameters
 
@@ -118,6 +121,40 @@ def add_components(spec):
         "default": 1.0
     })
 
+    spec.components.parameter('simplify', 'query', {
+        "name": "simplify",
+        "description": "Tolerance in meters for a topology-preserving simplification of the contours. If not given, the contours are not simplified.",
+        "schema": {
+            "type": "number",
+            "format": "float",
+            "minimum": 0
+        },
+        "example": 20
+    })
+
+    spec.components.parameter('precision', 'query', {
+        "name": "precision",
+        "description": "Number of decimal digits to keep in the coordinates of the contours. If not given, the full precision is returned.",
+        "schema": {
+            "type": "integer",
+            "minimum": 0,
+            "maximum": 15
+        },
+        "example": 5
+    })
+
+    for name, description, maximum in [('z', 'Zoom level of the tile.', MAX_ZOOM), ('x', 'Column of the tile (less than 2<sup>z</sup>).', None), ('y', 'Row of the tile from the top (less than 2<sup>z</sup>).', None)]:
+        spec.components.parameter('tile' + name.upper(), 'path', {
+            "name": name,
+            "description": description,
+            "required": True,
+            "schema": {
+                "type": "integer",
+                "minimum": 0,
+                **({"maximum": maximum} if maximum is not None else {})
+            }
+        })
+
     # Schemata
 
     isochrone_geojson = {
@@ -243,6 +280,78 @@ def add_components(spec):
     }
     spec.components.schema('isochroneGeoJSON', isochrone_geojson)
 
+    spec.components.schema('isolineUnionForm', {
+        "type": "object",
+        "properties": {
+            "locations": {
+                "type": "array",
+                "description": "The origins of the isolines.",
+                "minItems": 1,
+                "maxItems": UNION_MAX_LOCATIONS,
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "lat": {
+                            "type": "number",
+                            "format": "float",
+                            "description": "Latitude of the location in degrees.",
+                            "example": 37.983841
+                        },
+                        "lon": {
+                            "type": "number",
+                            "format": "float",
+                            "description": "Longitude of the location in degrees.",
+                            "example": 23.735741
+                        }
+                    },
+                    "required": ["lat", "lon"]
+                }
+            },
+            "metric": {
+                "type": "string",
+                "description": "Whether the ranges are time (in minutes) or distance (in kilometers) intervals.",
+                "enum": ["time", "distance"],
+                "default": "time"
+            },
+            "costing": {
+                "type": "string",
+                "description": "The costing model that will be used to calculate the isolines.",
+                "enum": ["auto", "bicycle", "pedestrian", "bikeshare", "bus", "multimodal"],
+                "default": "auto"
+            },
+            "range": {
+                "type": "array",
+                "description": "The range bands, in minutes or kilometers depending on **metric**.",
+                "items": {"type": "integer", "minimum": 1},
+                "example": [10, 20]
+            },
+            "denoise": {
+                "type": "number",
+                "format": "float",
+                "description": "A floating point value from 0 to 1, used to remove smaller contours of each location.",
+                "default": 1.0
+            },
+            "overlap": {
+                "type": "boolean",
+                "description": "Whether to also return, for each band, the regions reachable from the same number of locations.",
+                "default": False
+            },
+            "simplify": {
+                "type": "number",
+                "format": "float",
+                "description": "Tolerance in meters for a topology-preserving simplification of the result.",
+                "minimum": 0
+            },
+            "precision": {
+                "type": "integer",
+                "description": "Number of decimal digits to keep in the coordinates of the result.",
+                "minimum": 0,
+                "maximum": 15
+            }
+        },
+        "required": ["locations", "range"]
+    })
+
     shape_json = {
         "type": "array",
         "description": "The shape, a sequence of point locations, that is going to be matched on the map.",
@@ -311,6 +420,31 @@ def add_components(spec):
         "example": ["edge.names", "node.intersecting_edge.road_class", "matched.distance_from_trace_point"]
     }
 
+    preprocessing_options = {
+        "preprocess": {
+            "type": "boolean",
+            "description": "Whether to clean and simplify the shape before matching. Consecutive duplicate points are always dropped; speed outliers and simplification are controlled by the rest of the pre-processing options. The first and last points, as well as points of type *break*, are always retained. The indices of the retained points in the original shape are returned in the **preprocessing** attribute of the response.",
+            "default": False
+        },
+        "max_speed": {
+            "type": "number",
+            "format": "float",
+            "description": "(*Pre-processing*) Maximum plausible speed in meters per second; points that would require a higher speed both to be reached and to be left are dropped as outliers. It is taken into account only if all points carry a **time**.",
+            "minimum": 0
+        },
+        "simplify": {
+            "type": "string",
+            "description": "(*Pre-processing*) The simplification method:\n- *distance*: retain at most one point per **simplify_tolerance** meters along the path.\n- *douglas_peucker*: drop points that lie within **simplify_tolerance** meters from the simplified line.",
+            "enum": ["distance", "douglas_peucker"]
+        },
+        "simplify_tolerance": {
+            "type": "number",
+            "format": "float",
+            "description": "(*Pre-processing*) The simplification tolerance in meters; defaults to **gps_accuracy** if given, otherwise to 5 meters.",
+            "minimum": 0
+        }
+    }
+
     trace_attributes_form = {
         "type": "object",
         "properties": {
@@ -322,7 +456,8 @@ def add_components(spec):
                 "description": "Whether to *exclude* or *include* the given **filters**; it will be ignored if no filters are supplied.",
                 "enum": ["exclude", "include"],
                 "default": "exclude"
-            }
+            },
+            **preprocessing_options
         },
         "required": ["shape"]
     }
@@ -392,7 +527,8 @@ def add_components(spec):
                 "type": "integer",
                 "description": "Breaking distance in meters between trace points."
             },
-            **directions_options
+            **directions_options,
+            **preprocessing_options
         },
         "required": ["shape"]
     }
@@ -535,452 +671,6 @@ def add_components(spec):
         }
     }
 
-    generic_options = {
-        "maneuver_penalty": {
-            "type": "integer",
-            "description": "A penalty (*in seconds*) applied when transitioning between roads that do not have consistent naming - in other words, no road names in common. This penalty can be used to create simpler routes that tend to have fewer maneuvers or narrative guidance instructions.",
-            "default": 5,
-            "minimum": 0
-        },
-        "gate_cost": {
-            "type": "integer",
-            "description": "A cost (*in seconds*) applied when a gate with undefined or private access is encountered. This cost is added to the estimated time / elapsed time.",
-            "default": 30,
-            "minimum": 0
-        },
-        "gate_penalty": {
-            "type": "integer",
-            "description": "A penalty (*in seconds*) applied when a gate with no access information is on the road.",
-            "default": 300,
-            "minimum": 0
-        },
-        "country_crossing_cost": {
-            "type": "integer",
-            "description": "A cost (*in seconds) applied when encountering an international border. This cost is added to the estimated and elapsed times. ",
-            "default": 600,
-            "minimum": 0
-        },
-        "country_costing_penalty": {
-            "type": "integer",
-            "description": "A penalty (*in seconds) applied for a country crossing. This penalty can be used to create paths that avoid spanning country boundaries.",
-            "default": 0,
-            "minimum": 0
-        },
-        "service_penalty": {
-            "type": "integer",
-            "description": "A penalty (*in seconds*) applied for transition to generic service road.",
-            "default": 15,
-            "minimum": 0
-        }
-    }
-
-    automobile_options = {
-        "use_ferry": {
-            "type": "number",
-            "format": "float",
-            "description": "This value indicates the willingness to take ferries. This is a range of values between 0 and 1. Values near 0 attempt to avoid ferries and values near 1 will favor ferries. Note that sometimes ferries are required to complete a route so values of 0 are not guaranteed to avoid ferries entirely.",
-            "default": 0.5,
-            "minimum": 0.0,
-            "maximum": 1.0
-        },
-        "use_tolls": {
-            "type": "number",
-            "format": "float",
-            "description": "This value indicates the willingness to take roads with tolls. This is a range of values between 0 and 1. Values near 0 attempt to avoid tolls and values near 1 will not attempt to avoid them. Note that sometimes roads with tolls are required to complete a route so values of 0 are not guaranteed to avoid them entirely.",
-            "default": 0.5,
-            "minimum": 0.0,
-            "maximum": 1.0
-        },
-        "use_living_streets": {
-            "type": "number",
-            "format": "float",
-            "description": "This value indicates the willingness to take living streets. This is a range of values between 0 and 1. Values near 0 attempt to avoid living streets and values near 1 will favor living streets. Note that sometimes living streets are required to complete a route so values of 0 are not guaranteed to avoid living streets entirely.",
-            "default": 0.1,
-            "minimum": 0.0,
-            "maximum": 1.0
-        },
-        "use_tracks": {
-            "type": "number",
-            "format": "float",
-            "description": "This value indicates the willingness to take track roads. This is a range of values between 0 and 1. Values near 0 attempt to avoid tracks and values near 1 will favor tracks a little bit. Note that sometimes tracks are required to complete a route so values of 0 are not guaranteed to avoid tracks entirely.",
-            "default": 0.0,
-            "minimum": 0.0,
-            "maximum": 1.0
-        },
-        **generic_options,
-        "private_access_penalty": {
-            "type": "integer",
-            "description": "A penalty (* in seconds*) applied when a gate or bollard with access=private is encountered.",
-            "default": 450,
-            "minimum": 0
-        },
-        "toll_booth_cost": {
-            "type": "integer",
-            "description": "A cost (* in seconds*) applied when a toll booth is encountered. This cost is added to the estimated and elapsed times.",
-            "default": 15,
-            "minimum": 0
-        },
-        "toll_booth_penalty": {
-            "type": "integer",
-            "description": "A penalty (* in seconds*) applied to the cost when a toll booth is encountered. This penalty can be used to create paths that avoid toll roads.",
-            "default": 0,
-            "minimum": 0
-        },
-        "ferry_cost": {
-            "type": "integer",
-            "description": "A cost (* in seconds*) applied when entering a ferry. This cost is added to the estimated and elapsed times.",
-            "default": 300,
-            "minimum": 0
-        },
-        "service_factor": {
-            "type": "integer",
-            "description": "A factor that modifies (multiplies) the cost when generic service roads are encountered.",
-            "default": 1,
-            "minimum": 0
-        },
-        "shortest": {
-            "type": "boolean",
-            "description": "Changes the metric to quasi-shortest, i.e. purely distance-based costing. Note, this will disable all other costings & penalties. Also note, shortest will not disable hierarchy pruning, leading to potentially sub-optimal routes for some costing models.",
-            "default": "false"
-        },
-        "top_speed": {
-            "type": "integer",
-            "description": "Top speed (*in km/h*) the vehicle can go. Used to avoid roads with higher speeds than this value.",
-            "default": 140,
-            "minimum": 10,
-            "maximum": 252
-        },
-        "ignore_closures": {
-            "type": "boolean",
-            "description": "If set to true, ignores all closures, marked due to live traffic closures, during routing. Note: This option cannot be set if *location.search_filter.exclude_closures* is also specified in the request and will return an error.",
-            "default": "false"
-        },
-        "closure_factor": {
-            "type": "number",
-            "format": "float",
-            "description": "A factor that penalizes the cost when traversing a closed edge (eg: if search_filter.exclude_closures is false for origin and/or destination location and the route starts/ends on closed edges). Its value can range from 1.0 - don't penalize closed edges, to 10.0 - apply high cost penalty to closed edges.",
-            "default": 9.0,
-            "minimum": 1.0,
-            "maximum": 10.0
-        }
-    }
-
-    vehicle_options = {
-        **automobile_options,
-        "height": {
-            "type": "number",
-            "format": "float",
-            "description": "The height of the vehicle (*in meters*).",
-            "example": 1.5,
-            "minimum": 0
-        },
-        "width": {
-            "type": "number",
-            "format": "float",
-            "description": "The width of the vehicle (*in meters*).",
-            "example": 2.2,
-            "minimum": 0
-        },
-        "exclude_unpaved": {
-            "type": "boolean",
-            "description": "This value indicates whether or not the path may include unpaved roads.",
-            "default": "false"
-        },
-        "exclude_cash_only_tolls": {
-            "type": "boolean",
-            "description": "A boolean value which indicates the desire to avoid routes with cash-only tolls.",
-            "default": "false"
-        },
-        "include_hov2": {
-            "type": "boolean",
-            "description": "A boolean value which indicates the desire to include HOV roads with a 2-occupant requirement in the route when advantageous.",
-            "default": "false"
-        },
-        "include_hov3": {
-            "type": "boolean",
-            "description": "A boolean value which indicates the desire to include HOV roads with a 3-occupant requirement in the route when advantageous.",
-            "default": "false"
-        },
-        "include_hov": {
-            "type": "boolean",
-            "description": "A boolean value which indicates the desire to include tolled HOV roads which require the driver to pay a toll if the occupant requirement isn't met.",
-            "default": "false"
-        }
-    }
-
-    truck_options = {
-        **vehicle_options,
-        "use_living_streets": {
-            **automobile_options['use_living_streets'],
-            "default": 0.0
-        },
-        "service_penalty": {
-            **generic_options['service_penalty'],
-            "default": 0
-        },
-        "length": {
-            "type": "number",
-            "format": "float",
-            "description": "The length of the truck (*in meters*).",
-            "example": 5.5,
-            "minimum": 0
-        },
-        "weight": {
-            "type": "number",
-            "format": "float",
-            "description": "The weight of the truck (*in metric tons*).",
-            "default": 2.5,
-            "minimum": 0
-        },
-        "axle_load": {
-            "type": "number",
-            "format": "float",
-            "description": "The axle load of the truck (*in metric tons*).",
-            "example": 1.3,
-            "minimum": 0
-        },
-        "hazmat": {
-            "type": "boolean",
-            "description": "A value indicating if the truck is carrying hazardous materials.",
-            "default": "false"
-        }
-    }
-
-    bicycle_options = {
-        **generic_options,
-        "bicycle_type": {
-            "type": "string",
-            "description": "The type of bicycle:\n- Road: a road-style bicycle with narrow tires that is generally lightweight and designed for speed on paved surfaces.\n- *Hybrid* or City: a bicycle made mostly for city riding or casual riding on roads and paths with good surfaces.\n- *Cross*: a cyclo-cross bicycle, which is similar to a road bicycle but with wider tires suitable to rougher surfaces.\n- *Mountain*: a mountain bicycle suitable for most surfaces but generally heavier and slower on paved surfaces.",
-            "enum": ["Road", "Hybrid", "City", "Cross", "Mountain"],
-            "default": "Hybrid"
-        },
-        "cycling_speed": {
-            "type": "integer",
-            "description": "Cycling speed is the average travel speed along smooth, flat roads. This is meant to be the speed a rider can comfortably maintain over the desired distance of the route. It can be modified (in the costing method) by surface type in conjunction with bicycle type. When no speed is specifically provided, the default speed is determined by the bicycle type and are as follows: *Road* = 25 km/h, Cross = 20 km/h, Hybrid/City = 18 km/h, and Mountain = 16 km/h.",
-            "example": 25,
-            "minimum": 0
-        },
-        "use_roads": {
-            "type": "number",
-            "format": "float",
-            "description": "A cyclist's propensity to use roads alongside other vehicles. This is a range of values from 0 to 1, where 0 attempts to avoid roads and stay on cycleways and paths, and 1 indicates the rider is more comfortable riding on roads. Based on the use_roads factor, roads with certain classifications and higher speeds are penalized in an attempt to avoid them when finding the best path.",
-            "default": 0.5,
-            "minimum": 0.0,
-            "maximum": 1.0
-        },
-        "use_hills": {
-            "type": "number",
-            "format": "float",
-            "description": "A cyclist's desire to tackle hills in their routes. This is a range of values from 0 to 1, where 0 attempts to avoid hills and steep grades even if it means a longer (time and distance) path, while 1 indicates the rider does not fear hills and steeper grades. Based on the use_hills factor, penalties are applied to roads based on elevation change and grade. These penalties help the path avoid hilly roads in favor of flatter roads or less steep grades where available. Note that it is not always possible to find alternate paths to avoid hills (for example when route locations are in mountainous areas).",
-            "default": 0.5,
-            "minimum": 0.0,
-            "maximum": 1.0
-        },
-        "use_ferry": {**automobile_options['use_ferry']},
-        "use_living_streets": {
-            **automobile_options['use_living_streets'],
-            "default": 0.5
-        },
-        "avoid_bad_surfaces": {
-            "type": "number",
-            "format": "float",
-            "description": "This value is meant to represent how much a cyclist wants to avoid roads with poor surfaces relative to the bicycle type being used. This is a range of values between 0 and 1. When the value is 0, there is no penalization of roads with different surface types; only bicycle speed on each surface is taken into account. As the value approaches 1, roads with poor surfaces for the bike are penalized heavier so that they are only taken if they significantly improve travel time. When the value is equal to 1, all bad surfaces are completely disallowed from routing, including start and end points.",
-            "default": 0.25,
-            "minimum": 0.0,
-            "maximum": 1.0
-        },
-        "shortest": {
-            "type": "boolean",
-            "description": "Changes the metric to quasi-shortest, i.e. purely distance-based costing. Note, this will disable all other costings & penalties. Also note, shortest will not disable hierarchy pruning, leading to potentially sub-optimal routes for some costing models.",
-            "default": "false"
-        }
-    }
-
-    bikeshare_options = {
-        **bicycle_options,
-        "bss_return_cost": {
-            "type": "integer",
-            "description": "It is meant to give the time (*in seconds*) will be used to return a rental bike. This value will be displayed in the final directions and used to calculate the whole duation.",
-            "default": 120,
-            "minimum": 0
-        },
-        "bss_return_penalty": {
-            "type": "integer",
-            "description": "It is meant to describe the potential effort (*in seconds*) to return a rental bike. This value won't be displayed and used only inside of the algorithm.",
-            "default": 0,
-            "minimum": 0
-        },
-    }
-
-    motor_scooter_options = {
-        **automobile_options,
-        "top_speed": {
-            **automobile_options['top_speed'],
-            "minimum": 20,
-            "maximum": 120,
-            "default": 45
-        },
-        "use_primary": {
-            "type": "number",
-            "format": "float",
-            "description": "A riders's propensity to use primary roads. This is a range of values from 0 to 1, where 0 attempts to avoid primary roads, and 1 indicates the rider is more comfortable riding on primary roads. Based on the *use_primary* factor, roads with certain classifications and higher speeds are penalized in an attempt to avoid them when finding the best path.",
-            "default": 0.5,
-            "minimum": 0.0,
-            "maximum": 1.0
-        },
-        "use_hills": {
-            "type": "number",
-            "format": "float",
-            "description": "A riders's desire to tackle hills in their routes. This is a range of values from 0 to 1, where 0 attempts to avoid hills and steep grades even if it means a longer (time and distance) path, while 1 indicates the rider does not fear hills and steeper grades. Based on the *use_hills* factor, penalties are applied to roads based on elevation change and grade. These penalties help the path avoid hilly roads in favor of flatter roads or less steep grades where available. Note that it is not always possible to find alternate paths to avoid hills (for example when route locations are in mountainous areas).",
-            "default": 0.5,
-            "minimum": 0.0,
-            "maximum": 1.0
-        }
-    }
-
-    motorcycle_options = {
-        **automobile_options,
-        "use_highways": {
-            "type": "number",
-            "format": "float",
-            "description": "A riders's propensity to prefer the use of highways. This is a range of values from 0 to 1, where 0 attempts to avoid highways, and values toward 1 indicates the rider prefers highways.",
-            "default": 1.0,
-            "minimum": 0.0,
-            "maximum": 1.0
-        },
-        "use_trails": {
-            "type": "number",
-            "format": "float",
-            "description": "A riders's desire for adventure in their routes. This is a range of values from 0 to 1, where 0 will avoid trails, tracks, unclassified or bad surfaces and values towards 1 will tend to avoid major roads and route on secondary roads.",
-            "default": 1.0,
-            "minimum": 0.0,
-            "maximum": 0.0
-        }
-    }
-
-    pedestrian_options = {
-        "walking_speed": {
-            "type": "number",
-            "format": "float",
-            "description": "Walking speed in km/h.",
-            "default": 5.1,
-            "minimum": 0.5,
-            "maximum": 25.0
-        },
-        "walkway_factor": {
-            "type": "number",
-            "format": "float",
-            "description": "A factor that modifies the cost when encountering roads classified as footway (no motorized vehicles allowed), which may be designated footpaths or designated sidewalks along residential roads. Pedestrian routes generally attempt to favor using these walkways and sidewalks.",
-            "default": 1.0,
-            "minimum": 0
-        },
-        "sidewalk_factor": {
-            "type": "number",
-            "format": "float",
-            "description": "A factor that modifies the cost when encountering roads with dedicated sidewalks. Pedestrian routes generally attempt to favor using sidewalks.",
-            "default": 1.0,
-            "minimum": 0
-        },
-        "alley_factor": {
-            "type": "number",
-            "format": "float",
-            "description": "A factor that modifies (multiplies) the cost when alleys are encountered. Pedestrian routes generally want to avoid alleys or narrow service roads between buildings.",
-            "default": 2.0,
-            "minimum": 0
-        },
-        "driveway_factor": {
-            "type": "number",
-            "format": "float",
-            "description": "A factor that modifies (multiplies) the cost when encountering a driveway, which is often a private, service road. Pedestrian routes generally want to avoid driveways (private).",
-            "default": 5.0,
-            "minimum": 0
-        },
-        "step_penalty": {
-            "type": "integer",
-            "description": "A penalty (*in seconds*) added to each transition onto a path with steps or stairs. Higher values apply larger cost penalties to avoid paths that contain flights of steps.",
-            "default": 0,
-            "minimum": 0
-        },
-        "use_ferry": {**automobile_options['use_ferry']},
-        "use_living_streets": {
-            **automobile_options['use_living_streets'],
-            "default": 0.6
-        },
-        "use_tracks": {
-            **automobile_options['use_tracks'],
-            "default": 0.5
-        },
-        "use_hills": {
-            "type": "number",
-            "format": "float",
-            "description": "This is a range of values from 0 to 1, where 0 attempts to avoid hills and steep grades even if it means a longer (time and distance) path, while 1 indicates the pedestrian does not fear hills and steeper grades. Based on the use_hills factor, penalties are applied to roads based on elevation change and grade. These penalties help the path avoid hilly roads in favor of flatter roads or less steep grades where available. Note that it is not always possible to find alternate paths to avoid hills (for example when route locations are in mountainous areas).",
-            "default": 0.5,
-            "minimum": 0.0,
-            "maximum": 1.0
-        },
-        "service_penalty": {
-            "type": "integer",
-            "description": "A penalty (*in seconds*) applied for transition to generic service road.",
-            "default": 0,
-            "minimum": 0
-        },
-        "service_factor": {
-            "type": "integer",
-            "description": "A factor that modifies (multiplies) the cost when generic service roads are encountered.",
-            "default": 1,
-            "minimum": 0
-        },
-        "max_hiking_difficulty": {
-            "type": "integer",
-            "description": "This value indicates the maximum difficulty of hiking trails that is allowed. Values between 0 and 6 are allowed. The values correspond to sac_scale values within OpenStreetMap; [see reference](https://wiki.openstreetmap.org/wiki/Key:sac_scale). The default value is 1 which means that well cleared trails that are mostly flat or slightly sloped are allowed. Higher difficulty trails can be allowed by specifying a higher value.",
-            "minimum": 1,
-            "maximum": 6,
-            "default": 1
-        },
-        "shortest": {
-            **automobile_options['shortest']
-        }
-    }
-
-    transit_options = {
-        "use_bus": {
-            "type": "number",
-            "format": "float",
-            "description": "Range of values from 0 (try to avoid buses) to 1 (strong preference for riding buses).",
-            "default": 0.3,
-            "minimum": 0,
-            "maximum": 1
-        },
-        "use_rail": {
-            "type": "number",
-            "format": "float",
-            "description": "Range of values from 0 (try to avoid rail) to 1 (strong preference for riding rail).",
-            "default": 0.6,
-            "minimum": 0,
-            "maximum": 1
-        },
-        "use_transfers": {
-            "type": "number",
-            "format": "float",
-            "description": "Range of values from 0 (try to avoid transfers) to 1 (totally comfortable with transfers).",
-            "default": 0.3,
-            "minimum": 0,
-            "maximum": 1
-        },
-        "transit_start_end_max_distance": {
-            "type": "integer",
-            "description": "A pedestrian option (*in meters*) that can be added to the request to extend the defaults. This is the maximum walking distance at the beginning or end of a route.",
-            "default": 2145,
-            "minimum": 0
-        },
-        "transit_transfer_max_distance": {
-            "type": "integer",
-            "description": "A pedestrian option (*in meters*) that can be added to the request to extend the defaults. This is the maximum walking distance between transfers.",
-            "default": 800,
-            "minimum": 0
-        }
-    }
-
     def createRoutingForm(options: dict):
         return {
             "type": "object",
@@ -1008,14 +698,57 @@ def add_components(spec):
             "required": ["locations"]
         }
 
-    spec.components.schema('routingVehicleForm', {**createRoutingForm(vehicle_options)})
-    spec.components.schema('routingTruckForm', createRoutingForm(truck_options))
-    spec.components.schema('routingBicycleForm', createRoutingForm(bicycle_options))
-    spec.components.schema('routingBikeshareForm', createRoutingForm(bikeshare_options))
-    spec.components.schema('routingMotorScooterForm', createRoutingForm(motor_scooter_options))
-    spec.components.schema('routingMotorcycleForm', createRoutingForm(motorcycle_options))
-    spec.components.schema('routingPedestrianForm', createRoutingForm(pedestrian_options))
-    spec.components.schema('routingTransitForm', createRoutingForm(transit_options))
+    spec.components.schema('routingVehicleForm', createRoutingForm(COSTING_OPTIONS['vehicle']))
+    spec.components.schema('routingTruckForm', createRoutingForm(COSTING_OPTIONS['truck']))
+    spec.components.schema('routingBicycleForm', createRoutingForm(COSTING_OPTIONS['bicycle']))
+    spec.components.schema('routingBikeshareForm', createRoutingForm(COSTING_OPTIONS['bikeshare']))
+    spec.components.schema('routingMotorScooterForm', createRoutingForm(COSTING_OPTIONS['motor_scooter']))
+    spec.components.schema('routingMotorcycleForm', createRoutingForm(COSTING_OPTIONS['motorcycle']))
+    spec.components.schema('routingPedestrianForm', createRoutingForm(COSTING_OPTIONS['pedestrian']))
+    spec.components.schema('routingTransitForm', createRoutingForm(COSTING_OPTIONS['transit']))
+
+    optimization_options = {
+        "type": "object",
+        "properties": {
+            "optimize_for": {
+                "type": "string",
+                "description": "The cost to minimize.",
+                "enum": ["time", "distance"],
+                "default": "time"
+            },
+            "roundtrip": {
+                "type": "boolean",
+                "description": "Whether the route should return to the first location.",
+                "default": False
+            },
+            "fixed_end": {
+                "type": "boolean",
+                "description": "Whether the last location should remain the end of the route (ignored for round trips).",
+                "default": False
+            },
+            "time_budget": {
+                "type": "number",
+                "format": "float",
+                "description": "The maximum time in seconds spent on improving the order of the locations.",
+                "minimum": 0,
+                "maximum": 10,
+                "default": 1.0
+            }
+        }
+    }
+    spec.components.schema('optimizedRouteForm', {
+        "description": "The routing form of the corresponding costing model, along with the optimization options.",
+        "anyOf": [{"allOf": [{"$ref": "#/components/schemas/" + name}, optimization_options]} for name in ['routingVehicleForm', 'routingTruckForm', 'routingBicycleForm', 'routingBikeshareForm', 'routingMotorScooterForm', 'routingMotorcycleForm', 'routingPedestrianForm']]
+    })
+    spec.components.parameter('costingOptimizedRoute', 'path', {
+        "name": "costing",
+        "description": "The costing model. The options of the request body depend on the costing model, as in the corresponding */route* endpoint.",
+        "required": True,
+        "schema": {
+            "type": "string",
+            "enum": ["auto", "taxi", "bus", "truck", "bicycle", "bikeshare", "motor_scooter", "motorcycle", "pedestrian"]
+        }
+    })
 
     # Routes schemata
 
@@ -1247,6 +980,27 @@ def add_components(spec):
         }
     }
     spec.components.schema('routeResponse', route_response)
+    spec.components.schema('optimizedRouteResponse', {**route_response, "properties": {**route_response["properties"], "optimization": {
+        "type": "object",
+        "description": "The result of the stop ordering optimization.",
+        "properties": {
+            "order": {
+                "type": "array",
+                "description": "The indices of the requested locations, in the order they are visited (for round trips, the first location is repeated at the end).",
+                "items": {"type": "integer"},
+                "example": [0, 2, 3, 1]
+            },
+            "cost": {
+                "type": "number",
+                "format": "float",
+                "description": "The total cost (in seconds or kilometers, according to **optimize_for**) of the order, as estimated by the matrix."
+            },
+            "metric": {
+                "type": "string",
+                "enum": ["time", "distance"]
+            }
+        }
+    }}})
 
     # Attributes schema
 
@@ -1561,6 +1315,19 @@ def add_components(spec):
         }
     }
 
+    preprocessing_response = {
+        "type": "object",
+        "description": "(*Only if pre-processing was requested*) Information about the pre-processing of the shape.",
+        "properties": {
+            "original_indices": {
+                "type": "array",
+                "description": "The indices in the original shape of the points that were actually matched.",
+                "items": {"type": "integer"},
+                "example": [0, 3, 4, 9]
+            }
+        }
+    }
+
     trace_attributes_response = {
         "type": "object",
         "description": "The result of the map matching.",
@@ -1601,11 +1368,15 @@ def add_components(spec):
                 "type": "integer",
                 "description": "Identifier of the OpenStreetMap base data version.",
                 "example": 8855162523
-            }
+            },
+            "preprocessing": preprocessing_response
         }
     }
     spec.components.schema('traceAttributesResponse', trace_attributes_response)
 
+    trace_route_response = {**route_response, "properties": {**route_response["properties"], "preprocessing": preprocessing_response}}
+    spec.components.schema('traceRouteResponse', trace_route_response)
+
     # Responses
 
     validation_error_response = {
@@ -1635,6 +1406,30 @@ def add_components(spec):
     }
     spec.components.response('validationErrorResponse', validation_error_response)
 
+    spec.components.response('outOfCoverageResponse', {
+        "description": "Coordinates outside the coverage of the service (if configured).",
+        "content": {
+            "application/json": {
+                "schema": {
+                    "type": "object",
+                    "description": "The key is the request parameter.",
+                    "additionalProperties": {
+                        "type": "array",
+                        "items": {
+                            "type": "string",
+                            "description": "The indices of the points outside the coverage."
+                        }
+                    },
+                    "example": {
+                        "locations": [
+                            "Outside of the coverage: points 1."
+                        ]
+                    }
+                }
+            }
+        }
+    })
+
     isochrone_response = {
         "description": "The isoline contours as GeoJSON. The contours are calculated using rasters and are returned as either polygon or line features, depending on the input setting for the polygons parameter.",
         "content": {
@@ -1645,6 +1440,39 @@ def add_components(spec):
     }
     spec.components.response('isochroneResponse', isochrone_response)
 
+    spec.components.response('isolineUnionResponse', {
+        "description": "A GeoJSON FeatureCollection. For each range band (in descending order), a feature with the union of the reachable regions, with properties *contour*, *metric* and *origins* (the number of contributing locations). If **overlap** was requested, these are followed by features with the regions reachable from the same number of locations, with properties *contour*, *metric* and *count*.",
+        "content": {
+            "application/json": {
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "type": {
+                            "type": "string",
+                            "example": "FeatureCollection"
+                        },
+                        "features": {
+                            "type": "array",
+                            "items": {"type": "object"}
+                        }
+                    }
+                }
+            }
+        }
+    })
+
+    spec.components.response('isolineTileResponse', {
+        "description": "The isoline contours in the requested tile, as Mapbox Vector Tile. The contours are included in a layer named *isoline*, with the same properties as the GeoJSON features.",
+        "content": {
+            "application/vnd.mapbox-vector-tile": {
+                "schema": {
+                    "type": "string",
+                    "format": "binary"
+                }
+            }
+        }
+    })
+
     route_response = {
         "description": "A JSON describing the computed route.",
         "content": {
@@ -1655,6 +1483,24 @@ def add_components(spec):
     }
     spec.components.response('routeResponse', route_response)
 
+    spec.components.response('optimizedRouteResponse', {
+        "description": "A JSON describing the computed route through the locations in the optimized order.",
+        "content": {
+            "application/json": {
+                "schema": {"$ref": "#/components/schemas/optimizedRouteResponse"}
+            }
+        }
+    })
+
+    spec.components.response('traceRouteResponse', {
+        "description": "A JSON describing the matched route.",
+        "content": {
+            "application/json": {
+                "schema": trace_route_response
+            }
+        }
+    })
+
     spec.components.response('traceAttributesResponse', {
         "description": "A JSON describing the computed attributes.",
         "content": {
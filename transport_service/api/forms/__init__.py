@@ -1,10 +1,13 @@
 from flask_wtf import FlaskForm
 from wtforms.meta import DefaultMeta
+from wtforms.fields.core import UnboundField
 
 class BindNameMeta(DefaultMeta):
     def bind_field(self, form, unbound_field, options):
         if 'name' in unbound_field.kwargs:
-            options['name'] = unbound_field.kwargs.pop('name')
+            kwargs = dict(unbound_field.kwargs)
+            options['name'] = kwargs.pop('name')
+            unbound_field = UnboundField(unbound_field.field_class, *unbound_field.args, **kwargs)
         return unbound_field.bind(form=form, **options)
 
 class BaseForm(FlaskForm):
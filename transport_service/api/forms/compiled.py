@@ -0,0 +1,326 @@
+"""Compiled validation of JSON request bodies.
+
+Instantiating and validating a WTForms form binds a field object (with its widget, label and translations) for every field of the form on every request, and the nested `ListForm` and `JSONForm` validators repeat this for every item. A compiled form inspects the form class once and produces a plan of plain functions that checks a parsed JSON dictionary in a single pass, returning the same data and errors as the form would.
+
+Only the field types and validators used by the service are supported; forms using anything else are not compiled, and `validate_request` falls back to the WTForms path for them.
+"""
+
+import os
+import math
+import threading
+from flask import request
+from wtforms import StringField, FloatField, IntegerField, BooleanField as OriginalBoolean
+from wtforms.meta import DefaultMeta
+from wtforms.validators import Optional, DataRequired, AnyOf, NumberRange, ValidationError, StopValidation
+from .fields import JSONField, BooleanField
+from .validators import Coordinate, ListForm, JSONForm, SomeOf, ListOf
+from ... import tracing, deadline
+
+
+class NotCompilable(Exception):
+    """Raised when a form uses fields or validators not supported by the compiler."""
+
+
+def _getlist(data: dict, name: str) -> list:
+    """Get the list of values of a key, as `ImmutableMultiDict(data).getlist(name)` would."""
+    value = data.get(name)
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    if name not in data:
+        return []
+    return [value]
+
+
+def _processor(field):
+    """Compile the conversion of the raw values of a field to its data.
+
+    Returns:
+        (callable) A function taking the raw values and returning the data and the processing errors.
+    """
+    default = field.default() if callable(field.default) else field.default
+    if isinstance(field, JSONField):
+        is_list = field._type == 'list'
+        def process(raw):
+            if not raw:
+                return default, []
+            return (raw if is_list else raw[0]), []
+    elif isinstance(field, BooleanField):
+        false_values = field.false_values
+        def process(raw):
+            if not raw:
+                return field.default, []
+            return raw[0] not in false_values, []
+    elif isinstance(field, OriginalBoolean):
+        false_values = field.false_values
+        def process(raw):
+            return not (not raw or raw[0] in false_values), []
+    elif type(field) is IntegerField:
+        message = field.gettext('Not a valid integer value')
+        def process(raw):
+            data, errors = None, []
+            if default is not None:
+                try:
+                    data = int(default)
+                except (ValueError, TypeError, OverflowError):
+                    errors.append(message)
+            if raw:
+                try:
+                    data = int(raw[0])
+                except (ValueError, TypeError, OverflowError):
+                    data = None
+                    errors.append(message)
+            return data, errors
+    elif type(field) is FloatField:
+        message = field.gettext('Not a valid float value')
+        def process(raw):
+            if not raw:
+                return default, []
+            try:
+                return float(raw[0]), []
+            except (ValueError, TypeError):
+                return None, [message]
+    elif type(field) is StringField:
+        def process(raw):
+            if raw:
+                return raw[0], []
+            return (default if default is not None else ''), []
+    else:
+        raise NotCompilable('Unsupported field type {}.'.format(type(field).__name__))
+    return process
+
+
+def _validator(validator, field):
+    """Compile a validator.
+
+    Returns:
+        (callable) A function taking the field data, the raw values and the errors list; it returns the (possibly converted) data, or raises `StopValidation` / `ValidationError` as the validator would.
+    """
+    if isinstance(validator, Optional):
+        string_check = validator.string_check
+        def validate(data, raw, errors):
+            if not raw or isinstance(raw[0], str) and not string_check(raw[0]):
+                errors[:] = []
+                raise StopValidation()
+            return data
+    elif isinstance(validator, DataRequired):
+        message = validator.message if validator.message is not None else field.gettext('This field is required.')
+        def validate(data, raw, errors):
+            if not data or isinstance(data, str) and not data.strip():
+                errors[:] = []
+                raise StopValidation(message)
+            return data
+    elif isinstance(validator, AnyOf):
+        message = (validator.message if validator.message is not None else field.gettext('Invalid value, must be one of: %(values)s.')) % dict(values=validator.values_formatter(validator.values))
+        values = validator.values
+        try:
+            lookup = frozenset(values)
+        except TypeError:
+            lookup = values
+        def validate(data, raw, errors):
+            try:
+                found = data in lookup
+            except TypeError:
+                found = data in values
+            if not found:
+                raise ValidationError(message)
+            return data
+    elif isinstance(validator, NumberRange):
+        minimum, maximum = validator.min, validator.max
+        message = validator.message
+        if message is None:
+            if maximum is None:
+                message = field.gettext('Number must be at least %(min)s.')
+            elif minimum is None:
+                message = field.gettext('Number must be at most %(max)s.')
+            else:
+                message = field.gettext('Number must be between %(min)s and %(max)s.')
+        message = message % dict(min=minimum, max=maximum)
+        def validate(data, raw, errors):
+            if data is None or math.isnan(data) or (minimum is not None and data < minimum) or (maximum is not None and data > maximum):
+                raise ValidationError(message)
+            return data
+    elif isinstance(validator, Coordinate):
+        lower, upper, message = validator.lower, validator.upper, validator.message
+        def validate(data, raw, errors):
+            if data < lower or data > upper:
+                raise ValidationError(message)
+            return data
+    elif isinstance(validator, ListForm):
+        row_form, maximum, message, max_message = compile_form(validator.form, strict=True), validator.max, validator.message, validator.max_message
+        def validate(data, raw, errors):
+            if maximum is not None and isinstance(data, list) and len(data) > maximum:
+                raise ValidationError(max_message)
+            row_errors, rows = [], []
+            for index, row in enumerate(data):
+                if not isinstance(row, dict):
+                    raise ValidationError(message)
+                row_data, error = row_form.validate(row)
+                if error:
+                    row_errors.append({attr + '-' + str(index): error[attr] for attr in error})
+                else:
+                    rows.append(row_data)
+            if len(row_errors) > 0:
+                raise ValidationError(row_errors)
+            return rows
+    elif isinstance(validator, JSONForm):
+        nested_form, message = compile_form(validator.form, strict=True), validator.message
+        def validate(data, raw, errors):
+            if not isinstance(data, dict):
+                raise ValidationError(message)
+            _, error = nested_form.validate(data)
+            if error:
+                raise ValidationError(error)
+            return data
+    elif isinstance(validator, SomeOf):
+        enum, message = frozenset(validator.enum), validator.message
+        def validate(data, raw, errors):
+            data = [value.strip() for value in data.split(',')] if isinstance(data, str) else data
+            for value in data:
+                try:
+                    found = value in enum
+                except TypeError:
+                    # Unhashable values (e.g. objects) are not in the list
+                    found = False
+                if not found:
+                    raise ValidationError(message)
+            return data
+    elif isinstance(validator, ListOf):
+        coerce, minimum, maximum, message = validator.coerce, validator.min, validator.max, validator.message
+        def validate(data, raw, errors):
+            if not isinstance(data, list) or len(data) == 0:
+                raise ValidationError(message)
+            try:
+                coerced = [coerce(value) for value in data]
+            except (TypeError, ValueError, OverflowError):
+                raise ValidationError(message)
+            if any(isinstance(value, float) and value != converted for value, converted in zip(data, coerced)):
+                raise ValidationError(message)
+            data = coerced
+            for value in data:
+                if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+                    raise ValidationError(message)
+            return data
+    else:
+        raise NotCompilable('Unsupported validator {}.'.format(type(validator).__name__))
+    return validate
+
+
+class CompiledForm:
+    """A form class compiled to a validation plan.
+
+    Attributes:
+        form (class): The compiled form class.
+    """
+
+    def __init__(self, Form):
+        self.form = Form
+        meta = DefaultMeta()
+        unbound_fields = [(name, getattr(Form, name)) for name in dir(Form) if not name.startswith('_') and hasattr(getattr(Form, name), '_formfield')]
+        unbound_fields.sort(key=lambda x: (x[1].creation_counter, x[0]))
+        self._plan = []
+        for attr, unbound_field in unbound_fields:
+            if hasattr(Form, 'validate_' + attr):
+                raise NotCompilable('Inline validators are not supported.')
+            kwargs = dict(unbound_field.kwargs)
+            name = kwargs.pop('name', attr)
+            field = unbound_field.field_class(*unbound_field.args, _form=None, _meta=meta, _name=name, **kwargs)
+            chain = [_validator(validator, field) for validator in field.validators]
+            self._plan.append((attr, name, _processor(field), chain))
+
+    def validate(self, data: dict) -> tuple:
+        """Validate a (parsed JSON) dictionary.
+
+        Arguments:
+            data (dict): The request data.
+
+        Returns:
+            (tuple) The form data and the errors (None if valid), as `form.data` and `form.errors` would be after `form.validate()`.
+        """
+        result = {}
+        errors = {}
+        for attr, name, process, chain in self._plan:
+            raw = _getlist(data, name)
+            value, field_errors = process(raw)
+            for validate in chain:
+                try:
+                    value = validate(value, raw, field_errors)
+                except StopValidation as e:
+                    if e.args and e.args[0]:
+                        field_errors.append(e.args[0])
+                    break
+                except ValueError as e:
+                    field_errors.append(e.args[0])
+            result[attr] = value
+            if field_errors:
+                errors[attr] = field_errors
+        return result, (errors if errors else None)
+
+
+_compiled = {}
+_compiled_lock = threading.RLock()
+
+def compile_form(Form, strict: bool=False):
+    """Get the compiled form of a form class (compiled on first use).
+
+    Arguments:
+        Form (class): The form class.
+        strict (bool): Whether to raise if the form cannot be compiled.
+
+    Raises:
+        NotCompilable: If the form cannot be compiled and `strict` is True.
+
+    Returns:
+        (CompiledForm) The compiled form, or None if the form cannot be compiled.
+    """
+    with _compiled_lock:
+        if Form not in _compiled:
+            try:
+                _compiled[Form] = CompiledForm(Form)
+            except NotCompilable:
+                _compiled[Form] = None
+        compiled = _compiled[Form]
+    if compiled is None and strict:
+        raise NotCompilable('Form {} cannot be compiled.'.format(Form.__name__))
+    return compiled
+
+
+def validate_request(Form) -> tuple:
+    """Validate the current request with a form class.
+
+    Non-empty JSON object bodies are validated with the compiled form; any other request (or a form that cannot be compiled) goes through WTForms.
+
+    Arguments:
+        Form (class): The form class.
+
+    Raises:
+        DeadlineExceeded: If the deadline of the request passed during the validation.
+        OutOfCoverage: If the request is valid, but has coordinates outside the coverage.
+
+    Returns:
+        (tuple) The form data and the errors (None if valid).
+    """
+    with tracing.span('validate', form=Form.__name__) as span:
+        data = request.get_json(silent=True) if request.is_json and not request.files and not request.form else None
+        compiled = compile_form(Form) if isinstance(data, dict) and data else None
+        if span is not None:
+            span.set(compiled=compiled is not None)
+        if compiled is not None:
+            result = compiled.validate(data)
+        else:
+            form = Form()
+            result = (form.data, form.errors) if not form.validate_on_submit() else (form.data, None)
+    deadline.check()
+    if result[1] is None:
+        check_coverage(result[0])
+    return result
+
+
+def check_coverage(data: dict) -> None:
+    """Check the coordinates of validated request data against the coverage, if configured by the environment variable `COVERAGE_FILE` (see `transport_service.api.coverage`).
+
+    Raises:
+        OutOfCoverage: If some points are outside the coverage.
+    """
+    if os.getenv('COVERAGE_FILE'):
+        from ..coverage import get_coverage
+        get_coverage().check(data)
@@ -1,6 +1,8 @@
+import os
 from wtforms import StringField, FloatField, IntegerField, FieldList, BooleanField
 from wtforms.validators import Optional, DataRequired, AnyOf, NumberRange
-from .validators import Lat, Lon
+from .validators import Lat, Lon, ListForm, ListOf
+from .fields import JSONField
 from . import BaseForm
 
 class IsolineForm(BaseForm):
@@ -16,3 +18,27 @@ class IsolineForm(BaseForm):
     color = FieldList(StringField('color', validators=[Optional()]))
     polygons = BooleanField('polygons', default=False, validators=[Optional()])
     denoise = FloatField('denoise', default=1.0, validators=[Optional(), NumberRange(min=0.0, max=1.0)])
+    simplify = FloatField('simplify', validators=[Optional(), NumberRange(min=0.0)])
+    precision = IntegerField('precision', validators=[Optional(), NumberRange(min=0, max=15)])
+
+UNION_MAX_LOCATIONS = int(os.getenv('UNION_MAX_LOCATIONS', 50))
+"""int: Maximum number of locations of a multi-origin union request, each computed by a separate Valhalla request."""
+
+class OriginForm(BaseForm):
+    lat = FloatField('lat', validators=[DataRequired(), Lat()])
+    lon = FloatField('lon', validators=[DataRequired(), Lon()])
+
+class IsolineUnionForm(BaseForm):
+    """Form for multi-origin isoline union requests.
+
+    Extends:
+        BaseForm
+    """
+    locations = JSONField('locations', validators=[DataRequired(), ListForm(OriginForm, max=UNION_MAX_LOCATIONS)])
+    metric = StringField('metric', default='time', validators=[Optional(), AnyOf(['time', 'distance'])])
+    costing = StringField('costing', default='auto', validators=[Optional(), AnyOf(['auto', 'bicycle', 'pedestrian', 'bikeshare', 'bus', 'multimodal'])])
+    range_ = JSONField('range', name="range", validators=[DataRequired(), ListOf(int, min=1)])
+    denoise = FloatField('denoise', default=1.0, validators=[Optional(), NumberRange(min=0.0, max=1.0)])
+    overlap = BooleanField('overlap', default=False, validators=[Optional()])
+    simplify = FloatField('simplify', validators=[Optional(), NumberRange(min=0.0)])
+    precision = IntegerField('precision', validators=[Optional(), NumberRange(min=0, max=15)])
@@ -1,8 +1,8 @@
-from wtforms import StringField, FloatField, IntegerField, FieldList, BooleanField, FormField
+from wtforms import StringField, FloatField, IntegerField, FieldList, FormField
 from wtforms.validators import Optional, DataRequired, AnyOf, NumberRange
 from flask_wtf.file import FileField, FileRequired, FileAllowed
 from .validators import ShapeCSV, Lat, Lon, ListForm, SomeOf
-from .fields import JSONField
+from .fields import JSONField, BooleanField
 from . import BaseForm
 
 filters_enum = ['edge.names', 'edge.length', 'edge.speed', 'edge.road_class', 'edge.begin_heading', 'edge.end_heading', 'edge.begin_shape_index', 'edge.end_shape_index', 'edge.traversability', 'edge.use', 'edge.toll', 'edge.unpaved', 'edge.tunnel', 'edge.bridge', 'edge.roundabout', 'edge.internal_intersection', 'edge.drive_on_right', 'edge.surface', 'edge.sign.exit_number', 'edge.sign.exit_branch', 'edge.sign.exit_toward', 'edge.sign.exit_name', 'edge.travel_mode', 'edge.vehicle_type', 'edge.pedestrian_type', 'edge.bicycle_type', 'edge.transit_type', 'edge.id', 'edge.way_id', 'edge.weighted_grade', 'edge.max_upward_grade', 'edge.max_downward_grade', 'edge.mean_elevation', 'edge.lane_count', 'edge.cycle_lane', 'edge.bicycle_network', 'edge.sac_scale', 'edge.shoulder', 'edge.sidewalk', 'edge.density', 'edge.speed_limit', 'edge.truck_speed', 'edge.truck_route', 'node.intersecting_edge.begin_heading', 'node.intersecting_edge.from_edge_name_consistency', 'node.intersecting_edge.to_edge_name_consistency', 'node.intersecting_edge.driveability', 'node.intersecting_edge.cyclability', 'node.intersecting_edge.walkability', 'node.intersecting_edge.use', 'node.intersecting_edge.road_class', 'node.intersecting_edge.lane_count', 'node.elapsed_time', 'node.admin_index', 'node.type', 'node.fork', 'node.time_zone', 'osm_changeset', 'shape', 'admin.country_code', 'admin.country_text', 'admin.state_code', 'admin.state_text', 'matched.point', 'matched.type', 'matched.edge_index', 'matched.begin_route_discontinuity', 'matched.end_route_discontinuity', 'matched.distance_along_edge', 'matched.distance_from_trace_point']
@@ -14,6 +14,10 @@ class MapMatchForm(BaseForm):
         BaseForm
     """
     costing = StringField('costing', default='auto', validators=[Optional(), AnyOf(['auto', 'auto_shorter', 'bicycle', 'bus', 'pedestrian'])])
+    preprocess = BooleanField('preprocess', default=False, validators=[Optional()])
+    max_speed = FloatField('max_speed', validators=[Optional(), NumberRange(min=0)])
+    simplify = StringField('simplify', validators=[Optional(), AnyOf(['distance', 'douglas_peucker'])])
+    simplify_tolerance = FloatField('simplify_tolerance', validators=[Optional(), NumberRange(min=0)])
 
 class ShapeForm(BaseForm):
     lat = FloatField('lat', validators=[DataRequired(), Lat()])
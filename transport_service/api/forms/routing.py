@@ -5,6 +5,7 @@ from wtforms.widgets import TextInput
 from .validators import ShapeCSV, Lat, Lon, ListForm, JSONForm, SomeOf
 from .fields import JSONField, BooleanField
 from . import BaseForm
+from ..schema import COSTING_OPTIONS, form_fields
 
 class SideParameters(BaseForm):
     preferred_side = StringField('preferred_side', validators=[Optional(), AnyOf(['same', 'opposite', 'either'])])
@@ -47,85 +48,34 @@ class RoutingBaseForm(BaseForm):
     directions_type = StringField('directions_type', default="instructions", validators=[Optional(), AnyOf(['none', 'maneuvers', 'instructions'])])
     date_time = StringField('date_time', validators=[Optional()])
 
-class _GenericForm(RoutingBaseForm):
-    maneuver_penalty = IntegerField('maneuver_penalty', validators=[Optional(), NumberRange(min=0)])
-    gate_cost = IntegerField('gate_cost', validators=[Optional(), NumberRange(min=0)])
-    gate_penalty = IntegerField('gate_penalty', validators=[Optional(), NumberRange(min=0)])
-    country_crossing_cost = IntegerField('country_crossing_cost', validators=[Optional(), NumberRange(min=0)])
-    country_costing_penalty = IntegerField('country_costing_penalty', validators=[Optional(), NumberRange(min=0)])
-    service_penalty = IntegerField('service_penalty', validators=[Optional(), NumberRange(min=0)])
+VehicleForm = type('VehicleForm', (RoutingBaseForm,), form_fields(COSTING_OPTIONS['vehicle']))
+TruckForm = type('TruckForm', (RoutingBaseForm,), form_fields(COSTING_OPTIONS['truck']))
+BicycleForm = type('BicycleForm', (RoutingBaseForm,), form_fields(COSTING_OPTIONS['bicycle']))
+BikeshareForm = type('BikeshareForm', (RoutingBaseForm,), form_fields(COSTING_OPTIONS['bikeshare']))
+MotoScooterForm = type('MotoScooterForm', (RoutingBaseForm,), form_fields(COSTING_OPTIONS['motor_scooter']))
+MotorcycleForm = type('MotorcycleForm', (RoutingBaseForm,), form_fields(COSTING_OPTIONS['motorcycle']))
+PedestrianForm = type('PedestrianForm', (RoutingBaseForm,), form_fields(COSTING_OPTIONS['pedestrian']))
+TransitForm = type('TransitForm', (RoutingBaseForm,), form_fields(COSTING_OPTIONS['transit']))
 
-class _AutomobileForm(_GenericForm):
-    use_ferry = FloatField('use_ferry', validators=[Optional(), NumberRange(min=0, max=1)])
-    use_tolls = FloatField('use_tolls', validators=[Optional(), NumberRange(min=0, max=1)])
-    use_living_streets = FloatField('use_living_streets', validators=[Optional(), NumberRange(min=0, max=1)])
-    use_tracks = FloatField('use_tracks', validators=[Optional(), NumberRange(min=0, max=1)])
-    private_access_penalty = IntegerField('private_access_penalty', validators=[Optional(), NumberRange(min=0)])
-    toll_booth_cost = IntegerField('toll_booth_cost', validators=[Optional(), NumberRange(min=0)])
-    toll_booth_penalty = IntegerField('toll_booth_penalty', validators=[Optional(), NumberRange(min=0)])
-    ferry_cost = IntegerField('ferry_cost', validators=[Optional(), NumberRange(min=0)])
-    service_factor = IntegerField('service_factor', validators=[Optional(), NumberRange(min=0)])
-    shortest = BooleanField('shortest', validators=[Optional()])
-    top_speed = IntegerField('top_speed', validators=[Optional(), NumberRange(min=10, max=252)])
-    ignore_closures = BooleanField('ignore_closures', validators=[Optional()])
-    closure_factor = FloatField('closure_factor', validators=[Optional(), NumberRange(min=1, max=10)])
+class _OptimizationForm(BaseForm):
+    optimize_for = StringField('optimize_for', default="time", validators=[Optional(), AnyOf(['time', 'distance'])])
+    roundtrip = BooleanField('roundtrip', default=False, validators=[Optional()])
+    fixed_end = BooleanField('fixed_end', default=False, validators=[Optional()])
+    time_budget = FloatField('time_budget', default=1.0, validators=[Optional(), NumberRange(min=0, max=10)])
 
-class VehicleForm(_AutomobileForm):
-    height = FloatField('height', validators=[Optional(), NumberRange(min=0)])
-    width = FloatField('width', validators=[Optional(), NumberRange(min=0)])
-    exclude_unpaved = BooleanField('exclude_unpaved', validators=[Optional()])
-    exclude_cash_only_tolls = BooleanField('exclude_cash_only_tolls', validators=[Optional()])
-    include_hov2 = BooleanField('include_hov2', validators=[Optional()])
-    include_hov3 = BooleanField('include_hov3', validators=[Optional()])
-    include_hov = BooleanField('include_hov', validators=[Optional()])
+costing_forms = {
+    'auto': VehicleForm,
+    'taxi': VehicleForm,
+    'bus': VehicleForm,
+    'truck': TruckForm,
+    'bicycle': BicycleForm,
+    'bikeshare': BikeshareForm,
+    'motor_scooter': MotoScooterForm,
+    'motorcycle': MotorcycleForm,
+    'pedestrian': PedestrianForm,
+    'transit': TransitForm
+}
+"""dict: The routing form of each costing model."""
 
-class TruckForm(VehicleForm):
-    length = FloatField('length', validators=[Optional(), NumberRange(min=0)])
-    weight = FloatField('weight', validators=[Optional(), NumberRange(min=0)])
-    axle_load = FloatField('axle_load', validators=[Optional(), NumberRange(min=0)])
-    hazmat = BooleanField('hazmat', validators=[Optional()])
-
-class BicycleForm(_GenericForm):
-    bicycle_type = StringField('bicycle_type', validators=[Optional(), AnyOf(["Road", "Hybrid", "City", "Cross", "Mountain"])])
-    cycling_speed = IntegerField('cycling_speed', validators=[Optional(), NumberRange(min=0)])
-    use_roads = FloatField('use_roads', validators=[Optional(), NumberRange(min=0, max=1)])
-    use_hills = FloatField('use_hills', validators=[Optional(), NumberRange(min=0, max=1)])
-    use_ferry = FloatField('use_ferry', validators=[Optional(), NumberRange(min=0, max=1)])
-    use_living_streets = FloatField('use_living_streets', validators=[Optional(), NumberRange(min=0, max=1)])
-    avoid_bad_surfaces = FloatField('avoid_bad_surfaces', validators=[Optional(), NumberRange(min=0, max=1)])
-    shortest = BooleanField('shortest', validators=[Optional()])
-
-class BikeshareForm(BicycleForm):
-    bss_return_cost = IntegerField('bss_return_cost', validators=[Optional(), NumberRange(min=0)])
-    bss_return_penalty = IntegerField('bss_return_penalty', validators=[Optional(), NumberRange(min=0)])
-
-class MotoScooterForm(_AutomobileForm):
-    use_primary = FloatField('use_primary', validators=[Optional(), NumberRange(min=0, max=1)])
-    use_hills = FloatField('use_hills', validators=[Optional(), NumberRange(min=0, max=1)])
-
-class MotorcycleForm(_AutomobileForm):
-    use_highways = FloatField('use_highways', validators=[Optional(), NumberRange(min=0, max=1)])
-    use_trails = FloatField('use_trails', validators=[Optional(), NumberRange(min=0, max=1)])
-
-class PedestrianForm(RoutingBaseForm):
-    walking_speed = FloatField('walking_speed', validators=[Optional(), NumberRange(min=0.5, max=25)])
-    walkway_factor = FloatField('walkway_factor', validators=[Optional(), NumberRange(min=0)])
-    sidewalk_factor = FloatField('sidewalk_factor', validators=[Optional(), NumberRange(min=0)])
-    alley_factor = FloatField('alley_factor', validators=[Optional(), NumberRange(min=0)])
-    driveway_factor = FloatField('driveway_factor', validators=[Optional(), NumberRange(min=0.)])
-    step_penalty = IntegerField('step_penalty', validators=[Optional(), NumberRange(min=0)])
-    use_ferry = FloatField('use_ferry', validators=[Optional(), NumberRange(min=0, max=1)])
-    use_living_streets = FloatField('use_living_streets', validators=[Optional(), NumberRange(min=0, max=1)])
-    use_tracks = FloatField('use_tracks', validators=[Optional(), NumberRange(min=0, max=1)])
-    use_hills = FloatField('use_hills', validators=[Optional(), NumberRange(min=0, max=1)])
-    service_penalty = IntegerField('service_penalty', validators=[Optional(), NumberRange(min=0)])
-    service_factor = IntegerField('service_factor', validators=[Optional(), NumberRange(min=0)])
-    max_hiking_difficulty = IntegerField('max_hiking_difficulty', validators=[Optional(), NumberRange(min=1, max=6)])
-    shortest = BooleanField('shortest', validators=[Optional()])
-
-class TransitForm(RoutingBaseForm):
-    use_bus = FloatField('use_bus', validators=[Optional(), NumberRange(min=0, max=1)])
-    use_rail = FloatField('use_rail', validators=[Optional(), NumberRange(min=0, max=1)])
-    use_transfers = FloatField('use_transfers', validators=[Optional(), NumberRange(min=0, max=1)])
-    transit_start_end_max_distance = IntegerField('transit_start_end_max_distance', validators=[Optional(), NumberRange(min=0)])
-    transit_transfer_max_distance = IntegerField('transit_transfer_max_distance', validators=[Optional(), NumberRange(min=0)])
+optimization_forms = {costing: type('Optimized' + Form.__name__, (Form, _OptimizationForm), {}) for costing, Form in costing_forms.items() if costing != 'transit'}
+"""dict: The stop ordering optimization form of each costing model (the routing form extended with the optimization options)."""
@@ -60,17 +60,21 @@ class ShapeCSV:
             raise ValidationError(self.message)
 
 class ListForm:
-    """Validates a list field."""
-    def __init__(self, Form, message=None):
+    """Validates a list field, of at most `max` items (if given)."""
+    def __init__(self, Form, max=None, message=None):
         self.form = Form
+        self.max = max
         if not message:
             message = 'Not a valid List field.'
         self.message = message
+        self.max_message = 'Too many items, must be at most {max}.'.format(max=max)
 
     def __call__(self, form, field):
         from werkzeug.datastructures import ImmutableMultiDict
 
         CustomForm = self.form
+        if self.max is not None and isinstance(field.data, list) and len(field.data) > self.max:
+            raise ValidationError(self.max_message)
         errors = []
         data = []
         for index, row in enumerate(field.data):
@@ -117,3 +121,34 @@ class SomeOf:
             if value not in self.enum:
                 raise ValidationError(self.message)
         field.data = data
+
+class ListOf:
+    """Validates a list field of numbers; numbers changed by the coercion (e.g. 2.5 to an integer) are invalid."""
+    def __init__(self, coerce=float, min=None, max=None, message=None):
+        if not message:
+            message = 'Invalid value, must be a non-empty list of {}'.format('integers' if coerce is int else 'numbers')
+            if min is not None and max is not None:
+                message += ' in [{min}, {max}]'.format(min=min, max=max)
+            elif min is not None:
+                message += ' greater than or equal to {min}'.format(min=min)
+            elif max is not None:
+                message += ' less than or equal to {max}'.format(max=max)
+            message += '.'
+        self.coerce = coerce
+        self.min = min
+        self.max = max
+        self.message = message
+
+    def __call__(self, form, field):
+        if not isinstance(field.data, list) or len(field.data) == 0:
+            raise ValidationError(self.message)
+        try:
+            data = [self.coerce(value) for value in field.data]
+        except (TypeError, ValueError, OverflowError):
+            raise ValidationError(self.message)
+        if any(isinstance(value, float) and value != coerced for value, coerced in zip(field.data, data)):
+            raise ValidationError(self.message)
+        for value in data:
+            if (self.min is not None and value < self.min) or (self.max is not None and value > self.max):
+                raise ValidationError(self.message)
+        field.data = data
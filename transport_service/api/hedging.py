@@ -0,0 +1,151 @@
+"""Hedging of idempotent requests to replicated backends.
+
+A request is sent to a replica; if no answer has arrived within the hedge delay (a quantile of the recently observed latencies of the operation), a second copy is sent to another replica, and the first answer wins. The number of hedges is limited by a budget, as a fraction of the requests.
+"""
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, wait, FIRST_COMPLETED
+from transport_service import metrics
+
+REQUESTS = metrics.counter('valhalla_hedgeable_requests_total', 'Requests to Valhalla eligible for hedging.')
+HEDGES = metrics.counter('valhalla_hedges_total', 'Hedged (second) requests sent to Valhalla.')
+HEDGE_WINS = metrics.counter('valhalla_hedge_wins_total', 'Hedged requests answered before the original request.')
+
+
+class LatencyWindow:
+    """The latencies of the most recent requests of an operation.
+
+    Attributes:
+        size (int): The number of latencies kept.
+    """
+
+    def __init__(self, size: int=1000):
+        self.size = size
+        self._latencies = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._latencies)
+
+    def add(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+
+    def quantile(self, q: float) -> float:
+        """The q-quantile of the latencies (None if empty)."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+
+class HedgeBudget:
+    """Limits the hedges to a fraction of the requests (a token bucket, earning `ratio` tokens per request).
+
+    Attributes:
+        ratio (float): The maximum fraction of hedged requests.
+        burst (float): The maximum number of saved tokens.
+    """
+
+    def __init__(self, ratio: float=0.05, burst: float=10):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def earn(self) -> None:
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def spend(self) -> bool:
+        """Spend a token for a hedge; False if the budget is exhausted."""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class Hedger:
+    """Sends hedged requests, configured by the environment.
+
+    Environment:
+        VALHALLA_HEDGE_QUANTILE (float): The latency quantile used as hedge delay (default: 0.95).
+        VALHALLA_HEDGE_DELAY (float): The hedge delay in milliseconds, until enough latencies are observed (default: 100).
+        VALHALLA_HEDGE_BUDGET (float): The maximum fraction of hedged requests (default: 0.05).
+    """
+
+    MIN_SAMPLES = 20
+    """int: The number of observed latencies required for a dynamic hedge delay."""
+
+    def __init__(self):
+        self.quantile = float(os.getenv('VALHALLA_HEDGE_QUANTILE', 0.95))
+        self.initial_delay = float(os.getenv('VALHALLA_HEDGE_DELAY', 100)) / 1000
+        self.budget = HedgeBudget(ratio=float(os.getenv('VALHALLA_HEDGE_BUDGET', 0.05)))
+        self._windows = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Worker threads do not survive forking (e.g. of preloaded gunicorn workers)
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=int(os.getenv('VALHALLA_HEDGE_WORKERS', 32)), thread_name_prefix='valhalla-hedge')
+                self._pid = os.getpid()
+            return self._executor
+
+    def window(self, operation: str) -> LatencyWindow:
+        with self._lock:
+            if operation not in self._windows:
+                self._windows[operation] = LatencyWindow()
+            return self._windows[operation]
+
+    def delay(self, operation: str) -> float:
+        """The hedge delay of an operation in seconds."""
+        window = self.window(operation)
+        if len(window) < self.MIN_SAMPLES:
+            return self.initial_delay
+        return window.quantile(self.quantile)
+
+    def call(self, operation: str, function, replicas: list) -> tuple:
+        """Call a function for a replica, hedging it with a call for a second replica if slow.
+
+        The function should return the latency of the call (in seconds) along with its result. The slower call is not interrupted; its result is discarded.
+
+        Arguments:
+            operation (str): The operation (its latencies determine the hedge delay).
+            function (callable): Called with a replica; returns the result and the latency.
+            replicas (list): The replica of the first call, and of the hedged call.
+
+        Returns:
+            (tuple) The result, and whether it was answered by the hedged call.
+        """
+        REQUESTS.inc(operation=operation)
+        self.budget.earn()
+        window = self.window(operation)
+        def attempt(replica):
+            result, latency = function(replica)
+            window.add(latency)
+            return result
+        executor = self._get_executor()
+        first = executor.submit(attempt, replicas[0])
+        try:
+            return first.result(timeout=self.delay(operation)), False
+        except TimeoutError:
+            pass
+        if not self.budget.spend():
+            return first.result(), False
+        HEDGES.inc(operation=operation)
+        second = executor.submit(attempt, replicas[1])
+        done, _ = wait([first, second], return_when=FIRST_COMPLETED)
+        winner = first if first in done else second
+        loser = second if winner is first else first
+        if winner.exception() is not None:
+            winner, loser = loser, winner
+        if winner is second:
+            HEDGE_WINS.inc(operation=operation)
+        return winner.result(), winner is second
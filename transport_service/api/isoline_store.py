@@ -0,0 +1,237 @@
+"""A local store of precomputed isolines over a lattice of origins.
+
+The store is a directory with the following files:
+
+- `manifest.json`: the lattice, the precomputed profiles (costing, metric, ranges, polygons, denoise) and the tileset version of Valhalla the isolines were computed on,
+- `origins.npy`: the (latitude, longitude) pairs of the origins,
+- `profile-<i>.offsets.npy` and `profile-<i>.bin`: for each profile, the GeoJSON of each origin concatenated in a single blob, along with the offsets of each origin in the blob.
+
+All the arrays are memory-mapped, so that the store is shared among the worker processes and only the pages actually needed are read. The origins are indexed by a grid of cells at least as large as the tolerance, so that a lookup only measures the distance to the origins of the neighbouring cells.
+"""
+
+import os
+import json
+import threading
+import numpy as np
+from transport_service.logging import mainLogger
+from transport_service.cache import tileset_version
+
+EARTH_RADIUS = 6371008.8
+"""float: Mean earth radius in meters."""
+
+METERS_PER_DEGREE = 111319.49079327357
+"""float: Length of one degree of latitude in meters."""
+
+
+def lattice(bbox: list, spacing: float, kind: str='grid') -> np.ndarray:
+    """Create a lattice of origins covering a bounding box.
+
+    Arguments:
+        bbox (list): The bounding box as [min_lon, min_lat, max_lon, max_lat].
+        spacing (float): Distance between neighbouring origins in meters.
+        kind (str): One of 'grid' (square lattice) or 'hex' (hexagonal lattice).
+
+    Raises:
+        ValueError: If `kind` has an invalid value.
+
+    Returns:
+        (ndarray) The origins as an array of (lat, lon) pairs.
+    """
+    if kind not in ['grid', 'hex']:
+        raise ValueError('`kind` should be one of "grid", "hex".')
+    min_lon, min_lat, max_lon, max_lat = bbox
+    row_spacing = spacing if kind == 'grid' else spacing * np.sqrt(3) / 2
+    dlat = row_spacing / METERS_PER_DEGREE
+    dlon = spacing / (METERS_PER_DEGREE * np.cos(np.radians((min_lat + max_lat) / 2)))
+    lats = np.arange(min_lat, max_lat + dlat / 2, dlat)
+    lons = np.arange(min_lon, max_lon + dlon / 2, dlon)
+    lat, lon = np.meshgrid(lats, lons, indexing='ij')
+    if kind == 'hex':
+        lon = lon + (np.arange(lats.shape[0]) % 2)[:, None] * dlon / 2
+    origins = np.column_stack((lat.ravel(), lon.ravel()))
+    return origins[origins[:, 1] <= max_lon]
+
+
+def build_store(path: str, config: dict, compute, workers: int=4, version: str=None) -> int:
+    """Precompute the isolines and write the store.
+
+    Arguments:
+        path (str): The store directory (created if not exists).
+        config (dict): The store configuration, with keys:
+            - *areas*: list of bounding boxes, each as [min_lon, min_lat, max_lon, max_lat],
+            - *lattice*: 'grid' or 'hex' (default: 'grid'),
+            - *spacing*: spacing of the origins in meters,
+            - *profiles*: list of dictionaries with keys *costing*, *metric* ('time' or 'distance'), *range* (list), and optionally *polygons* and *denoise*.
+        compute (callable): A function taking a profile and the latitude, longitude of an origin, and returning the GeoJSON isolines (or None on failure).
+        workers (int): Number of concurrent computations.
+        version (str): The tileset version of the computed isolines (None if unknown).
+
+    Returns:
+        (int) The number of origins.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    kind = config.get('lattice', 'grid')
+    spacing = float(config['spacing'])
+    origins = np.concatenate([lattice(bbox, spacing, kind) for bbox in config['areas']])
+    profiles = [{
+        'costing': profile.get('costing', 'auto'),
+        'metric': profile['metric'],
+        'range': sorted(profile['range']),
+        'polygons': bool(profile.get('polygons', False)),
+        'denoise': float(profile.get('denoise', 1.0))
+    } for profile in config['profiles']]
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'origins.npy'), origins)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i, profile in enumerate(profiles):
+            mainLogger.info('Precomputing isolines [profile=%i, origins=%i]', i, origins.shape[0])
+            results = executor.map(lambda origin: compute(profile, float(origin[0]), float(origin[1])), origins)
+            offsets = np.zeros(origins.shape[0] + 1, dtype=np.int64)
+            with open(os.path.join(path, 'profile-{}.bin'.format(i)), 'wb') as blob:
+                for j, result in enumerate(results):
+                    data = json.dumps(result, separators=(',', ':')).encode() if result is not None else b''
+                    blob.write(data)
+                    offsets[j + 1] = offsets[j] + len(data)
+            np.save(os.path.join(path, 'profile-{}.offsets.npy'.format(i)), offsets)
+    with open(os.path.join(path, 'manifest.json'), 'w') as manifest:
+        json.dump({'lattice': kind, 'spacing': spacing, 'origins': int(origins.shape[0]), 'profiles': profiles, 'tileset_version': version}, manifest)
+    return int(origins.shape[0])
+
+
+class IsolineStore:
+    """Read access to a store of precomputed isolines.
+
+    The store is bypassed while the current tileset version (see `transport_service.cache.tileset_version`) differs from the one it was built on, since its isolines are outdated.
+
+    Attributes:
+        path (str): The store directory.
+        tolerance (float): Maximum distance in meters between the requested location and the precomputed origin (default: half the lattice spacing).
+        manifest (dict): The store manifest.
+        version (str): The tileset version of the isolines (None if unknown).
+        origins (ndarray): The memory-mapped origins.
+    """
+
+    def __init__(self, path: str, tolerance: float=None):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as manifest:
+            self.manifest = json.load(manifest)
+        self.tolerance = tolerance if tolerance is not None else self.manifest['spacing'] / 2
+        self.origins = np.load(os.path.join(path, 'origins.npy'), mmap_mode='r')
+        self.version = self.manifest.get('tileset_version')
+        self._outdated = None
+        self._profiles = {}
+        self._index()
+
+    def _index(self) -> None:
+        # Cells of (at least) the tolerance in both directions, up to the most poleward origin
+        radius = max(self.tolerance, 1.0)
+        self._cell_lat = np.degrees(radius / EARTH_RADIUS)
+        max_lat = min(float(np.abs(self.origins[:, 0]).max(initial=0)) + self._cell_lat, 89.0)
+        self._cell_lon = self._cell_lat / np.cos(np.radians(max_lat))
+        rows, cols = self._cells(self.origins[:, 0], self.origins[:, 1])
+        self._bounds = (int(rows.min()), int(rows.max()), int(cols.min()), int(cols.max()))
+        keys = self._key(rows, cols)
+        self._order = np.argsort(keys, kind='stable')
+        self._keys, starts = np.unique(keys[self._order], return_index=True)
+        self._starts = np.append(starts, keys.shape[0])
+
+    def _cells(self, lat, lon) -> tuple:
+        return np.floor(np.asarray(lat) / self._cell_lat).astype(np.int64), np.floor(np.asarray(lon) / self._cell_lon).astype(np.int64)
+
+    def _key(self, rows, cols):
+        min_row, _, min_col, max_col = self._bounds
+        return (rows - min_row) * (max_col - min_col + 1) + (cols - min_col)
+
+    def _profile(self, index: int) -> tuple:
+        if index not in self._profiles:
+            offsets = np.load(os.path.join(self.path, 'profile-{}.offsets.npy'.format(index)), mmap_mode='r')
+            blob_path = os.path.join(self.path, 'profile-{}.bin'.format(index))
+            blob = np.memmap(blob_path, dtype=np.uint8, mode='r') if os.path.getsize(blob_path) > 0 else np.zeros(0, dtype=np.uint8)
+            self._profiles[index] = (offsets, blob)
+        return self._profiles[index]
+
+    def nearest(self, lat: float, lon: float) -> tuple:
+        """Find the precomputed origin nearest to a location, among the origins of the grid cells around it.
+
+        Returns:
+            (tuple) The index of the origin and its distance in meters, or (None, None) if there are no origins around the location (i.e. farther than the tolerance).
+        """
+        row, col = self._cells(lat, lon)
+        rows, cols = np.meshgrid(np.arange(row - 1, row + 2), np.arange(col - 1, col + 2), indexing='ij')
+        min_row, max_row, min_col, max_col = self._bounds
+        inside = (rows >= min_row) & (rows <= max_row) & (cols >= min_col) & (cols <= max_col)
+        keys = self._key(rows[inside], cols[inside])
+        positions = np.searchsorted(self._keys, keys)
+        found = positions < self._keys.shape[0]
+        positions = positions[found][self._keys[positions[found]] == keys[found]]
+        if positions.size == 0:
+            return None, None
+        candidates = np.sort(np.concatenate([self._order[self._starts[i]:self._starts[i + 1]] for i in positions]))
+        origins = self.origins[candidates]
+        dy = np.radians(origins[:, 0] - lat)
+        dx = np.radians(origins[:, 1] - lon) * np.cos(np.radians(lat))
+        distances = EARTH_RADIUS * np.hypot(dx, dy)
+        index = int(np.argmin(distances))
+        return int(candidates[index]), float(distances[index])
+
+    def outdated(self) -> bool:
+        """Whether the store was built on another tileset version than the current one; stores of unknown version are never outdated."""
+        current = tileset_version()
+        if self.version is None or not current or current == self.version:
+            return False
+        if self._outdated != current:
+            self._outdated = current
+            mainLogger.warning('Isoline store outdated, bypassed [path="%s", storeVersion="%s", tilesetVersion="%s"]', self.path, self.version, current)
+        return True
+
+    def lookup(self, metric: str, lat: float, lon: float, range_: list, costing: str='auto', polygons: bool=False, denoise: float=1.0, color: list=None, **kwargs):
+        """Look up the precomputed isolines for a request.
+
+        The request is served only if the store is not outdated, there is a profile with the same costing, metric, polygons and denoise values, whose ranges include the requested ones, no colors were requested, and the nearest origin lies within the tolerance.
+
+        Returns:
+            (dict) The GeoJSON isolines, or None if the request cannot be served from the store.
+        """
+        if kwargs or (color and any(color)) or self.outdated():
+            return None
+        for index, profile in enumerate(self.manifest['profiles']):
+            if profile['metric'] == metric and profile['costing'] == costing and profile['polygons'] == bool(polygons) \
+                and profile['denoise'] == float(denoise) and set(range_).issubset(profile['range']):
+                break
+        else:
+            return None
+        origin, distance = self.nearest(lat, lon)
+        if origin is None or distance > self.tolerance:
+            return None
+        offsets, blob = self._profile(index)
+        start, end = int(offsets[origin]), int(offsets[origin + 1])
+        if start == end:
+            return None
+        geojson = json.loads(blob[start:end].tobytes())
+        features = [feature for feature in geojson.get('features', []) if feature.get('properties', {}).get('contour') in range_]
+        return {**geojson, 'features': features}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Get the store configured by the environment variable `ISOLINE_STORE` (if any).
+
+    The tolerance can be set by the environment variable `ISOLINE_STORE_TOLERANCE` (in meters).
+
+    Returns:
+        (IsolineStore) The store, or None if not configured.
+    """
+    global _store
+    path = os.getenv('ISOLINE_STORE')
+    if not path:
+        return None
+    with _store_lock:
+        if _store is None or _store.path != path:
+            tolerance = os.getenv('ISOLINE_STORE_TOLERANCE')
+            _store = IsolineStore(path, tolerance=float(tolerance) if tolerance else None)
+            mainLogger.info('Loaded isoline store [path="%s", origins=%i]', path, _store.origins.shape[0])
+        return _store
@@ -0,0 +1,121 @@
+"""Adaptive limiting of the concurrent requests to Valhalla.
+
+The limit follows the gradient of the round-trip time: each measured latency is compared with the no-load baseline of its operation (its minimum latency, slowly decaying so that it is probed again). While latencies stay within a tolerance of the baseline, the limit grows by about its square root; as they exceed it, the limit shrinks proportionally; failed requests shrink it multiplicatively. Requests over the limit wait briefly for a slot, or are shed.
+"""
+
+import os
+import math
+import threading
+from transport_service import metrics
+
+LIMIT = metrics.gauge('valhalla_concurrency_limit', 'Current adaptive limit of concurrent requests to Valhalla.')
+INFLIGHT = metrics.gauge('valhalla_inflight_requests', 'Requests to Valhalla in flight.')
+SHED = metrics.counter('valhalla_shed_requests_total', 'Requests to Valhalla shed because the concurrency limit was reached.')
+
+
+class LimitExceeded(Exception):
+    """Raised when a request is shed by the limiter."""
+
+
+class AdaptiveLimiter:
+    """A gradient concurrency limiter.
+
+    Attributes:
+        limit (float): The current limit.
+        min_limit (int): The minimum limit.
+        max_limit (int): The maximum limit.
+        tolerance (float): The ratio of latency to baseline tolerated before the limit shrinks.
+        timeout (float): The maximum waiting time for a slot in seconds.
+        smoothing (float): The weight of each new limit estimation.
+        backoff (float): The ratio the limit is multiplied with on failures.
+        drift (float): The ratio the baselines grow with on each sample, so that they are probed again.
+    """
+
+    def __init__(self, initial: float=10, min_limit: int=1, max_limit: int=200, tolerance: float=2., timeout: float=0.05, smoothing: float=0.2, backoff: float=0.9, drift: float=1.0005):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.timeout = timeout
+        self.smoothing = smoothing
+        self.backoff = backoff
+        self.drift = drift
+        self.inflight = 0
+        self._baselines = {}
+        self._condition = threading.Condition()
+        LIMIT.set(self.limit)
+
+    def baseline(self, operation: str) -> float:
+        """The no-load latency baseline of an operation (None if not observed yet)."""
+        return self._baselines.get(operation)
+
+    def acquire(self) -> None:
+        """Acquire a slot, waiting up to the timeout.
+
+        Raises:
+            LimitExceeded: If no slot was available within the timeout.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.inflight < max(1, int(self.limit)), timeout=self.timeout):
+                SHED.inc()
+                raise LimitExceeded()
+            self.inflight += 1
+            INFLIGHT.set(self.inflight)
+
+    def release(self, operation: str, latency: float, success: bool=True) -> None:
+        """Release a slot, updating the limit with the measured latency.
+
+        Arguments:
+            operation (str): The operation of the request.
+            latency (float): The round-trip time in seconds.
+            success (bool): Whether the request succeeded (if not, the latency is not used).
+        """
+        with self._condition:
+            inflight = self.inflight
+            self.inflight -= 1
+            INFLIGHT.set(self.inflight)
+            if not success:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+            else:
+                baseline = self._baselines.get(operation)
+                baseline = latency if baseline is None else min(latency, baseline * self.drift)
+                self._baselines[operation] = baseline
+                gradient = max(0.5, min(1., self.tolerance * baseline / latency)) if latency > 0 else 1.
+                # Do not grow the limit while it is not reached (the load is limited by the clients)
+                if gradient < 1. or inflight >= self.limit / 2:
+                    estimation = self.limit * gradient + math.sqrt(self.limit)
+                    self.limit = self.limit * (1 - self.smoothing) + estimation * self.smoothing
+                    self.limit = min(self.max_limit, max(self.min_limit, self.limit))
+            LIMIT.set(round(self.limit, 3))
+            self._condition.notify_all()
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_limiter():
+    """Get the limiter of the requests to Valhalla, if enabled by the environment variable `VALHALLA_ADAPTIVE_LIMIT`.
+
+    Environment:
+        VALHALLA_LIMIT_INITIAL (float): The initial limit (default: 10).
+        VALHALLA_LIMIT_MIN (int): The minimum limit (default: 1).
+        VALHALLA_LIMIT_MAX (int): The maximum limit (default: 200).
+        VALHALLA_LIMIT_TOLERANCE (float): The ratio of latency to baseline tolerated (default: 2).
+        VALHALLA_LIMIT_QUEUE_TIMEOUT (float): The maximum waiting time for a slot in milliseconds (default: 50).
+
+    Returns:
+        (AdaptiveLimiter) The limiter, or None if disabled.
+    """
+    global _limiter
+    if os.getenv('VALHALLA_ADAPTIVE_LIMIT', 'false').lower() != 'true':
+        return None
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = AdaptiveLimiter(
+                initial=float(os.getenv('VALHALLA_LIMIT_INITIAL', 10)),
+                min_limit=int(os.getenv('VALHALLA_LIMIT_MIN', 1)),
+                max_limit=int(os.getenv('VALHALLA_LIMIT_MAX', 200)),
+                tolerance=float(os.getenv('VALHALLA_LIMIT_TOLERANCE', 2)),
+                timeout=float(os.getenv('VALHALLA_LIMIT_QUEUE_TIMEOUT', 50)) / 1000
+            )
+        return _limiter
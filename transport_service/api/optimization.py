@@ -0,0 +1,127 @@
+"""Ordering of route stops (a travelling salesman heuristic on a cost matrix).
+
+The initial tour is built with the nearest-neighbour heuristic and then improved with 2-opt and Or-opt moves, until no improving move exists or the time budget is exhausted. The cost matrix may be asymmetric.
+"""
+
+import time
+import numpy as np
+
+UNREACHABLE_COST = 1e12
+"""float: Cost assigned to pairs of locations without a path."""
+
+
+def cost_matrix(sources_to_targets: list, metric: str='time') -> np.ndarray:
+    """Convert a Valhalla `sources_to_targets` response to a cost matrix.
+
+    Arguments:
+        sources_to_targets (list): The rows of the Valhalla matrix response.
+        metric (str): The cost, one of 'time', 'distance'.
+
+    Returns:
+        (ndarray) The square cost matrix.
+    """
+    return np.array([[cell.get(metric) if cell.get(metric) is not None else UNREACHABLE_COST for cell in row] for row in sources_to_targets], dtype=float)
+
+
+def tour_cost(matrix: np.ndarray, tour: list) -> float:
+    """Compute the cost of visiting the locations in the given order."""
+    return float(matrix[tour[:-1], tour[1:]].sum())
+
+
+def nearest_neighbour(matrix: np.ndarray, start: int=0, end: int=None) -> list:
+    """Build a tour with the nearest-neighbour heuristic.
+
+    Arguments:
+        matrix (ndarray): The cost matrix.
+        start (int): The first location.
+        end (int): The last location (if fixed); it may be the same as `start` for round trips.
+
+    Returns:
+        (list) The order of the locations.
+    """
+    n = matrix.shape[0]
+    visited = np.zeros(n, dtype=bool)
+    visited[start] = True
+    if end is not None:
+        visited[end] = True
+    tour = [start]
+    for _ in range(n - visited.sum()):
+        costs = np.where(visited, np.inf, matrix[tour[-1]])
+        nearest = int(np.argmin(costs))
+        visited[nearest] = True
+        tour.append(nearest)
+    if end is not None:
+        tour.append(end)
+    return tour
+
+
+def _two_opt(matrix: np.ndarray, tour: list, deadline: float) -> bool:
+    """Apply the first improving 2-opt move (segment reversal) on the tour, in place."""
+    n = len(tour)
+    path = np.asarray(tour)
+    forward = np.concatenate(([0.0], np.cumsum(matrix[path[:-1], path[1:]])))
+    backward = np.concatenate(([0.0], np.cumsum(matrix[path[1:], path[:-1]])))
+    for i in range(1, n - 2):
+        if time.monotonic() > deadline:
+            return False
+        j = np.arange(i + 1, n - 1)
+        old = matrix[path[i - 1], path[i]] + forward[j] - forward[i] + matrix[path[j], path[j + 1]]
+        new = matrix[path[i - 1], path[j]] + backward[j] - backward[i] + matrix[path[i], path[j + 1]]
+        delta = new - old
+        best = int(np.argmin(delta))
+        if delta[best] < -1e-9:
+            k = int(j[best])
+            tour[i:k + 1] = tour[i:k + 1][::-1]
+            return True
+    return False
+
+
+def _or_opt(matrix: np.ndarray, tour: list, deadline: float) -> bool:
+    """Apply the first improving Or-opt move (relocation of a segment of up to 3 locations) on the tour, in place."""
+    n = len(tour)
+    for length in (1, 2, 3):
+        for i in range(1, n - length):
+            if time.monotonic() > deadline:
+                return False
+            j = i + length - 1
+            prev, first, last, next_ = tour[i - 1], tour[i], tour[j], tour[j + 1]
+            removal = matrix[prev, first] + matrix[last, next_] - matrix[prev, next_]
+            rest = tour[:i] + tour[j + 1:]
+            a = np.asarray(rest[:-1])
+            b = np.asarray(rest[1:])
+            insertion = matrix[a, first] + matrix[last, b] - matrix[a, b]
+            insertion[i - 1] = np.inf
+            best = int(np.argmin(insertion))
+            if insertion[best] - removal < -1e-9:
+                tour[:] = rest[:best + 1] + tour[i:j + 1] + rest[best + 1:]
+                return True
+    return False
+
+
+def optimize_order(matrix: np.ndarray, roundtrip: bool=False, fixed_end: bool=False, time_budget: float=1.0) -> list:
+    """Find a low-cost order to visit all the locations, starting from the first one.
+
+    Arguments:
+        matrix (ndarray): The (square) cost matrix.
+        roundtrip (bool): Whether to return to the first location at the end.
+        fixed_end (bool): Whether to keep the last location at the end (ignored for round trips).
+        time_budget (float): The maximum time in seconds to spend on improving the tour.
+
+    Returns:
+        (list) The order of the locations (for round trips, it ends with the first location).
+    """
+    deadline = time.monotonic() + time_budget
+    n = matrix.shape[0]
+    if n <= 2:
+        tour = list(range(n))
+        return tour + [0] if roundtrip and n > 1 else tour
+    end = 0 if roundtrip else (n - 1 if fixed_end else None)
+    tour = nearest_neighbour(matrix, start=0, end=end)
+    if end is None:
+        # Append a virtual location reachable at no cost from anywhere, so that the last location is free to move.
+        matrix = np.pad(matrix, ((0, 1), (0, 1)))
+        tour.append(n)
+    while time.monotonic() < deadline:
+        if not (_two_opt(matrix, tour, deadline) or _or_opt(matrix, tour, deadline)):
+            break
+    return tour if end is not None else tour[:-1]
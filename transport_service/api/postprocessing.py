@@ -0,0 +1,101 @@
+"""Post-processing of isoline contours: simplification, precision reduction and vector tiles encoding."""
+
+import math
+import numpy as np
+import shapely
+from shapely.geometry import shape, mapping, box
+import mapbox_vector_tile
+
+METERS_PER_DEGREE = 111319.49079327357
+"""float: Length of one degree (of latitude, or of longitude on the equator) in meters."""
+
+EARTH_RADIUS = 6378137.0
+"""float: Earth radius used by the Web Mercator projection (EPSG:3857) in meters."""
+
+TILE_EXTENT = 4096
+"""int: Extent of the vector tiles in tile coordinates."""
+
+TILE_BUFFER = 64
+"""int: Buffer around the vector tiles (in tile coordinates) kept when clipping geometries."""
+
+MVT_LAYER = 'isoline'
+"""str: Name of the vector tiles layer holding the contours."""
+
+
+def postprocess_isoline(geojson: dict, simplify: float=None, precision: int=None) -> dict:
+    """Simplify and/or reduce the coordinate precision of the isoline contours.
+
+    Arguments:
+        geojson (dict): The isoline contours as GeoJSON FeatureCollection (as returned by Valhalla).
+        simplify (float): Tolerance of the (topology-preserving) simplification in meters; if None, no simplification is performed.
+        precision (int): Number of decimal digits kept in the coordinates; if None, coordinates are left intact.
+
+    Returns:
+        (dict) The processed GeoJSON.
+    """
+    if not simplify and precision is None:
+        return geojson
+    features = []
+    for feature in geojson.get('features', []):
+        geometry = shape(feature['geometry'])
+        if simplify:
+            geometry = geometry.simplify(simplify / METERS_PER_DEGREE, preserve_topology=True)
+        if precision is not None:
+            geometry = shapely.set_precision(geometry, 10 ** -precision)
+            geometry = shapely.transform(geometry, lambda coords: np.round(coords, precision))
+        features.append({**feature, 'geometry': mapping(geometry)})
+    return {**geojson, 'features': features}
+
+
+def _toMercator(coords: np.ndarray) -> np.ndarray:
+    lon, lat = coords[:, 0], np.clip(coords[:, 1], -85.0511287798, 85.0511287798)
+    x = EARTH_RADIUS * np.radians(lon)
+    y = EARTH_RADIUS * np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+    return np.column_stack((x, y))
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple:
+    """Compute the bounds of a XYZ tile in Web Mercator coordinates.
+
+    Arguments:
+        z (int): Zoom level.
+        x (int): Tile column.
+        y (int): Tile row (from the top).
+
+    Returns:
+        (tuple) The bounds as (minx, miny, maxx, maxy).
+    """
+    size = 2 * math.pi * EARTH_RADIUS / 2 ** z
+    origin = math.pi * EARTH_RADIUS
+    return (x * size - origin, origin - (y + 1) * size, (x + 1) * size - origin, origin - y * size)
+
+
+def isoline_tile(geojson: dict, z: int, x: int, y: int) -> bytes:
+    """Encode the isoline contours in a Mapbox Vector Tile.
+
+    Arguments:
+        geojson (dict): The isoline contours as GeoJSON FeatureCollection.
+        z (int): Zoom level.
+        x (int): Tile column.
+        y (int): Tile row (from the top).
+
+    Raises:
+        ValueError: If the tile coordinates are out of range.
+
+    Returns:
+        (bytes) The encoded tile; the contours are included in a single layer named `MVT_LAYER`.
+    """
+    if z < 0 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise ValueError('Tile coordinates out of range.')
+    bounds = tile_bounds(z, x, y)
+    buffer = (bounds[2] - bounds[0]) * TILE_BUFFER / TILE_EXTENT
+    clip = box(bounds[0] - buffer, bounds[1] - buffer, bounds[2] + buffer, bounds[3] + buffer)
+    features = []
+    for feature in geojson.get('features', []):
+        geometry = shapely.transform(shape(feature['geometry']), _toMercator)
+        if not geometry.intersects(clip):
+            continue
+        properties = {k: v for k, v in (feature.get('properties') or {}).items() if isinstance(v, (str, int, float, bool))}
+        features.append({'geometry': geometry.intersection(clip), 'properties': properties})
+    layer = {'name': MVT_LAYER, 'features': features}
+    return mapbox_vector_tile.encode([layer], default_options={'quantize_bounds': bounds, 'extents': TILE_EXTENT})
@@ -0,0 +1,175 @@
+"""Pre-processing of GPS traces before map matching.
+
+All the steps operate on the whole shape at once (vectorized with numpy) and keep track of the indices of the retained points in the original shape, so that the matched result can be related back to the input.
+"""
+
+import numpy as np
+
+EARTH_RADIUS = 6371008.8
+"""float: Mean earth radius in meters."""
+
+DEFAULT_TOLERANCE = 5.0
+"""float: Default simplification tolerance in meters (the default GPS accuracy assumed by Valhalla)."""
+
+
+def _project(lat: np.ndarray, lon: np.ndarray) -> tuple:
+    """Project coordinates to a local equirectangular plane (in meters) around the mean latitude of the shape."""
+    lat0 = np.radians(np.mean(lat))
+    x = EARTH_RADIUS * np.radians(lon) * np.cos(lat0)
+    y = EARTH_RADIUS * np.radians(lat)
+    return x, y
+
+
+def _segment_lengths(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    return np.hypot(np.diff(x), np.diff(y))
+
+
+def drop_duplicates(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Mask of points that are not an exact repetition of their predecessor.
+
+    Arguments:
+        x (ndarray): Projected x coordinates.
+        y (ndarray): Projected y coordinates.
+
+    Returns:
+        (ndarray) Boolean mask of the points to keep.
+    """
+    keep = np.ones(x.shape[0], dtype=bool)
+    keep[1:] = (np.diff(x) != 0) | (np.diff(y) != 0)
+    return keep
+
+
+def drop_outliers(x: np.ndarray, y: np.ndarray, time: np.ndarray, max_speed: float) -> np.ndarray:
+    """Mask of points that do not form a speed spike.
+
+    A point is considered an outlier when both the speed required to reach it from its predecessor and the speed required to leave it towards its successor exceed `max_speed`.
+
+    Arguments:
+        x (ndarray): Projected x coordinates.
+        y (ndarray): Projected y coordinates.
+        time (ndarray): Time of each point in seconds.
+        max_speed (float): Maximum plausible speed in meters per second.
+
+    Returns:
+        (ndarray) Boolean mask of the points to keep.
+    """
+    keep = np.ones(x.shape[0], dtype=bool)
+    if x.shape[0] < 3:
+        return keep
+    dt = np.diff(time)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speed = np.where(dt > 0, _segment_lengths(x, y) / dt, np.inf)
+    keep[1:-1] = ~((speed[:-1] > max_speed) & (speed[1:] > max_speed))
+    return keep
+
+
+def downsample_distance(x: np.ndarray, y: np.ndarray, tolerance: float) -> np.ndarray:
+    """Mask of points retained when downsampling the shape to (at most) one point per `tolerance` meters of path length.
+
+    Arguments:
+        x (ndarray): Projected x coordinates.
+        y (ndarray): Projected y coordinates.
+        tolerance (float): The distance in meters.
+
+    Returns:
+        (ndarray) Boolean mask of the points to keep.
+    """
+    keep = np.ones(x.shape[0], dtype=bool)
+    if tolerance <= 0:
+        return keep
+    cumulative = np.concatenate(([0.0], np.cumsum(_segment_lengths(x, y))))
+    bins = np.floor(cumulative / tolerance)
+    keep[1:] = np.diff(bins) > 0
+    keep[-1] = True
+    return keep
+
+
+def douglas_peucker(x: np.ndarray, y: np.ndarray, tolerance: float) -> np.ndarray:
+    """Mask of points retained by the Douglas-Peucker simplification.
+
+    The recursion is unrolled into a stack; the distances of each span are computed in a single vectorized step.
+
+    Arguments:
+        x (ndarray): Projected x coordinates.
+        y (ndarray): Projected y coordinates.
+        tolerance (float): The maximum distance in meters of a dropped point from the simplified line.
+
+    Returns:
+        (ndarray) Boolean mask of the points to keep.
+    """
+    n = x.shape[0]
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        norm = np.hypot(dx, dy)
+        if norm == 0:
+            distances = np.hypot(px, py)
+        else:
+            distances = np.abs(dx * py - dy * px) / norm
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            split = start + 1 + index
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def preprocess_shape(shape: list, dedupe: bool=True, max_speed: float=None, simplify: str=None, tolerance: float=None, breaks: list=None) -> tuple:
+    """Clean and simplify a trace shape.
+
+    The steps are applied in order: duplicates removal, speed-based outliers removal (only when all points carry a `time`), and simplification. The first and last points, as well as the break points, are always retained.
+
+    Arguments:
+        shape (list): List of point dictionaries with (at least) `lat` and `lon` keys.
+        dedupe (bool): Whether to drop consecutive duplicate points.
+        max_speed (float): Maximum plausible speed in meters per second; if None, outliers are not removed.
+        simplify (str): One of 'distance' or 'douglas_peucker'; if None, no simplification is performed.
+        tolerance (float): The simplification tolerance in meters (default: `DEFAULT_TOLERANCE`); with 0, only exact repetitions (and collinear points for 'douglas_peucker') are dropped.
+        breaks (list): Whether each point is a break point (default: the points of type *break*).
+
+    Raises:
+        ValueError: If `simplify` has an invalid value, or the coordinates or times are not numbers.
+
+    Returns:
+        (tuple) The processed shape and the list of indices of the retained points in the original shape.
+    """
+    if simplify not in [None, 'distance', 'douglas_peucker']:
+        raise ValueError('`simplify` should be one of "distance", "douglas_peucker".')
+    n = len(shape)
+    if n < 3:
+        return shape, list(range(n))
+    tolerance = tolerance if tolerance is not None else DEFAULT_TOLERANCE
+
+    try:
+        lat = np.array([point['lat'] for point in shape], dtype=float)
+        lon = np.array([point['lon'] for point in shape], dtype=float)
+        if max_speed is not None:
+            time = np.array([point.get('time') if point.get('time') is not None else np.nan for point in shape], dtype=float)
+    except ValueError as e:
+        raise ValueError('Coordinates and times of the shape must be numbers.') from e
+    x, y = _project(lat, lon)
+    if breaks is None:
+        breaks = [point.get('type') == 'break' for point in shape]
+    protected = np.array(breaks, dtype=bool)
+    protected[0] = protected[-1] = True
+
+    indices = np.arange(n)
+    if dedupe:
+        indices = indices[drop_duplicates(x, y) | protected]
+    if max_speed is not None:
+        if not np.isnan(time[indices]).any():
+            indices = indices[drop_outliers(x[indices], y[indices], time[indices], max_speed) | protected[indices]]
+    if simplify == 'distance':
+        indices = indices[downsample_distance(x[indices], y[indices], tolerance) | protected[indices]]
+    elif simplify == 'douglas_peucker':
+        indices = indices[douglas_peucker(x[indices], y[indices], tolerance) | protected[indices]]
+
+    indices = indices.tolist()
+    return [shape[i] for i in indices], indices
@@ -0,0 +1,124 @@
+"""Geo-sharding of the requests to regional Valhalla backends.
+
+The regions are the polygons of a GeoJSON feature collection (given by the environment variable `VALHALLA_REGIONS`); the property `backend` of each feature is the url of the Valhalla holding the tiles of the region (or comma-separated urls of its replicas), and the optional property `name` names it. A request is sent to the first region (in the order of the file) containing all its coordinates (`locations`, `shape`, `sources` and `targets`), or to the global backend (`VALHALLA_URL`) if they are not all in a single region, e.g. when crossing a border.
+
+The regions are indexed in an STR-tree, and tested (prepared) against all the points of a request at once.
+"""
+
+import os
+import json
+import threading
+import numpy as np
+import shapely
+from shapely.geometry import shape
+from shapely.strtree import STRtree
+from transport_service import metrics
+from transport_service.logging import mainLogger
+
+COORDINATES = ['locations', 'shape', 'sources', 'targets']
+"""list: The request parameters holding (lists of) coordinates."""
+
+GLOBAL = 'global'
+
+REQUESTS = metrics.counter('valhalla_region_requests_total', 'Requests to Valhalla per region (global for the fallback).')
+
+
+class RegionIndex:
+    """A spatial index of the regions served by regional backends.
+
+    Attributes:
+        names (list): The name of each region.
+        polygons (numpy.ndarray): The (prepared) polygon of each region.
+        backends (list): The backend url(s) of each region.
+    """
+
+    def __init__(self, names: list, polygons: list, backends: list):
+        self.names = names
+        self.polygons = np.asarray(polygons, dtype=object)
+        self.backends = backends
+        shapely.prepare(self.polygons)
+        self._tree = STRtree(self.polygons)
+
+    @classmethod
+    def from_geojson(cls, path: str):
+        """Read the regions of a GeoJSON feature collection.
+
+        Raises:
+            ValueError: If a feature has no `backend` property, or is not a (multi)polygon.
+        """
+        with open(path) as f:
+            features = json.load(f)['features']
+        names, polygons, backends = [], [], []
+        for i, feature in enumerate(features):
+            properties = feature.get('properties') or {}
+            if not properties.get('backend'):
+                raise ValueError('Region {} has no backend.'.format(i))
+            polygon = shape(feature['geometry'])
+            if polygon.geom_type not in ['Polygon', 'MultiPolygon']:
+                raise ValueError('Region {} is not a polygon.'.format(i))
+            names.append(str(properties.get('name', i)))
+            polygons.append(polygon)
+            backends.append(properties['backend'])
+        return cls(names, polygons, backends)
+
+    def locate(self, coordinates: np.ndarray) -> int:
+        """Find the first region containing all the given points.
+
+        Arguments:
+            coordinates (numpy.ndarray): The points, as an array of (lon, lat).
+
+        Returns:
+            (int) The index of the region, or None if there is no such region.
+        """
+        if len(coordinates) == 0:
+            return None
+        points = shapely.points(coordinates)
+        point_index, region_index = self._tree.query(points)
+        inside = shapely.intersects(self.polygons[region_index], points[point_index])
+        counts = np.bincount(region_index[inside], minlength=len(self.polygons))
+        regions = np.flatnonzero(counts == len(points))
+        return int(regions[0]) if regions.size > 0 else None
+
+    def backend(self, data: dict) -> str:
+        """The backend url(s) of the region of a request, or None for the global backend."""
+        coordinates = request_coordinates(data)
+        region = self.locate(coordinates) if coordinates is not None else None
+        REQUESTS.inc(region=self.names[region] if region is not None else GLOBAL)
+        return self.backends[region] if region is not None else None
+
+
+def request_coordinates(data: dict) -> np.ndarray:
+    """Collect the coordinates of a Valhalla request.
+
+    Returns:
+        (numpy.ndarray) The points as (lon, lat), or None if some are not given as such (e.g. an encoded polyline).
+    """
+    coordinates = []
+    for parameter in COORDINATES:
+        for point in data.get(parameter) or []:
+            if not isinstance(point, dict) or point.get('lat') is None or point.get('lon') is None:
+                return None
+            coordinates.append((point['lon'], point['lat']))
+    if 'encoded_polyline' in data:
+        return None
+    return np.asarray(coordinates, dtype=float).reshape(-1, 2)
+
+
+_regions = None
+_regions_lock = threading.Lock()
+
+def get_regions() -> RegionIndex:
+    """Get the region index, read from the file given by the environment variable `VALHALLA_REGIONS`.
+
+    Returns:
+        (RegionIndex) The index, or None if not configured.
+    """
+    global _regions
+    path = os.getenv('VALHALLA_REGIONS')
+    if not path:
+        return None
+    with _regions_lock:
+        if _regions is None:
+            _regions = RegionIndex.from_geojson(path)
+            mainLogger.info('Loaded Valhalla regions [%s]', ', '.join('{}={}'.format(name, backend) for name, backend in zip(_regions.names, _regions.backends)))
+        return _regions
@@ -1,9 +1,86 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 from flask import Blueprint, make_response, request
-from ..forms.isoline import IsolineForm
+from ..forms.isoline import IsolineForm, IsolineUnionForm
+from ..forms.compiled import validate_request, check_coverage
 from ..valhalla import Valhalla
+from ... import tracing, deadline
+from ...cache import get_cache, make_key
 
 bp = Blueprint('isoline', __name__, url_prefix='/isoline')
 
+MAX_ZOOM = 24
+"""int: The maximum zoom level of the vector tiles."""
+
+def _isoline(countourType, data):
+    """Compute (or retrieve from cache or the precomputed store) the post-processed isoline contours.
+
+    Arguments:
+        countourType (str): One of 'distance', 'time'.
+        data (dict): The validated form data.
+
+    Returns:
+        (tuple) The GeoJSON contours (or the Valhalla error) and the status code.
+    """
+    from ..postprocessing import postprocess_isoline
+    from ..isoline_store import get_store
+    simplify = data.pop('simplify', None)
+    precision = data.pop('precision', None)
+    cache = get_cache('isoline')
+    key = make_key('isoline', countourType, data, simplify=simplify, precision=precision)
+    response = cache.get(key)
+    if response is None:
+        store = get_store()
+        result = store.lookup(countourType, **data) if store is not None else None
+        if result is not None:
+            status = 200
+        else:
+            valhalla = Valhalla()
+            result, status = valhalla.isochrone(**data) if countourType == 'time' else valhalla.isodistance(**data)
+        if status != 200:
+            return result, status
+        deadline.check()
+        response = (postprocess_isoline(result, simplify=simplify, precision=precision), status)
+        cache.set(key, response)
+    return response
+
+def _isolineTile(countourType, data, z, x, y):
+    """Compute (or retrieve from cache) the isoline contours as vector tile.
+
+    Returns:
+        (Response) The vector tile response, or the Valhalla error response.
+    """
+    from ..postprocessing import isoline_tile
+    cache = get_cache('isoline_tile')
+    key = make_key('isoline_tile', countourType, data, z=z, x=x, y=y)
+    tile = cache.get(key)
+    if tile is None:
+        result, status = _isoline(countourType, data)
+        if status != 200:
+            return make_response(result, status)
+        tile = isoline_tile(result, z, x, y)
+        cache.set(key, tile)
+    return _cacheable(make_response(tile, 200, {'Content-Type': 'application/vnd.mapbox-vector-tile'}))
+
+def _tileErrors(z, x, y):
+    """Check the coordinates of a tile; the zoom level is checked first, bounding the size of the others.
+
+    Returns:
+        (dict) The validation errors, or None if valid.
+    """
+    if z > MAX_ZOOM:
+        return {'tile': ['Zoom level out of range, must be at most {}.'.format(MAX_ZOOM)]}
+    if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return {'tile': ['Tile coordinates out of range.']}
+    return None
+
+def _cacheable(response):
+    """Add validation and caching headers to a response."""
+    response.add_etag()
+    response.cache_control.public = True
+    response.cache_control.max_age = int(get_cache('isoline').ttl or 0)
+    return response.make_conditional(request)
+
 @bp.route('/isodistance', methods=['GET'])
 def isodistance():
     """**Flask GET rule**.
@@ -23,15 +100,22 @@ def isodistance():
             - color
             - polygons
             - denoise
+            - simplify
+            - precision
         responses:
             200: isochroneResponse
             400: validationErrorResponse
+            422: outOfCoverageResponse
     """
-    form = IsolineForm(request.args)
-    if not form.validate():
+    with tracing.span('validate', form='IsolineForm'):
+        form = IsolineForm(request.args)
+        valid = form.validate()
+    if not valid:
         return make_response(form.errors, 400)
-    valhalla = Valhalla()
-    return make_response(valhalla.isodistance(**form.data))
+    check_coverage(form.data)
+    result, status = _isoline('distance', form.data)
+    response = make_response(result, status)
+    return _cacheable(response) if status == 200 else response
 
 @bp.route('/isochrone', methods=['GET'])
 def isochrone():
@@ -52,12 +136,141 @@ def isochrone():
             - color
             - polygons
             - denoise
+            - simplify
+            - precision
         responses:
             200: isochroneResponse
             400: validationErrorResponse
+            422: outOfCoverageResponse
+    """
+    with tracing.span('validate', form='IsolineForm'):
+        form = IsolineForm(request.args)
+        valid = form.validate()
+    if not valid:
+        return make_response(form.errors, 400)
+    check_coverage(form.data)
+    result, status = _isoline('time', form.data)
+    response = make_response(result, status)
+    return _cacheable(response) if status == 200 else response
+
+@bp.route('/isodistance/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+def isodistanceTile(z, x, y):
+    """**Flask GET rule**.
+
+    Compute areas that are within specified distance from a location, as Mapbox Vector Tile.
+    ---
+    get:
+        summary: Compute areas that are within specified distance, as vector tile.
+        description: Computes areas that are within specified distance from a location, and returns the part of the contours falling in the requested tile (with a small buffer) as a Mapbox Vector Tile, in a layer named *isoline*.
+        tags:
+            - Isoline
+        parameters:
+            - tileZ
+            - tileX
+            - tileY
+            - lat
+            - lon
+            - costing
+            - rangeDistance
+            - color
+            - polygons
+            - denoise
+            - simplify
+            - precision
+        responses:
+            200: isolineTileResponse
+            400: validationErrorResponse
+            422: outOfCoverageResponse
     """
-    form = IsolineForm(request.args)
-    if not form.validate():
+    errors = _tileErrors(z, x, y)
+    if errors:
+        return make_response(errors, 400)
+    with tracing.span('validate', form='IsolineForm'):
+        form = IsolineForm(request.args)
+        valid = form.validate()
+    if not valid:
         return make_response(form.errors, 400)
-    valhalla = Valhalla()
-    return make_response(valhalla.isochrone(**form.data))
+    check_coverage(form.data)
+    return _isolineTile('distance', form.data, z, x, y)
+
+@bp.route('/isochrone/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+def isochroneTile(z, x, y):
+    """**Flask GET rule**.
+
+    Compute areas that are reachable within specified time intervals from a location, as Mapbox Vector Tile.
+    ---
+    get:
+        summary: Compute areas that are reachable within specified time intervals, as vector tile.
+        description: Computes areas that are reachable within specified time intervals from a location, and returns the part of the contours falling in the requested tile (with a small buffer) as a Mapbox Vector Tile, in a layer named *isoline*.
+        tags:
+            - Isoline
+        parameters:
+            - tileZ
+            - tileX
+            - tileY
+            - lat
+            - lon
+            - costing
+            - rangeTime
+            - color
+            - polygons
+            - denoise
+            - simplify
+            - precision
+        responses:
+            200: isolineTileResponse
+            400: validationErrorResponse
+            422: outOfCoverageResponse
+    """
+    errors = _tileErrors(z, x, y)
+    if errors:
+        return make_response(errors, 400)
+    with tracing.span('validate', form='IsolineForm'):
+        form = IsolineForm(request.args)
+        valid = form.validate()
+    if not valid:
+        return make_response(form.errors, 400)
+    check_coverage(form.data)
+    return _isolineTile('time', form.data, z, x, y)
+
+@bp.route('/union', methods=['POST'])
+def union():
+    """**Flask POST rule**.
+
+    Compute the union of the areas that are reachable from any of multiple locations.
+    ---
+    post:
+        summary: Compute the union of the isolines of multiple locations.
+        description: Computes (in parallel) the isolines of each location, and returns, for each range, the dissolved union of the reachable regions as a polygon feature. Optionally, the regions reachable from the same number of locations are also returned.
+        tags:
+            - Isoline
+        requestBody:
+            required: true
+            content:
+                application/json:
+                    schema: isolineUnionForm
+        responses:
+            200: isolineUnionResponse
+            400: validationErrorResponse
+            422: outOfCoverageResponse
+    """
+    from ..postprocessing import postprocess_isoline
+    from ..union import union_isolines
+    data, errors = validate_request(IsolineUnionForm)
+    if errors:
+        return make_response(errors, 400)
+    metric = data.pop('metric')
+    range_ = data.pop('range_')
+    overlap = data.pop('overlap')
+    simplify = data.pop('simplify')
+    precision = data.pop('precision')
+    def compute(location):
+        return _isoline(metric, {'lat': location['lat'], 'lon': location['lon'], 'range_': range_, 'costing': data['costing'], 'color': [], 'polygons': True, 'denoise': data['denoise']})
+    with ThreadPoolExecutor(max_workers=int(os.getenv('UNION_WORKERS', 8))) as executor:
+        responses = list(executor.map(tracing.propagate(compute), data['locations']))
+    for result, status in responses:
+        if status != 200:
+            return make_response(result, status)
+    deadline.check()
+    geojson = union_isolines([result for result, _ in responses], range_, metric, overlap=overlap)
+    return make_response(postprocess_isoline(geojson, simplify=simplify, precision=precision), 200)
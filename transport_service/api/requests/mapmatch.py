@@ -3,10 +3,56 @@ from werkzeug.utils import secure_filename
 import csv
 import io
 from ..forms.mapmatch import TraceRouteFileForm, TraceRouteBodyForm, TraceAttributesFileForm, TraceAttributesBodyForm
+from ..forms.compiled import validate_request, check_coverage
 from ..valhalla import Valhalla
+from ... import tracing
 
 bp = Blueprint('mapmatch', __name__, url_prefix='/map_matching')
 
+@tracing.traced('preprocess')
+def _preprocess(data, sent):
+    """Pop the pre-processing options from the request data and, if requested, apply them on the shape.
+
+    Arguments:
+        data (dict): The validated request data.
+        sent (list): The shape points as sent by the client; only the points sent with type *break* are retained as break points, since the form defaults the type of the rest to *break*.
+
+    Raises:
+        ValueError: If the coordinates or times of the shape are not numbers.
+
+    Returns:
+        (list) The indices of the retained points in the original shape, or None if no pre-processing was requested.
+    """
+    preprocess = data.pop('preprocess', False)
+    max_speed = data.pop('max_speed', None)
+    simplify = data.pop('simplify', None)
+    tolerance = data.pop('simplify_tolerance', None)
+    if tolerance is None:
+        tolerance = data.get('gps_accuracy')
+    if not preprocess:
+        return None
+    from ..preprocessing import preprocess_shape
+    breaks = [isinstance(point, dict) and point.get('type') == 'break' for point in sent]
+    data['shape'], indices = preprocess_shape(data['shape'], max_speed=max_speed, simplify=simplify, tolerance=tolerance, breaks=breaks)
+    return indices
+
+def _sentShape():
+    """The shape of the JSON body of the request, as sent."""
+    body = request.get_json(silent=True)
+    return (body.get('shape') or []) if isinstance(body, dict) else []
+
+def _readShape(file):
+    """Read the shape points from an uploaded CSV file, already validated by `ShapeCSV` (thus, with the header line consumed)."""
+    attrs = [attr for attr in ['lat', 'lon', 'time', 'type'] if attr in file.fieldnames]
+    reader = csv.DictReader(io.StringIO(file.read().decode()), fieldnames=file.fieldnames, delimiter=file.delimiter)
+    return [{attr: row[attr] for attr in attrs} for row in reader]
+
+def _attachIndices(response, indices):
+    result, status = response
+    if indices is not None and status == 200:
+        result['preprocessing'] = {'original_indices': indices}
+    return result, status
+
 @bp.route('/trace_route', methods=['POST'])
 def traceRoute():
     """**Flask GET rule**.
@@ -29,18 +75,32 @@ def traceRoute():
                         shape:
                             contentType: text/csv
         responses:
-            200: routeResponse
+            200: traceRouteResponse
             400: validationErrorResponse
+            422: outOfCoverageResponse
     """
-    form = TraceRouteFileForm() if 'shape' in request.files.keys() else TraceRouteBodyForm()
-    if not form.validate_on_submit():
-        return make_response(form.errors, 400)
-    if isinstance(form, TraceRouteFileForm):
-        reader = csv.DictReader(io.StringIO(form.shape.data.read().decode()), fieldnames=form.shape.data.fieldnames, delimiter=form.shape.data.delimiter)
-        form.shape.data = [{attr: row[attr] for attr in ['lat', 'lon', 'time', 'type'] if attr in form.shape.data.fieldnames} for row in reader]
-    data = {attr: form[attr].data for attr in form.data if form[attr].data}
+    if 'shape' in request.files.keys():
+        with tracing.span('validate', form='TraceRouteFileForm'):
+            form = TraceRouteFileForm()
+            valid = form.validate_on_submit()
+        if not valid:
+            return make_response(form.errors, 400)
+        form.shape.data = _readShape(form.shape.data)
+        data = form.data
+        check_coverage(data)
+        sent = data['shape']
+    else:
+        data, errors = validate_request(TraceRouteBodyForm)
+        if errors:
+            return make_response(errors, 400)
+        sent = _sentShape()
+    try:
+        indices = _preprocess(data, sent)
+    except ValueError as e:
+        return make_response({'shape': [str(e)]}, 400)
+    data = {attr: value for attr, value in data.items() if value}
     valhalla = Valhalla()
-    return make_response(valhalla.traceRoute(**data))
+    return make_response(_attachIndices(valhalla.traceRoute(**data), indices))
 
 @bp.route('/trace_attributes', methods=['POST'])
 def traceAttributes():
@@ -66,12 +126,26 @@ def traceAttributes():
         responses:
             200: traceAttributesResponse
             400: validationErrorResponse
+            422: outOfCoverageResponse
     """
-    form = TraceAttributesFileForm() if 'shape' in request.files.keys() else TraceAttributesBodyForm()
-    if not form.validate_on_submit():
-        return make_response(form.errors, 400)
-    if isinstance(form, TraceAttributesFileForm):
-        reader = csv.DictReader(io.StringIO(form.shape.data.read().decode()), fieldnames=form.shape.data.fieldnames, delimiter=form.shape.data.delimiter)
-        form.shape.data = [{attr: row[attr] for attr in ['lat', 'lon', 'time', 'type'] if attr in form.shape.data.fieldnames} for row in reader]
+    if 'shape' in request.files.keys():
+        with tracing.span('validate', form='TraceAttributesFileForm'):
+            form = TraceAttributesFileForm()
+            valid = form.validate_on_submit()
+        if not valid:
+            return make_response(form.errors, 400)
+        form.shape.data = _readShape(form.shape.data)
+        data = form.data
+        check_coverage(data)
+        sent = data['shape']
+    else:
+        data, errors = validate_request(TraceAttributesBodyForm)
+        if errors:
+            return make_response(errors, 400)
+        sent = _sentShape()
+    try:
+        indices = _preprocess(data, sent)
+    except ValueError as e:
+        return make_response({'shape': [str(e)]}, 400)
     valhalla = Valhalla()
-    return make_response(valhalla.traceAttributes(**form.data))
+    return make_response(_attachIndices(valhalla.traceAttributes(**data), indices))
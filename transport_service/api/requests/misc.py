@@ -1,14 +1,18 @@
-import os
-import requests
 from flask import Blueprint, make_response
 from transport_service.logging import mainLogger
+from transport_service.api.backends import get_backends, loads
 
 def _checkValhalla():
-    url = os.environ['VALHALLA_URL']
-    r = requests.get(url + '/status')
-    mainLogger.debug("_checkValhalla(): Connected to %s", url)
-    if len(r.json().keys()) > 0:
-        raise Exception(r.json())
+    backend = get_backends()[0]
+    r = backend.request('GET', 'status')
+    mainLogger.debug("_checkValhalla(): Connected to %s", backend.name)
+    # Any parseable status is healthy (e.g. with the version and the tileset_last_modified of the tileset)
+    try:
+        status = loads(r.content)
+    except ValueError:
+        status = None
+    if r.status_code != 200 or not isinstance(status, dict):
+        raise Exception(status if status is not None else 'Invalid status response [statusCode={}]'.format(r.status_code))
 
 bp = Blueprint('misc', __name__)
 
@@ -0,0 +1,58 @@
+from flask import Blueprint, make_response
+from ..forms.routing import optimization_forms
+from ..forms.compiled import validate_request
+from ..valhalla import Valhalla
+from .routing import _prepare_parameters
+
+bp = Blueprint('optimized_route', __name__, url_prefix='/optimized_route')
+
+@bp.route('/<costing>', methods=['POST'])
+def optimizedRoute(costing):
+    """**Flask POST rule**.
+
+    Generates the route visiting all the locations in the optimal order.
+    ---
+    post:
+        summary: Generates the route visiting all the locations in the optimal order.
+        description: Computes the time (or distance) matrix between all the locations, finds a low-cost order to visit them starting from the first location (using the nearest-neighbour heuristic improved with 2-opt and Or-opt moves, within the given time budget), and generates the route in that order. The order is returned in the **optimization** attribute of the response.
+        tags:
+            - Route
+        parameters:
+            - costingOptimizedRoute
+        requestBody:
+            required: true
+            content:
+                application/json:
+                    schema: optimizedRouteForm
+        responses:
+            200: optimizedRouteResponse
+            400: validationErrorResponse
+            422: outOfCoverageResponse
+            404:
+                description: Costing model not supported.
+    """
+    from ..optimization import cost_matrix, optimize_order, tour_cost
+    Form = optimization_forms.get(costing)
+    if Form is None:
+        return make_response({'costing': ['Invalid value, must be one of: {}.'.format(', '.join(optimization_forms.keys()))]}, 404)
+    data, errors = validate_request(Form)
+    if errors:
+        return make_response(errors, 400)
+    optimize_for = data.pop('optimize_for')
+    roundtrip = data.pop('roundtrip')
+    fixed_end = data.pop('fixed_end')
+    time_budget = data.pop('time_budget')
+    locations, directions_options, costing_options = _prepare_parameters(data)
+
+    valhalla = Valhalla()
+    points = [{'lat': location['lat'], 'lon': location['lon']} for location in locations]
+    result, status = valhalla.matrix(costing, points, points, costing_options=costing_options)
+    if status != 200:
+        return make_response(result, status)
+    matrix = cost_matrix(result['sources_to_targets'], metric=optimize_for)
+    order = optimize_order(matrix, roundtrip=roundtrip, fixed_end=fixed_end, time_budget=time_budget)
+
+    result, status = valhalla.routing(costing, [locations[i] for i in order], directions_options=directions_options, costing_options=costing_options)
+    if status == 200:
+        result['optimization'] = {'order': order, 'cost': tour_cost(matrix, order), 'metric': optimize_for}
+    return make_response(result, status)
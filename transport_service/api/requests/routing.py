@@ -3,7 +3,9 @@ from werkzeug.utils import secure_filename
 import csv
 import io
 from ..forms.routing import VehicleForm, TruckForm, BicycleForm, BikeshareForm, MotoScooterForm, MotorcycleForm, PedestrianForm, TransitForm
+from ..forms.compiled import validate_request
 from ..valhalla import Valhalla
+from ...tracing import traced
 
 bp = Blueprint('routing', __name__, url_prefix='/route')
 
@@ -22,6 +24,14 @@ def _flattenLocations(locations):
         flat.append({**loc, **side})
     return flat
 
+def _passthrough(response):
+    """Create the response of a (raw) Valhalla response, passing successful (JSON) responses through without re-encoding."""
+    result, status = response
+    if isinstance(result, bytes):
+        return make_response(result, status, {'Content-Type': 'application/json'})
+    return make_response(result, status)
+
+@traced('prepare_parameters')
 def _prepare_parameters(data):
     costing_options = data
     locations = costing_options.pop('locations')
@@ -54,13 +64,14 @@ def routeAuto():
         responses:
             200: routeResponse
             400: validationErrorResponse
+            422: outOfCoverageResponse
     """
-    form = VehicleForm()
-    if not form.validate_on_submit():
-        return make_response(form.errors, 400)
+    data, errors = validate_request(VehicleForm)
+    if errors:
+        return make_response(errors, 400)
     valhalla = Valhalla()
-    locations, directions_options, costing_options = _prepare_parameters(form.data)
-    return make_response(valhalla.routing('auto', locations, directions_options=directions_options, costing_options=costing_options))
+    locations, directions_options, costing_options = _prepare_parameters(data)
+    return _passthrough(valhalla.routing('auto', locations, directions_options=directions_options, costing_options=costing_options, raw=True))
 
 @bp.route('/taxi', methods=['POST'])
 def routeTaxi():
@@ -81,13 +92,14 @@ def routeTaxi():
         responses:
             200: routeResponse
             400: validationErrorResponse
+            422: outOfCoverageResponse
     """
-    form = VehicleForm()
-    if not form.validate_on_submit():
-        return make_response(form.errors, 400)
+    data, errors = validate_request(VehicleForm)
+    if errors:
+        return make_response(errors, 400)
     valhalla = Valhalla()
-    locations, directions_options, costing_options = _prepare_parameters(form.data)
-    return make_response(valhalla.routing('taxi', locations, directions_options=directions_options, costing_options=costing_options))
+    locations, directions_options, costing_options = _prepare_parameters(data)
+    return _passthrough(valhalla.routing('taxi', locations, directions_options=directions_options, costing_options=costing_options, raw=True))
 
 @bp.route('/bus', methods=['POST'])
 def routeBus():
@@ -108,13 +120,14 @@ def routeBus():
         responses:
             200: routeResponse
             400: validationErrorResponse
+            422: outOfCoverageResponse
     """
-    form = VehicleForm()
-    if not form.validate_on_submit():
-        return make_response(form.errors, 400)
+    data, errors = validate_request(VehicleForm)
+    if errors:
+        return make_response(errors, 400)
     valhalla = Valhalla()
-    locations, directions_options, costing_options = _prepare_parameters(form.data)
-    return make_response(valhalla.routing('bus', locations, directions_options=directions_options, costing_options=costing_options))
+    locations, directions_options, costing_options = _prepare_parameters(data)
+    return _passthrough(valhalla.routing('bus', locations, directions_options=directions_options, costing_options=costing_options, raw=True))
 
 @bp.route('/truck', methods=['POST'])
 def routeTruck():
@@ -135,13 +148,14 @@ def routeTruck():
         responses:
             200: routeResponse
             400: validationErrorResponse
+            422: outOfCoverageResponse
     """
-    form = TruckForm()
-    if not form.validate_on_submit():
-        return make_response(form.errors, 400)
+    data, errors = validate_request(TruckForm)
+    if errors:
+        return make_response(errors, 400)
     valhalla = Valhalla()
-    locations, directions_options, costing_options = _prepare_parameters(form.data)
-    return make_response(valhalla.routing('truck', locations, directions_options=directions_options, costing_options=costing_options))
+    locations, directions_options, costing_options = _prepare_parameters(data)
+    return _passthrough(valhalla.routing('truck', locations, directions_options=directions_options, costing_options=costing_options, raw=True))
 
 @bp.route('/bicycle', methods=['POST'])
 def routeBicycle():
@@ -162,13 +176,14 @@ def routeBicycle():
         responses:
             200: routeResponse
             400: validationErrorResponse
+            422: outOfCoverageResponse
     """
-    form = BicycleForm()
-    if not form.validate_on_submit():
-        return make_response(form.errors, 400)
+    data, errors = validate_request(BicycleForm)
+    if errors:
+        return make_response(errors, 400)
     valhalla = Valhalla()
-    locations, directions_options, costing_options = _prepare_parameters(form.data)
-    return make_response(valhalla.routing('bicycle', locations, directions_options=directions_options, costing_options=costing_options))
+    locations, directions_options, costing_options = _prepare_parameters(data)
+    return _passthrough(valhalla.routing('bicycle', locations, directions_options=directions_options, costing_options=costing_options, raw=True))
 
 @bp.route('/bikeshare', methods=['POST'])
 def routeBikeshare():
@@ -189,13 +204,14 @@ def routeBikeshare():
         responses:
             200: routeResponse
             400: validationErrorResponse
+            422: outOfCoverageResponse
     """
-    form = BikeshareForm()
-    if not form.validate_on_submit():
-        return make_response(form.errors, 400)
+    data, errors = validate_request(BikeshareForm)
+    if errors:
+        return make_response(errors, 400)
     valhalla = Valhalla()
-    locations, directions_options, costing_options = _prepare_parameters(form.data)
-    return make_response(valhalla.routing('bikeshare', locations, directions_options=directions_options, costing_options=costing_options))
+    locations, directions_options, costing_options = _prepare_parameters(data)
+    return _passthrough(valhalla.routing('bikeshare', locations, directions_options=directions_options, costing_options=costing_options, raw=True))
 
 @bp.route('motor_scooter', methods=['POST'])
 def routeMotorScooter():
@@ -216,13 +232,14 @@ def routeMotorScooter():
         responses:
             200: routeResponse
             400: validationErrorResponse
+            422: outOfCoverageResponse
     """
-    form = MotoScooterForm()
-    if not form.validate_on_submit():
-        return make_response(form.errors, 400)
+    data, errors = validate_request(MotoScooterForm)
+    if errors:
+        return make_response(errors, 400)
     valhalla = Valhalla()
-    locations, directions_options, costing_options = _prepare_parameters(form.data)
-    return make_response(valhalla.routing('motor_scooter', locations, directions_options=directions_options, costing_options=costing_options))
+    locations, directions_options, costing_options = _prepare_parameters(data)
+    return _passthrough(valhalla.routing('motor_scooter', locations, directions_options=directions_options, costing_options=costing_options, raw=True))
 
 @bp.route('motorcycle', methods=['POST'])
 def routeMotorcycle():
@@ -243,13 +260,14 @@ def routeMotorcycle():
         responses:
             200: routeResponse
             400: validationErrorResponse
+            422: outOfCoverageResponse
     """
-    form = MotorcycleForm()
-    if not form.validate_on_submit():
-        return make_response(form.errors, 400)
+    data, errors = validate_request(MotorcycleForm)
+    if errors:
+        return make_response(errors, 400)
     valhalla = Valhalla()
-    locations, directions_options, costing_options = _prepare_parameters(form.data)
-    return make_response(valhalla.routing('motorcycle', locations, directions_options=directions_options, costing_options=costing_options))
+    locations, directions_options, costing_options = _prepare_parameters(data)
+    return _passthrough(valhalla.routing('motorcycle', locations, directions_options=directions_options, costing_options=costing_options, raw=True))
 
 @bp.route('pedestrian', methods=['POST'])
 def routePedestrian():
@@ -270,13 +288,14 @@ def routePedestrian():
         responses:
             200: routeResponse
             400: validationErrorResponse
+            422: outOfCoverageResponse
     """
-    form = PedestrianForm()
-    if not form.validate_on_submit():
-        return make_response(form.errors, 400)
+    data, errors = validate_request(PedestrianForm)
+    if errors:
+        return make_response(errors, 400)
     valhalla = Valhalla()
-    locations, directions_options, costing_options = _prepare_parameters(form.data)
-    return make_response(valhalla.routing('pedestrian', locations, directions_options=directions_options, costing_options=costing_options))
+    locations, directions_options, costing_options = _prepare_parameters(data)
+    return _passthrough(valhalla.routing('pedestrian', locations, directions_options=directions_options, costing_options=costing_options, raw=True))
 
 @bp.route('transit', methods=['POST'])
 def routeTransit():
@@ -297,10 +316,11 @@ def routeTransit():
         responses:
             200: routeResponse
             400: validationErrorResponse
+            422: outOfCoverageResponse
     """
-    form = TransitForm()
-    if not form.validate_on_submit():
-        return make_response(form.errors, 400)
+    data, errors = validate_request(TransitForm)
+    if errors:
+        return make_response(errors, 400)
     valhalla = Valhalla()
-    locations, directions_options, costing_options = _prepare_parameters(form.data)
-    return make_response(valhalla.routing('transit', locations, directions_options=directions_options, costing_options=costing_options))
+    locations, directions_options, costing_options = _prepare_parameters(data)
+    return _passthrough(valhalla.routing('transit', locations, directions_options=directions_options, costing_options=costing_options, raw=True))
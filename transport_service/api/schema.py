@@ -0,0 +1,509 @@
+"""Registry of the costing options.
+
+The options of each costing model are declared once, as OpenAPI schemata of their properties; they are used as they are in the OpenAPI specification, while the (WTForms) form fields validating them are generated with `form_fields`.
+"""
+
+from wtforms import StringField, FloatField, IntegerField
+from wtforms.validators import Optional, AnyOf, NumberRange
+from .forms.fields import BooleanField
+
+GENERIC_OPTIONS = {
+    "maneuver_penalty": {
+        "type": "integer",
+        "description": "A penalty (*in seconds*) applied when transitioning between roads that do not have consistent naming - in other words, no road names in common. This penalty can be used to create simpler routes that tend to have fewer maneuvers or narrative guidance instructions.",
+        "default": 5,
+        "minimum": 0
+    },
+    "gate_cost": {
+        "type": "integer",
+        "description": "A cost (*in seconds*) applied when a gate with undefined or private access is encountered. This cost is added to the estimated time / elapsed time.",
+        "default": 30,
+        "minimum": 0
+    },
+    "gate_penalty": {
+        "type": "integer",
+        "description": "A penalty (*in seconds*) applied when a gate with no access information is on the road.",
+        "default": 300,
+        "minimum": 0
+    },
+    "country_crossing_cost": {
+        "type": "integer",
+        "description": "A cost (*in seconds) applied when encountering an international border. This cost is added to the estimated and elapsed times. ",
+        "default": 600,
+        "minimum": 0
+    },
+    "country_costing_penalty": {
+        "type": "integer",
+        "description": "A penalty (*in seconds) applied for a country crossing. This penalty can be used to create paths that avoid spanning country boundaries.",
+        "default": 0,
+        "minimum": 0
+    },
+    "service_penalty": {
+        "type": "integer",
+        "description": "A penalty (*in seconds*) applied for transition to generic service road.",
+        "default": 15,
+        "minimum": 0
+    }
+}
+
+AUTOMOBILE_OPTIONS = {
+    "use_ferry": {
+        "type": "number",
+        "format": "float",
+        "description": "This value indicates the willingness to take ferries. This is a range of values between 0 and 1. Values near 0 attempt to avoid ferries and values near 1 will favor ferries. Note that sometimes ferries are required to complete a route so values of 0 are not guaranteed to avoid ferries entirely.",
+        "default": 0.5,
+        "minimum": 0.0,
+        "maximum": 1.0
+    },
+    "use_tolls": {
+        "type": "number",
+        "format": "float",
+        "description": "This value indicates the willingness to take roads with tolls. This is a range of values between 0 and 1. Values near 0 attempt to avoid tolls and values near 1 will not attempt to avoid them. Note that sometimes roads with tolls are required to complete a route so values of 0 are not guaranteed to avoid them entirely.",
+        "default": 0.5,
+        "minimum": 0.0,
+        "maximum": 1.0
+    },
+    "use_living_streets": {
+        "type": "number",
+        "format": "float",
+        "description": "This value indicates the willingness to take living streets. This is a range of values between 0 and 1. Values near 0 attempt to avoid living streets and values near 1 will favor living streets. Note that sometimes living streets are required to complete a route so values of 0 are not guaranteed to avoid living streets entirely.",
+        "default": 0.1,
+        "minimum": 0.0,
+        "maximum": 1.0
+    },
+    "use_tracks": {
+        "type": "number",
+        "format": "float",
+        "description": "This value indicates the willingness to take track roads. This is a range of values between 0 and 1. Values near 0 attempt to avoid tracks and values near 1 will favor tracks a little bit. Note that sometimes tracks are required to complete a route so values of 0 are not guaranteed to avoid tracks entirely.",
+        "default": 0.0,
+        "minimum": 0.0,
+        "maximum": 1.0
+    },
+    **GENERIC_OPTIONS,
+    "private_access_penalty": {
+        "type": "integer",
+        "description": "A penalty (* in seconds*) applied when a gate or bollard with access=private is encountered.",
+        "default": 450,
+        "minimum": 0
+    },
+    "toll_booth_cost": {
+        "type": "integer",
+        "description": "A cost (* in seconds*) applied when a toll booth is encountered. This cost is added to the estimated and elapsed times.",
+        "default": 15,
+        "minimum": 0
+    },
+    "toll_booth_penalty": {
+        "type": "integer",
+        "description": "A penalty (* in seconds*) applied to the cost when a toll booth is encountered. This penalty can be used to create paths that avoid toll roads.",
+        "default": 0,
+        "minimum": 0
+    },
+    "ferry_cost": {
+        "type": "integer",
+        "description": "A cost (* in seconds*) applied when entering a ferry. This cost is added to the estimated and elapsed times.",
+        "default": 300,
+        "minimum": 0
+    },
+    "service_factor": {
+        "type": "integer",
+        "description": "A factor that modifies (multiplies) the cost when generic service roads are encountered.",
+        "default": 1,
+        "minimum": 0
+    },
+    "shortest": {
+        "type": "boolean",
+        "description": "Changes the metric to quasi-shortest, i.e. purely distance-based costing. Note, this will disable all other costings & penalties. Also note, shortest will not disable hierarchy pruning, leading to potentially sub-optimal routes for some costing models.",
+        "default": "false"
+    },
+    "top_speed": {
+        "type": "integer",
+        "description": "Top speed (*in km/h*) the vehicle can go. Used to avoid roads with higher speeds than this value.",
+        "default": 140,
+        "minimum": 10,
+        "maximum": 252
+    },
+    "ignore_closures": {
+        "type": "boolean",
+        "description": "If set to true, ignores all closures, marked due to live traffic closures, during routing. Note: This option cannot be set if *location.search_filter.exclude_closures* is also specified in the request and will return an error.",
+        "default": "false"
+    },
+    "closure_factor": {
+        "type": "number",
+        "format": "float",
+        "description": "A factor that penalizes the cost when traversing a closed edge (eg: if search_filter.exclude_closures is false for origin and/or destination location and the route starts/ends on closed edges). Its value can range from 1.0 - don't penalize closed edges, to 10.0 - apply high cost penalty to closed edges.",
+        "default": 9.0,
+        "minimum": 1.0,
+        "maximum": 10.0
+    }
+}
+
+VEHICLE_OPTIONS = {
+    **AUTOMOBILE_OPTIONS,
+    "height": {
+        "type": "number",
+        "format": "float",
+        "description": "The height of the vehicle (*in meters*).",
+        "example": 1.5,
+        "minimum": 0
+    },
+    "width": {
+        "type": "number",
+        "format": "float",
+        "description": "The width of the vehicle (*in meters*).",
+        "example": 2.2,
+        "minimum": 0
+    },
+    "exclude_unpaved": {
+        "type": "boolean",
+        "description": "This value indicates whether or not the path may include unpaved roads.",
+        "default": "false"
+    },
+    "exclude_cash_only_tolls": {
+        "type": "boolean",
+        "description": "A boolean value which indicates the desire to avoid routes with cash-only tolls.",
+        "default": "false"
+    },
+    "include_hov2": {
+        "type": "boolean",
+        "description": "A boolean value which indicates the desire to include HOV roads with a 2-occupant requirement in the route when advantageous.",
+        "default": "false"
+    },
+    "include_hov3": {
+        "type": "boolean",
+        "description": "A boolean value which indicates the desire to include HOV roads with a 3-occupant requirement in the route when advantageous.",
+        "default": "false"
+    },
+    "include_hov": {
+        "type": "boolean",
+        "description": "A boolean value which indicates the desire to include tolled HOV roads which require the driver to pay a toll if the occupant requirement isn't met.",
+        "default": "false"
+    }
+}
+
+TRUCK_OPTIONS = {
+    **VEHICLE_OPTIONS,
+    "use_living_streets": {
+        **AUTOMOBILE_OPTIONS['use_living_streets'],
+        "default": 0.0
+    },
+    "service_penalty": {
+        **GENERIC_OPTIONS['service_penalty'],
+        "default": 0
+    },
+    "length": {
+        "type": "number",
+        "format": "float",
+        "description": "The length of the truck (*in meters*).",
+        "example": 5.5,
+        "minimum": 0
+    },
+    "weight": {
+        "type": "number",
+        "format": "float",
+        "description": "The weight of the truck (*in metric tons*).",
+        "default": 2.5,
+        "minimum": 0
+    },
+    "axle_load": {
+        "type": "number",
+        "format": "float",
+        "description": "The axle load of the truck (*in metric tons*).",
+        "example": 1.3,
+        "minimum": 0
+    },
+    "hazmat": {
+        "type": "boolean",
+        "description": "A value indicating if the truck is carrying hazardous materials.",
+        "default": "false"
+    }
+}
+
+BICYCLE_OPTIONS = {
+    **GENERIC_OPTIONS,
+    "bicycle_type": {
+        "type": "string",
+        "description": "The type of bicycle:\n- Road: a road-style bicycle with narrow tires that is generally lightweight and designed for speed on paved surfaces.\n- *Hybrid* or City: a bicycle made mostly for city riding or casual riding on roads and paths with good surfaces.\n- *Cross*: a cyclo-cross bicycle, which is similar to a road bicycle but with wider tires suitable to rougher surfaces.\n- *Mountain*: a mountain bicycle suitable for most surfaces but generally heavier and slower on paved surfaces.",
+        "enum": ["Road", "Hybrid", "City", "Cross", "Mountain"],
+        "default": "Hybrid"
+    },
+    "cycling_speed": {
+        "type": "integer",
+        "description": "Cycling speed is the average travel speed along smooth, flat roads. This is meant to be the speed a rider can comfortably maintain over the desired distance of the route. It can be modified (in the costing method) by surface type in conjunction with bicycle type. When no speed is specifically provided, the default speed is determined by the bicycle type and are as follows: *Road* = 25 km/h, Cross = 20 km/h, Hybrid/City = 18 km/h, and Mountain = 16 km/h.",
+        "example": 25,
+        "minimum": 0
+    },
+    "use_roads": {
+        "type": "number",
+        "format": "float",
+        "description": "A cyclist's propensity to use roads alongside other vehicles. This is a range of values from 0 to 1, where 0 attempts to avoid roads and stay on cycleways and paths, and 1 indicates the rider is more comfortable riding on roads. Based on the use_roads factor, roads with certain classifications and higher speeds are penalized in an attempt to avoid them when finding the best path.",
+        "default": 0.5,
+        "minimum": 0.0,
+        "maximum": 1.0
+    },
+    "use_hills": {
+        "type": "number",
+        "format": "float",
+        "description": "A cyclist's desire to tackle hills in their routes. This is a range of values from 0 to 1, where 0 attempts to avoid hills and steep grades even if it means a longer (time and distance) path, while 1 indicates the rider does not fear hills and steeper grades. Based on the use_hills factor, penalties are applied to roads based on elevation change and grade. These penalties help the path avoid hilly roads in favor of flatter roads or less steep grades where available. Note that it is not always possible to find alternate paths to avoid hills (for example when route locations are in mountainous areas).",
+        "default": 0.5,
+        "minimum": 0.0,
+        "maximum": 1.0
+    },
+    "use_ferry": {**AUTOMOBILE_OPTIONS['use_ferry']},
+    "use_living_streets": {
+        **AUTOMOBILE_OPTIONS['use_living_streets'],
+        "default": 0.5
+    },
+    "avoid_bad_surfaces": {
+        "type": "number",
+        "format": "float",
+        "description": "This value is meant to represent how much a cyclist wants to avoid roads with poor surfaces relative to the bicycle type being used. This is a range of values between 0 and 1. When the value is 0, there is no penalization of roads with different surface types; only bicycle speed on each surface is taken into account. As the value approaches 1, roads with poor surfaces for the bike are penalized heavier so that they are only taken if they significantly improve travel time. When the value is equal to 1, all bad surfaces are completely disallowed from routing, including start and end points.",
+        "default": 0.25,
+        "minimum": 0.0,
+        "maximum": 1.0
+    },
+    "shortest": {
+        "type": "boolean",
+        "description": "Changes the metric to quasi-shortest, i.e. purely distance-based costing. Note, this will disable all other costings & penalties. Also note, shortest will not disable hierarchy pruning, leading to potentially sub-optimal routes for some costing models.",
+        "default": "false"
+    }
+}
+
+BIKESHARE_OPTIONS = {
+    **BICYCLE_OPTIONS,
+    "bss_return_cost": {
+        "type": "integer",
+        "description": "It is meant to give the time (*in seconds*) will be used to return a rental bike. This value will be displayed in the final directions and used to calculate the whole duation.",
+        "default": 120,
+        "minimum": 0
+    },
+    "bss_return_penalty": {
+        "type": "integer",
+        "description": "It is meant to describe the potential effort (*in seconds*) to return a rental bike. This value won't be displayed and used only inside of the algorithm.",
+        "default": 0,
+        "minimum": 0
+    },
+}
+
+MOTOR_SCOOTER_OPTIONS = {
+    **AUTOMOBILE_OPTIONS,
+    "top_speed": {
+        **AUTOMOBILE_OPTIONS['top_speed'],
+        "minimum": 20,
+        "maximum": 120,
+        "default": 45
+    },
+    "use_primary": {
+        "type": "number",
+        "format": "float",
+        "description": "A riders's propensity to use primary roads. This is a range of values from 0 to 1, where 0 attempts to avoid primary roads, and 1 indicates the rider is more comfortable riding on primary roads. Based on the *use_primary* factor, roads with certain classifications and higher speeds are penalized in an attempt to avoid them when finding the best path.",
+        "default": 0.5,
+        "minimum": 0.0,
+        "maximum": 1.0
+    },
+    "use_hills": {
+        "type": "number",
+        "format": "float",
+        "description": "A riders's desire to tackle hills in their routes. This is a range of values from 0 to 1, where 0 attempts to avoid hills and steep grades even if it means a longer (time and distance) path, while 1 indicates the rider does not fear hills and steeper grades. Based on the *use_hills* factor, penalties are applied to roads based on elevation change and grade. These penalties help the path avoid hilly roads in favor of flatter roads or less steep grades where available. Note that it is not always possible to find alternate paths to avoid hills (for example when route locations are in mountainous areas).",
+        "default": 0.5,
+        "minimum": 0.0,
+        "maximum": 1.0
+    }
+}
+
+MOTORCYCLE_OPTIONS = {
+    **AUTOMOBILE_OPTIONS,
+    "use_highways": {
+        "type": "number",
+        "format": "float",
+        "description": "A riders's propensity to prefer the use of highways. This is a range of values from 0 to 1, where 0 attempts to avoid highways, and values toward 1 indicates the rider prefers highways.",
+        "default": 1.0,
+        "minimum": 0.0,
+        "maximum": 1.0
+    },
+    "use_trails": {
+        "type": "number",
+        "format": "float",
+        "description": "A riders's desire for adventure in their routes. This is a range of values from 0 to 1, where 0 will avoid trails, tracks, unclassified or bad surfaces and values towards 1 will tend to avoid major roads and route on secondary roads.",
+        "default": 1.0,
+        "minimum": 0.0,
+        "maximum": 1.0
+    }
+}
+
+PEDESTRIAN_OPTIONS = {
+    "walking_speed": {
+        "type": "number",
+        "format": "float",
+        "description": "Walking speed in km/h.",
+        "default": 5.1,
+        "minimum": 0.5,
+        "maximum": 25.0
+    },
+    "walkway_factor": {
+        "type": "number",
+        "format": "float",
+        "description": "A factor that modifies the cost when encountering roads classified as footway (no motorized vehicles allowed), which may be designated footpaths or designated sidewalks along residential roads. Pedestrian routes generally attempt to favor using these walkways and sidewalks.",
+        "default": 1.0,
+        "minimum": 0
+    },
+    "sidewalk_factor": {
+        "type": "number",
+        "format": "float",
+        "description": "A factor that modifies the cost when encountering roads with dedicated sidewalks. Pedestrian routes generally attempt to favor using sidewalks.",
+        "default": 1.0,
+        "minimum": 0
+    },
+    "alley_factor": {
+        "type": "number",
+        "format": "float",
+        "description": "A factor that modifies (multiplies) the cost when alleys are encountered. Pedestrian routes generally want to avoid alleys or narrow service roads between buildings.",
+        "default": 2.0,
+        "minimum": 0
+    },
+    "driveway_factor": {
+        "type": "number",
+        "format": "float",
+        "description": "A factor that modifies (multiplies) the cost when encountering a driveway, which is often a private, service road. Pedestrian routes generally want to avoid driveways (private).",
+        "default": 5.0,
+        "minimum": 0
+    },
+    "step_penalty": {
+        "type": "integer",
+        "description": "A penalty (*in seconds*) added to each transition onto a path with steps or stairs. Higher values apply larger cost penalties to avoid paths that contain flights of steps.",
+        "default": 0,
+        "minimum": 0
+    },
+    "use_ferry": {**AUTOMOBILE_OPTIONS['use_ferry']},
+    "use_living_streets": {
+        **AUTOMOBILE_OPTIONS['use_living_streets'],
+        "default": 0.6
+    },
+    "use_tracks": {
+        **AUTOMOBILE_OPTIONS['use_tracks'],
+        "default": 0.5
+    },
+    "use_hills": {
+        "type": "number",
+        "format": "float",
+        "description": "This is a range of values from 0 to 1, where 0 attempts to avoid hills and steep grades even if it means a longer (time and distance) path, while 1 indicates the pedestrian does not fear hills and steeper grades. Based on the use_hills factor, penalties are applied to roads based on elevation change and grade. These penalties help the path avoid hilly roads in favor of flatter roads or less steep grades where available. Note that it is not always possible to find alternate paths to avoid hills (for example when route locations are in mountainous areas).",
+        "default": 0.5,
+        "minimum": 0.0,
+        "maximum": 1.0
+    },
+    "service_penalty": {
+        "type": "integer",
+        "description": "A penalty (*in seconds*) applied for transition to generic service road.",
+        "default": 0,
+        "minimum": 0
+    },
+    "service_factor": {
+        "type": "integer",
+        "description": "A factor that modifies (multiplies) the cost when generic service roads are encountered.",
+        "default": 1,
+        "minimum": 0
+    },
+    "max_hiking_difficulty": {
+        "type": "integer",
+        "description": "This value indicates the maximum difficulty of hiking trails that is allowed. Values between 0 and 6 are allowed. The values correspond to sac_scale values within OpenStreetMap; [see reference](https://wiki.openstreetmap.org/wiki/Key:sac_scale). The default value is 1 which means that well cleared trails that are mostly flat or slightly sloped are allowed. Higher difficulty trails can be allowed by specifying a higher value.",
+        "minimum": 1,
+        "maximum": 6,
+        "default": 1
+    },
+    "shortest": {
+        **AUTOMOBILE_OPTIONS['shortest']
+    }
+}
+
+TRANSIT_OPTIONS = {
+    "use_bus": {
+        "type": "number",
+        "format": "float",
+        "description": "Range of values from 0 (try to avoid buses) to 1 (strong preference for riding buses).",
+        "default": 0.3,
+        "minimum": 0,
+        "maximum": 1
+    },
+    "use_rail": {
+        "type": "number",
+        "format": "float",
+        "description": "Range of values from 0 (try to avoid rail) to 1 (strong preference for riding rail).",
+        "default": 0.6,
+        "minimum": 0,
+        "maximum": 1
+    },
+    "use_transfers": {
+        "type": "number",
+        "format": "float",
+        "description": "Range of values from 0 (try to avoid transfers) to 1 (totally comfortable with transfers).",
+        "default": 0.3,
+        "minimum": 0,
+        "maximum": 1
+    },
+    "transit_start_end_max_distance": {
+        "type": "integer",
+        "description": "A pedestrian option (*in meters*) that can be added to the request to extend the defaults. This is the maximum walking distance at the beginning or end of a route.",
+        "default": 2145,
+        "minimum": 0
+    },
+    "transit_transfer_max_distance": {
+        "type": "integer",
+        "description": "A pedestrian option (*in meters*) that can be added to the request to extend the defaults. This is the maximum walking distance between transfers.",
+        "default": 800,
+        "minimum": 0
+    }
+}
+
+COSTING_OPTIONS = {
+    'vehicle': VEHICLE_OPTIONS,
+    'truck': TRUCK_OPTIONS,
+    'bicycle': BICYCLE_OPTIONS,
+    'bikeshare': BIKESHARE_OPTIONS,
+    'motor_scooter': MOTOR_SCOOTER_OPTIONS,
+    'motorcycle': MOTORCYCLE_OPTIONS,
+    'pedestrian': PEDESTRIAN_OPTIONS,
+    'transit': TRANSIT_OPTIONS
+}
+"""dict: The options of each costing model (a single model may serve several costings, e.g. 'vehicle' for auto, bus and taxi)."""
+
+
+def form_field(name: str, schema: dict):
+    """Generate the (optional) form field validating a property.
+
+    Only the type, the enumeration and the bounds of the property are enforced; the defaults are those of Valhalla, thus they are not applied.
+
+    Arguments:
+        name (str): The property name.
+        schema (dict): The OpenAPI schema of the property.
+
+    Raises:
+        ValueError: If the type of the property is not supported.
+
+    Returns:
+        (UnboundField) The form field.
+    """
+    validators = [Optional()]
+    if schema.get('enum') is not None:
+        validators.append(AnyOf(schema['enum']))
+    if schema.get('minimum') is not None or schema.get('maximum') is not None:
+        validators.append(NumberRange(min=schema.get('minimum'), max=schema.get('maximum')))
+    if schema['type'] == 'integer':
+        return IntegerField(name, validators=validators)
+    if schema['type'] == 'number':
+        return FloatField(name, validators=validators)
+    if schema['type'] == 'boolean':
+        return BooleanField(name, validators=validators)
+    if schema['type'] == 'string':
+        return StringField(name, validators=validators)
+    raise ValueError('Unsupported type "{}" of property "{}".'.format(schema['type'], name))
+
+
+def form_fields(options: dict) -> dict:
+    """Generate the form fields of a set of options.
+
+    Arguments:
+        options (dict): The OpenAPI schemata of the options, by name.
+
+    Returns:
+        (dict) The form fields, by name.
+    """
+    return {name: form_field(name, schema) for name, schema in options.items()}
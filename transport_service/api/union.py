@@ -0,0 +1,65 @@
+"""Union and overlap analysis of isolines computed from multiple origins."""
+
+import numpy as np
+import shapely
+from shapely.geometry import shape, mapping
+from shapely.strtree import STRtree
+
+
+def _overlaps(polygons: list) -> list:
+    """Split the area covered by the polygons by the number of polygons covering it.
+
+    The faces of the arrangement of the polygon boundaries are counted against the polygons (queried through an STR-tree) and dissolved by count.
+
+    Returns:
+        (list) Tuples of count and (multi)polygon, in ascending order of count.
+    """
+    boundaries = shapely.unary_union([polygon.boundary for polygon in polygons])
+    faces = np.asarray(shapely.get_parts(shapely.polygonize(shapely.get_parts(boundaries))))
+    if faces.shape[0] == 0:
+        return []
+    points = shapely.point_on_surface(faces)
+    tree = STRtree(polygons)
+    point_index, _ = tree.query(points, predicate='within')
+    counts = np.bincount(point_index, minlength=faces.shape[0])
+    return [(int(count), shapely.unary_union(faces[counts == count])) for count in np.unique(counts) if count > 0]
+
+
+def union_isolines(results: list, range_: list, metric: str, overlap: bool=False) -> dict:
+    """Dissolve the isolines of multiple origins per range band.
+
+    Arguments:
+        results (list): The GeoJSON isolines (polygons) of each origin.
+        range_ (list): The range bands.
+        metric (str): One of 'time', 'distance'.
+        overlap (bool): Whether to also compute, for each band, the areas covered by the same number of origins.
+
+    Returns:
+        (dict) The GeoJSON FeatureCollection; one feature per band (in descending order of range), followed by the overlap features if requested.
+    """
+    bands = {value: [] for value in range_}
+    for result in results:
+        for feature in result.get('features', []):
+            contour = feature.get('properties', {}).get('contour')
+            if contour in bands:
+                bands[contour].append(shape(feature['geometry']))
+
+    features = []
+    overlaps = []
+    for value in sorted(bands.keys(), reverse=True):
+        polygons = [polygon for polygon in bands[value] if not polygon.is_empty]
+        if len(polygons) == 0:
+            continue
+        union = shapely.unary_union(polygons)
+        features.append({
+            'type': 'Feature',
+            'properties': {'contour': value, 'metric': metric, 'origins': len(polygons)},
+            'geometry': mapping(union)
+        })
+        if overlap:
+            overlaps.extend({
+                'type': 'Feature',
+                'properties': {'contour': value, 'metric': metric, 'count': count},
+                'geometry': mapping(geometry)
+            } for count, geometry in _overlaps(polygons))
+    return {'type': 'FeatureCollection', 'features': features + overlaps}
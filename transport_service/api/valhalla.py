@@ -1,18 +1,102 @@
 import os
-import json
+import time
+import threading
+import itertools
 import requests
 from transport_service.logging import mainLogger
+from transport_service import tracing, deadline
+from transport_service.cache import get_tiered_cache, make_key, operation_ttl, revalidate, set_tileset_version
+from transport_service.api.hedging import Hedger
+from transport_service.api.limiter import get_limiter, LimitExceeded
+from transport_service.api.backends import get_backends, dumps, loads
 from uuid import uuid4
 
+OPERATIONS = {
+    'route': 'route',
+    'isochrone': 'isoline',
+    'trace_route': 'trace',
+    'trace_attributes': 'trace',
+    'sources_to_targets': 'matrix'
+}
+"""dict: The operation type of each cached Valhalla endpoint, determining the time-to-live of its cached responses."""
+
+DETERMINISTIC_ERRORS = '100-199,442-445'
+"""str: The Valhalla error codes (comma-separated codes or ranges) of deterministic errors, cached by default: invalid requests and locations (e.g. 171, no suitable edges near location; 170, locations in unconnected regions) and paths not found (e.g. 442, no path could be found)."""
+
+_ERROR_ENTRY = b'\x00'
+"""bytes: The prefix of cached error responses (followed by the status code and a space), never starting a JSON response."""
+
+
+_tileset_checked = None
+_tileset_lock = threading.Lock()
+_replica_counter = itertools.count()
+_hedger = None
+_hedger_lock = threading.Lock()
+
+
+def _get_hedger():
+    """Get the hedger of the requests to Valhalla, if enabled by the environment variable `VALHALLA_HEDGING`."""
+    global _hedger
+    if os.getenv('VALHALLA_HEDGING', 'false').lower() != 'true':
+        return None
+    with _hedger_lock:
+        if _hedger is None:
+            _hedger = Hedger()
+        return _hedger
+
+
+def _parse_codes(codes: str) -> frozenset:
+    """Parse comma-separated codes and ranges of codes (e.g. `100-199,442`)."""
+    parsed = set()
+    for part in codes.split(','):
+        if not part.strip():
+            continue
+        lower, _, upper = part.partition('-')
+        parsed.update(range(int(lower), int(upper or lower) + 1))
+    return frozenset(parsed)
+
+
+def is_deterministic_error(status: int, content: bytes) -> bool:
+    """Whether a Valhalla response is a deterministic error, by its error code (environment variable `CACHE_ERROR_CODES`, default: `DETERMINISTIC_ERRORS`).
+
+    Only client errors (4xx) are considered; server errors are transient.
+    """
+    if not 400 <= status < 500:
+        return False
+    try:
+        error = loads(content)
+    except ValueError:
+        return False
+    code = error.get('error_code') if isinstance(error, dict) else None
+    return code in _parse_codes(os.getenv('CACHE_ERROR_CODES', DETERMINISTIC_ERRORS))
+
+
+def track_tileset(status: dict) -> str:
+    """Track the tileset version reported in a Valhalla `/status` response (its *tileset_last_modified*).
+
+    Returns:
+        (str) The tileset version, or None if not reported.
+    """
+    version = status.get('tileset_last_modified') if isinstance(status, dict) else None
+    if version is None:
+        return None
+    version = str(version)
+    set_tileset_version(version)
+    return version
+
 class Valhalla:
     """Valhalla Wrapper class.
 
     Attributes:
-        url (str): Valhalla url (default: environment variable `VALHALLA_URL`)
+        url (str): Valhalla url, or comma-separated urls of replicas (default: environment variable `VALHALLA_URL`); not used by the embedded backend.
+        backends (list): The backends of the Valhalla replicas (see `transport_service.api.backends`); requests are distributed among them in turn, and hedged (if enabled) to the next one.
+        replicas (list): The names (urls) of the replicas.
     """
 
     def __init__(self, url: str=None):
-        self.url = url if url is not None else os.environ['VALHALLA_URL']
+        self.url = url if url is not None else os.getenv('VALHALLA_URL')
+        self.backends = get_backends(self.url)
+        self.replicas = [backend.name for backend in self.backends]
 
 
     def _createCountours(self, countourType: str, range_: list, color: list=[]) -> list:
@@ -22,21 +106,154 @@ class Valhalla:
         return contours
 
 
-    def _request(self, method: str, endpoint: str, data: dict=None) -> tuple:
+    def checkTileset(self, force: bool=False) -> None:
+        """Check the tileset version of Valhalla, at most once every `TILESET_CHECK_INTERVAL` seconds (default: 60).
+
+        The check is skipped if the version is fixed by the environment variable `TILESET_VERSION`, or if it is already running in another thread; failures are logged.
+
+        Arguments:
+            force (bool): Check regardless of the interval.
+        """
+        global _tileset_checked
+        if os.getenv('TILESET_VERSION'):
+            return
+        interval = float(os.getenv('TILESET_CHECK_INTERVAL', 60))
+        if not force and _tileset_checked is not None and time.monotonic() - _tileset_checked < interval:
+            return
+        # The first check blocks, so that the first responses are cached under the right version
+        if not _tileset_lock.acquire(blocking=_tileset_checked is None):
+            return
+        try:
+            if not force and _tileset_checked is not None and time.monotonic() - _tileset_checked < interval:
+                return
+            _tileset_checked = time.monotonic()
+            response, status = self._send('GET', 'status')
+            if status == 200:
+                track_tileset(loads(response.content))
+            else:
+                mainLogger.warning('Failed to check the tileset version [statusCode=%i]', status)
+        except (requests.RequestException, ValueError, LimitExceeded, deadline.DeadlineExceeded) as e:
+            mainLogger.warning('Failed to check the tileset version [error="%s"]', repr(e))
+        finally:
+            _tileset_lock.release()
+
+
+    def _request(self, method: str, endpoint: str, data: dict=None, raw: bool=False) -> tuple:
+        """Request Valhalla, or retrieve the response from cache.
+
+        Successful responses of the endpoints in `OPERATIONS` are cached (in-process, and in the persistent cache if configured), unless depending on the current time (i.e. with `date_time`) or disabled for the operation (a time-to-live of 0, see `operation_ttl`). A stale cached response (within the grace period) is returned, while a single refresh runs in the background.
+
+        Deterministic errors (see `is_deterministic_error`) are cached under the same key, for `CACHE_TTL_ERRORS` seconds (default: 60; 0 to disable), so that retries of an impossible request do not reach Valhalla; they are never served stale.
+
+        Arguments:
+            method (str): The HTTP method.
+            endpoint (str): The Valhalla endpoint.
+            data (dict): The request parameters.
+            raw (bool): Return a successful response as is (JSON bytes), to be passed through without decoding.
+
+        Returns:
+            (tuple) The response (dict, or bytes if raw and successful) and the status code.
+        """
+        def decode(content, status):
+            return content if raw and status == 200 else loads(content)
+        deadline.check()
+        operation = OPERATIONS.get(endpoint)
+        if operation is None or data is None or 'date_time' in data:
+            response, status = self._send(method, endpoint, data)
+            return decode(response.content, status), status
+        self.checkTileset()
+        cache = get_tiered_cache('valhalla')
+        key = make_key(endpoint, method, data)
+        def fetch():
+            response, status = self._send(method, endpoint, data)
+            if status == 200:
+                ttl = operation_ttl(operation)
+                if ttl > 0:
+                    cache.set(key, response.content, ttl=ttl)
+            elif is_deterministic_error(status, response.content):
+                ttl = float(os.getenv('CACHE_TTL_ERRORS', 60))
+                if ttl > 0:
+                    cache.set(key, _ERROR_ENTRY + str(status).encode() + b' ' + response.content, ttl=ttl)
+            return response, status
+        content, expires_in = cache.lookup(key)
+        status = 200
+        if content is not None and content.startswith(_ERROR_ENTRY):
+            status, _, content = content[len(_ERROR_ENTRY):].partition(b' ')
+            status = int(status)
+        stale = expires_in is not None and expires_in <= 0
+        if content is not None and (status == 200 or not stale):
+            if stale:
+                revalidate(key, fetch)
+            mainLogger.debug('Valhalla response retrieved from cache [endpoint="%s", statusCode=%i, stale=%s]', endpoint, status, stale)
+            return decode(content, status), status
+        response, status = fetch()
+        return decode(response.content, status), status
+
+
+    def _attempt(self, backend, method: str, endpoint: str, data: dict=None) -> tuple:
+        """Send a request to a Valhalla replica, within the adaptive concurrency limit (if enabled).
+
+        The remaining time until the request deadline (if any) is the timeout of the request.
+
+        Raises:
+            LimitExceeded: If the request was shed by the concurrency limiter.
+            DeadlineExceeded: If the request deadline passed.
+
+        Returns:
+            (tuple) The response and its latency in seconds.
+        """
+        limiter = get_limiter()
+        with tracing.span('valhalla_attempt', replica=backend.name) as span:
+            deadline.check()
+            if limiter is not None:
+                limiter.acquire()
+            start = time.perf_counter()
+            success = False
+            try:
+                timeout = deadline.remaining()
+                if timeout is not None:
+                    timeout = max(timeout, 0.001)
+                r = backend.request(method, endpoint, data, headers=tracing.headers(), timeout=timeout)
+                success = r.status_code < 500
+            finally:
+                latency = time.perf_counter() - start
+                if limiter is not None:
+                    limiter.release(endpoint, latency, success=success)
+            if span is not None:
+                span.set(status_code=r.status_code)
+            return r, latency
+
+
+    def _route(self, data: dict) -> list:
+        """The backends of the region of a request (if geo-sharded by the environment variable `VALHALLA_REGIONS`, see `transport_service.api.regions`), or the global backends."""
+        if data is None or not os.getenv('VALHALLA_REGIONS') or os.getenv('VALHALLA_BACKEND', 'http') != 'http':
+            return self.backends
+        from transport_service.api.regions import get_regions
+        url = get_regions().backend(data)
+        return get_backends(url) if url is not None else self.backends
+
+
+    def _send(self, method: str, endpoint: str, data: dict=None) -> tuple:
         assert method in ['GET', 'POST']
         uuid = str(uuid4())
-        mainLogger.info('Requesting Valhalla [id="%s", method="%s", endpoint="%s"]', uuid, method, endpoint)
-        url = "{url}/{endpoint}".format(url=self.url, endpoint=endpoint)
-        if method == 'GET':
-            if data is not None:
-                request_json = json.dumps(data)
-                url = "{url}/{endpoint}?json={data}".format(url=self.url, endpoint=endpoint, data=request_json)
-            r = requests.get(url)
-        else:
-            r = requests.post(url, json=data)
-        mainLogger.info('Valhalla responded [id="%s", statusCode=%i]', uuid, r.status_code)
+        with tracing.span('valhalla', method=method, endpoint=endpoint, request_id=uuid) as span:
+            mainLogger.info('Requesting Valhalla [id="%s", method="%s", endpoint="%s"]', uuid, method, endpoint)
+            backends = self._route(data)
+            first = next(_replica_counter)
+            replicas = [backends[(first + i) % len(backends)] for i in range(min(2, len(backends)))]
+            operation = OPERATIONS.get(endpoint)
+            hedger = _get_hedger()
+            def attempt(backend):
+                return self._attempt(backend, method, endpoint, data)
+            if hedger is not None and operation is not None and len(replicas) > 1:
+                r, hedged = hedger.call(operation, tracing.propagate(attempt), replicas)
+            else:
+                (r, _), hedged = attempt(replicas[0]), False
+            mainLogger.info('Valhalla responded [id="%s", statusCode=%i, hedged=%s]', uuid, r.status_code, hedged)
+            if span is not None:
+                span.set(status_code=r.status_code, hedged=hedged)
 
-        return r.json(), r.status_code
+            return r, r.status_code
 
 
     def _isoline(self, countourType: str, lat: float, lon: float, range_: list, costing: str="auto", **kwargs) -> tuple:
@@ -45,7 +262,7 @@ class Valhalla:
         locations = [{"lat": lat, "lon": lon}]
         data = {"locations": locations, "costing": costing, "contours": contours, **kwargs}
 
-        return self._request('GET', 'isochrone', data=data)
+        return self._request('POST', 'isochrone', data=data)
 
 
     def isochrone(self, lat: float, lon: float, range_: list, costing: str="auto", **kwargs) -> tuple:
@@ -66,6 +283,11 @@ class Valhalla:
         return self._request('POST', 'trace_attributes', data=data)
 
 
-    def routing(self, costing: str, locations: list, directions_options: dict={}, costing_options: dict={}) -> tuple:
+    def routing(self, costing: str, locations: list, directions_options: dict={}, costing_options: dict={}, raw: bool=False) -> tuple:
         data = {"costing": costing, "locations": locations, **directions_options, "costing_options": {costing: costing_options}}
-        return self._request('POST', 'route', data=data)
+        return self._request('POST', 'route', data=data, raw=raw)
+
+
+    def matrix(self, costing: str, sources: list, targets: list, costing_options: dict={}, **kwargs) -> tuple:
+        data = {"sources": sources, "targets": targets, "costing": costing, "costing_options": {costing: costing_options}, **kwargs}
+        return self._request('POST', 'sources_to_targets', data=data)
@@ -0,0 +1,135 @@
+"""Bulkheads isolating the request classes from each other.
+
+Each class of requests (*route*, *isoline*, *trace*, *batch*) has its own limit of concurrent requests (per worker) and its own bounded queue; a request of a class whose queue is full (or that waited for longer than the queue timeout) is rejected right away with *503 Service Unavailable*, so that a burst of expensive requests (e.g. large trace uploads) cannot occupy all the threads of a worker and starve the cheap ones.
+
+The limits are configured by the environment variables `BULKHEAD_<CLASS>_LIMIT` and `BULKHEAD_<CLASS>_QUEUE`, and the queue timeout by `BULKHEAD_QUEUE_TIMEOUT` (in milliseconds).
+"""
+
+import os
+import time
+import threading
+from flask import g, request, make_response
+from . import metrics
+from .logging import mainLogger
+
+CLASSES = {
+    'routing': 'route',
+    'isoline': 'isoline',
+    'isoline.union': 'batch',
+    'mapmatch': 'trace',
+    'optimized_route': 'batch'
+}
+"""dict: The request class of each endpoint or blueprint (the endpoint takes precedence)."""
+
+DEFAULT_LIMITS = {'route': 8, 'isoline': 4, 'trace': 2, 'batch': 2}
+"""dict: The default concurrency limit of each request class."""
+
+ACTIVE = metrics.gauge('bulkhead_active_requests', 'Requests in progress, per request class.')
+QUEUED = metrics.gauge('bulkhead_queued_requests', 'Requests waiting for a slot, per request class.')
+REJECTED = metrics.counter('bulkhead_rejected_requests_total', 'Requests rejected because the bulkhead was full, per request class.')
+WAIT = metrics.histogram('bulkhead_wait_seconds', 'Time waited for a slot, per request class.')
+DURATION = metrics.histogram('bulkhead_request_duration_seconds', 'Duration of the admitted requests, per request class.')
+
+
+class BulkheadFull(Exception):
+    """Raised when a request is rejected by a full bulkhead."""
+
+
+class Bulkhead:
+    """Limits the concurrent calls of a request class, queueing a bounded number of waiting calls.
+
+    Attributes:
+        name (str): The request class.
+        limit (int): The maximum number of concurrent calls.
+        queue (int): The maximum number of waiting calls.
+        timeout (float): The maximum waiting time in seconds.
+    """
+
+    def __init__(self, name: str, limit: int, queue: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """Acquire a slot, waiting in the queue if needed.
+
+        Raises:
+            BulkheadFull: If the queue is full, or no slot was released within the timeout.
+        """
+        start = time.perf_counter()
+        with self._condition:
+            if self.active >= self.limit:
+                if self.waiting >= self.queue:
+                    REJECTED.inc(**{'class': self.name})
+                    raise BulkheadFull(self.name)
+                self.waiting += 1
+                QUEUED.set(self.waiting, **{'class': self.name})
+                try:
+                    admitted = self._condition.wait_for(lambda: self.active < self.limit, timeout=self.timeout)
+                finally:
+                    self.waiting -= 1
+                    QUEUED.set(self.waiting, **{'class': self.name})
+                if not admitted:
+                    REJECTED.inc(**{'class': self.name})
+                    raise BulkheadFull(self.name)
+            self.active += 1
+            ACTIVE.set(self.active, **{'class': self.name})
+        WAIT.observe(time.perf_counter() - start, **{'class': self.name})
+
+    def release(self) -> None:
+        """Release a slot."""
+        with self._condition:
+            self.active -= 1
+            ACTIVE.set(self.active, **{'class': self.name})
+            self._condition.notify()
+
+
+def create_bulkheads() -> dict:
+    """Create the bulkhead of each request class, configured by the environment."""
+    timeout = float(os.getenv('BULKHEAD_QUEUE_TIMEOUT', 1000)) / 1000
+    bulkheads = {}
+    for name, default in DEFAULT_LIMITS.items():
+        limit = int(os.getenv('BULKHEAD_{}_LIMIT'.format(name.upper()), default))
+        queue = int(os.getenv('BULKHEAD_{}_QUEUE'.format(name.upper()), limit))
+        bulkheads[name] = Bulkhead(name, limit, queue, timeout)
+    return bulkheads
+
+
+def request_class() -> str:
+    """The class of the current request (None if not isolated)."""
+    return CLASSES.get(request.endpoint, CLASSES.get(request.blueprint))
+
+
+def init_app(app):
+    """Isolate the request classes of a Flask app in bulkheads.
+
+    Arguments:
+        app (Flask): The app.
+    """
+    bulkheads = create_bulkheads()
+    mainLogger.info('Enabled bulkheads [%s]', ', '.join('{}={}/{}'.format(name, b.limit, b.queue) for name, b in bulkheads.items()))
+
+    @app.before_request
+    def enter_bulkhead():
+        name = request_class()
+        if name is None:
+            return
+        try:
+            bulkheads[name].acquire()
+        except BulkheadFull:
+            mainLogger.warning('Request rejected by full bulkhead [class="%s", path="%s"]', name, request.path)
+            return make_response({'error': 'Too many concurrent {} requests; try again later.'.format(name)}, 503, {'Retry-After': '1'})
+        g.bulkhead = (bulkheads[name], time.perf_counter())
+
+    @app.teardown_request
+    def leave_bulkhead(error=None):
+        entry = g.pop('bulkhead', None)
+        if entry is None:
+            return
+        bulkhead, start = entry
+        bulkhead.release()
+        DURATION.observe(time.perf_counter() - start, **{'class': bulkhead.name})
@@ -0,0 +1,406 @@
+"""Caching of (processed) results.
+
+In-process caches are named and created on demand with `get_cache`; their size and time-to-live are configured by the environment variables `CACHE_SIZE` (number of entries), `CACHE_MEMORY_SIZE` (in MB) and `CACHE_TTL` (in seconds). Expired entries are kept for a grace period of `CACHE_STALE` seconds (default: 0), during which they may be served stale while refreshed in the background (see `lookup` and `revalidate`).
+
+If the environment variable `PERSISTENT_CACHE` is set (to the path of an SQLite database), a persistent cache is also available as a second tier (see `get_tiered_cache`); it survives restarts and is shared among the worker processes. Its size is bounded by `PERSISTENT_CACHE_SIZE` (in MB), and its entries belong to the namespace of the current tileset version; entries of other namespaces (e.g. still used by other workers) are not visible, and are left to the size-based eviction.
+
+All cache keys include the tileset version of Valhalla (see `set_tileset_version`), which can also be fixed by the environment variable `TILESET_VERSION`; when it changes, the in-process caches are cleared.
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .logging import mainLogger
+
+
+def make_key(namespace: str, *args, **kwargs) -> str:
+    """Create a canonical cache key.
+
+    The positional and keyword arguments are serialized as JSON with sorted keys, so that equivalent requests map to the same key regardless of the order of their parameters. The key also depends on the current tileset version.
+
+    Arguments:
+        namespace (str): A prefix for the key (e.g. the operation).
+        *args: JSON serializable positional values.
+        **kwargs: JSON serializable keyword values.
+
+    Returns:
+        (str) The cache key.
+    """
+    payload = json.dumps([tileset_version(), args, kwargs], sort_keys=True, separators=(',', ':'), default=str)
+    return "{namespace}:{digest}".format(namespace=namespace, digest=hashlib.sha256(payload.encode()).hexdigest())
+
+
+def _sizeof(value) -> int:
+    """The (approximate) memory size of a cached value in bytes: the length of a byte string or string, or else of its JSON serialization (e.g. of the GeoJSON of a result)."""
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    try:
+        return len(json.dumps(value, separators=(',', ':'), default=str))
+    except (TypeError, ValueError):
+        return sys.getsizeof(value)
+
+
+class LRUCache:
+    """A thread-safe least-recently-used cache with per-entry expiration.
+
+    The cache is bounded both by the number of entries and by the total size of the values (see `_sizeof`); a value larger than the size bound is not stored.
+
+    Attributes:
+        maxsize (int): Maximum number of entries.
+        max_bytes (int): Maximum total size of the values in bytes (None for no limit).
+        size (int): Current total size of the values in bytes.
+        ttl (float): Default time-to-live of the entries in seconds (None for no expiration).
+        grace (float): Period in seconds after the expiration, during which an entry can still be looked up as stale.
+        hits (int): Number of cache hits.
+        misses (int): Number of cache misses.
+    """
+
+    def __init__(self, maxsize: int=1024, ttl: float=None, grace: float=0, max_bytes: int=None):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.ttl = ttl
+        self.grace = grace
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: str, default=None):
+        """Get a value from the cache, or `default` if missing or expired."""
+        value, expires_in = self.lookup(key)
+        if value is None or (expires_in is not None and expires_in <= 0):
+            return default
+        return value
+
+    def lookup(self, key: str) -> tuple:
+        """Look up an entry, including a stale one (expired, but within the grace period).
+
+        Returns:
+            (tuple) The value (None if missing) and the seconds until its expiration (negative if stale, None if it never expires).
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (entry[0] is not None and entry[0] + self.grace < now):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[0] - now if entry[0] is not None else None
+
+    def set(self, key: str, value, ttl: float=None) -> None:
+        """Store a value in the cache, evicting the least recently used entries if full."""
+        ttl = ttl if ttl is not None else self.ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        size = _sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = (expires, value, size)
+            self.size += size
+            while len(self._data) > self.maxsize or (self.max_bytes is not None and self.size > self.max_bytes):
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key: str) -> None:
+        # Called with the lock held
+        self.size -= self._data.pop(key)[2]
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+_tileset_version = None
+
+def tileset_version() -> str:
+    """The current tileset version: the environment variable `TILESET_VERSION` if set, else the one last reported by Valhalla (empty if unknown)."""
+    return os.getenv('TILESET_VERSION') or _tileset_version or ''
+
+def set_tileset_version(version: str) -> bool:
+    """Set the tileset version reported by Valhalla; if changed, the in-process caches are cleared.
+
+    Arguments:
+        version (str): The tileset version.
+
+    Returns:
+        (bool) Whether the version changed.
+    """
+    global _tileset_version
+    with _caches_lock:
+        if version == _tileset_version:
+            return False
+        previous, _tileset_version = _tileset_version, version
+        if previous is not None:
+            for cache in _caches.values():
+                cache.clear()
+    mainLogger.info('Tileset version changed [previous="%s", version="%s"]', previous, version)
+    return True
+
+def get_cache(name: str) -> LRUCache:
+    """Get (or create) a named cache.
+
+    Arguments:
+        name (str): The cache name.
+
+    Returns:
+        (LRUCache) The cache.
+    """
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = LRUCache(maxsize=int(os.getenv('CACHE_SIZE', 1024)), max_bytes=int(float(os.getenv('CACHE_MEMORY_SIZE', 64)) * 2 ** 20), ttl=float(os.getenv('CACHE_TTL', 3600)), grace=float(os.getenv('CACHE_STALE', 0)))
+        return _caches[name]
+
+
+class SQLiteCache:
+    """A persistent cache of byte strings, stored compressed in an SQLite database (in WAL mode, so that readers do not block each other or the writer).
+
+    The size of the stored values is bounded; when exceeded, the expired and then the least recently accessed entries are evicted. Any database error is logged and treated as a cache miss.
+
+    Attributes:
+        path (str): The database file.
+        max_size (int): Maximum total size of the (compressed) values in bytes.
+        namespace (str): The namespace of the entries (e.g. the tileset version).
+        ttl (float): Default time-to-live of the entries in seconds (None for no expiration).
+        grace (float): Period in seconds after the expiration, during which an entry can still be looked up as stale.
+    """
+
+    ACCESS_RESOLUTION = 60
+    """int: Minimum interval (in seconds) between updates of the access time of an entry."""
+
+    EVICTION_INTERVAL = 100
+    """int: Number of writes between size checks."""
+
+    def __init__(self, path: str, max_size: int=512 * 2 ** 20, namespace: str='', ttl: float=None, grace: float=0):
+        self.path = path
+        self.max_size = max_size
+        self.namespace = namespace
+        self.ttl = ttl
+        self.grace = grace
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        # Entries of other namespaces may still be used by other workers (e.g. during a rolling update), so they are only evicted by size
+        try:
+            self.evict()
+        except sqlite3.Error as e:
+            mainLogger.warning('Persistent cache eviction failed [path="%s", error="%s"]', self.path, e)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections are not shared among threads or (forked) processes
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, namespace TEXT, value BLOB, size INTEGER, expires REAL, accessed REAL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def get(self, key: str, default=None):
+        """Get a value from the cache, or `default` if missing or expired."""
+        value, expires_in = self.lookup(key)
+        if value is None or (expires_in is not None and expires_in <= 0):
+            return default
+        return value
+
+    def lookup(self, key: str) -> tuple:
+        """Look up an entry, including a stale one (expired, but within the grace period).
+
+        Returns:
+            (tuple) The value (None if missing) and the seconds until its expiration (negative if stale, None if it never expires).
+        """
+        now = time.time()
+        try:
+            connection = self._connection()
+            row = connection.execute('SELECT value, expires, accessed FROM entries WHERE key = ? AND namespace = ?', (key, self.namespace)).fetchone()
+            if row is None or (row[1] is not None and row[1] + self.grace < now):
+                return None, None
+            if row[2] < now - self.ACCESS_RESOLUTION:
+                with connection:
+                    connection.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+            return zlib.decompress(row[0]), row[1] - now if row[1] is not None else None
+        except (sqlite3.Error, zlib.error) as e:
+            mainLogger.warning('Persistent cache read failed [path="%s", error="%s"]', self.path, e)
+            return None, None
+
+    def set(self, key: str, value: bytes, ttl: float=None) -> None:
+        """Store a value in the cache."""
+        ttl = ttl if ttl is not None else self.ttl
+        now = time.time()
+        compressed = zlib.compress(value)
+        try:
+            connection = self._connection()
+            with connection:
+                connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)', (key, self.namespace, compressed, len(compressed), now + ttl if ttl is not None else None, now))
+            with self._writes_lock:
+                self._writes += 1
+                due = self._writes % self.EVICTION_INTERVAL == 0
+            if due:
+                self.evict()
+        except sqlite3.Error as e:
+            mainLogger.warning('Persistent cache write failed [path="%s", error="%s"]', self.path, e)
+
+    def evict(self) -> None:
+        """Remove the expired entries, and the least recently accessed ones while the size limit is exceeded."""
+        connection = self._connection()
+        with connection:
+            connection.execute('DELETE FROM entries WHERE expires < ?', (time.time() - self.grace,))
+            size = connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            while size > self.max_size:
+                rows = connection.execute('SELECT key, size FROM entries ORDER BY accessed LIMIT 256').fetchall()
+                if not rows:
+                    break
+                keys = []
+                for key, entry_size in rows:
+                    keys.append((key,))
+                    size -= entry_size
+                    if size <= self.max_size:
+                        break
+                connection.executemany('DELETE FROM entries WHERE key = ?', keys)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._connection() as connection:
+            connection.execute('DELETE FROM entries')
+
+
+class TieredCache:
+    """A cache of byte strings with an in-process first tier and an (optional) persistent second tier.
+
+    Values found (fresh) only in the second tier are promoted to the first one, for their remaining time-to-live.
+
+    Attributes:
+        first (LRUCache): The in-process cache.
+        second (SQLiteCache): The persistent cache (None if not configured).
+    """
+
+    def __init__(self, first: LRUCache, second: SQLiteCache=None):
+        self.first = first
+        self.second = second
+
+    def get(self, key: str, default=None):
+        """Get a value from the cache, or `default` if missing or expired."""
+        value, expires_in = self.lookup(key)
+        if value is None or (expires_in is not None and expires_in <= 0):
+            return default
+        return value
+
+    def lookup(self, key: str) -> tuple:
+        """Look up an entry, including a stale one; a fresh entry of any tier is preferred.
+
+        Returns:
+            (tuple) The value (None if missing) and the seconds until its expiration (negative if stale, None if it never expires).
+        """
+        value, expires_in = self.first.lookup(key)
+        if (value is None or (expires_in is not None and expires_in <= 0)) and self.second is not None:
+            second_value, second_expires_in = self.second.lookup(key)
+            if second_value is not None and (second_expires_in is None or second_expires_in > 0):
+                self.first.set(key, second_value, ttl=second_expires_in)
+                return second_value, second_expires_in
+            if value is None:
+                return second_value, second_expires_in
+        return value, expires_in
+
+    def set(self, key: str, value: bytes, ttl: float=None) -> None:
+        """Store a value in both tiers."""
+        self.first.set(key, value, ttl=ttl)
+        if self.second is not None:
+            self.second.set(key, value, ttl=ttl)
+
+
+_persistent = None
+
+def get_persistent_cache():
+    """Get the persistent cache configured by the environment (see the module description).
+
+    Returns:
+        (SQLiteCache) The cache, or None if not configured.
+    """
+    global _persistent
+    path = os.getenv('PERSISTENT_CACHE')
+    if not path:
+        return None
+    namespace = tileset_version()
+    with _caches_lock:
+        if _persistent is None or _persistent.path != path or _persistent.namespace != namespace:
+            _persistent = SQLiteCache(path, max_size=int(float(os.getenv('PERSISTENT_CACHE_SIZE', 512)) * 2 ** 20), namespace=namespace, ttl=float(os.getenv('CACHE_TTL', 3600)), grace=float(os.getenv('CACHE_STALE', 0)))
+            mainLogger.info('Opened persistent cache [path="%s", namespace="%s"]', path, namespace)
+        return _persistent
+
+def get_tiered_cache(name: str) -> TieredCache:
+    """Get a named in-process cache, backed by the persistent cache (if configured).
+
+    Arguments:
+        name (str): The name of the in-process cache.
+
+    Returns:
+        (TieredCache) The cache.
+    """
+    return TieredCache(get_cache(name), get_persistent_cache())
+
+def operation_ttl(operation: str) -> float:
+    """Get the time-to-live of the cached results of an operation type (e.g. 'route', 'isoline', 'trace', 'matrix').
+
+    It is configured by the environment variable `CACHE_TTL_<OPERATION>`, falling back to `CACHE_TTL`.
+
+    Returns:
+        (float) The time-to-live in seconds.
+    """
+    return float(os.getenv('CACHE_TTL_' + operation.upper(), os.getenv('CACHE_TTL', 3600)))
+
+
+_refreshing = set()
+_refresh_lock = threading.Lock()
+_refresh_executor = None
+_refresh_pid = None
+
+def revalidate(key: str, function) -> bool:
+    """Refresh a stale entry in the background, unless a refresh of the same key is already running (in this process).
+
+    Arguments:
+        key (str): The cache key.
+        function (callable): Computes the fresh value and stores it in the cache.
+
+    Returns:
+        (bool) Whether a refresh was started.
+    """
+    global _refresh_executor, _refresh_pid
+    with _refresh_lock:
+        # Worker threads do not survive forking (e.g. of preloaded gunicorn workers)
+        if _refresh_executor is None or _refresh_pid != os.getpid():
+            _refresh_executor = ThreadPoolExecutor(max_workers=int(os.getenv('CACHE_REFRESH_WORKERS', 2)), thread_name_prefix='cache-refresh')
+            _refresh_pid = os.getpid()
+            _refreshing.clear()
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+    def refresh():
+        try:
+            function()
+        except Exception as e:
+            mainLogger.warning('Cache refresh failed [key="%s", error="%s"]', key, e)
+        finally:
+            with _refresh_lock:
+                _refreshing.discard(key)
+    _refresh_executor.submit(refresh)
+    return True
@@ -10,7 +10,61 @@ def create_doc(path):
         path (str): Destination of documentation file (including filename).
     """
     import json
-    from transport_service import spec
+    from transport_service import get_spec
     with open(path, 'w') as specfile:
-        json.dump(spec.to_dict(), specfile)
+        json.dump(get_spec(app._get_current_object()), specfile)
     print("Wrote OpenAPI specification to {path}.".format(path=path))
+
+@app.cli.command()
+@click.argument("config")
+@click.argument("path")
+@click.option("--workers", default=4, help="Number of concurrent requests to Valhalla.")
+def build_isoline_store(config, path, workers):
+    """Precompute isolines over a lattice of origins.
+
+    Arguments:
+        config (str): The store configuration file (JSON).
+        path (str): The store directory.
+    """
+    import json
+    from transport_service.cache import tileset_version
+    from transport_service.api.valhalla import Valhalla
+    from transport_service.api.isoline_store import build_store
+
+    valhalla = Valhalla()
+    valhalla.checkTileset(force=True)
+    def compute(profile, lat, lon):
+        operation = valhalla.isochrone if profile['metric'] == 'time' else valhalla.isodistance
+        result, status = operation(lat, lon, range_=profile['range'], costing=profile['costing'], polygons=profile['polygons'], denoise=profile['denoise'])
+        return result if status == 200 else None
+
+    with open(config) as configfile:
+        config = json.load(configfile)
+    version = tileset_version() or None
+    origins = build_store(path, config, compute, workers=workers, version=version)
+    print("Wrote isoline store with {origins} origins (tileset version {version}) to {path}.".format(origins=origins, version=version, path=path))
+
+@app.cli.command()
+@click.argument("path")
+@click.option("--top", default=100, help="Number of most frequent requests to replay.")
+@click.option("--url", default=None, help="Base URL of a running deployment to send the requests to (default: handled in-process, warming the persistent cache).")
+def warm_cache(path, top, url):
+    """Replay the most frequent requests of a request file or access log, so that the caches are hot.
+
+    Arguments:
+        path (str): The requests file (see `transport_service.warmup`).
+    """
+    import requests
+    from transport_service.warmup import read_requests
+
+    client = app.test_client() if url is None else None
+    succeeded = 0
+    entries = read_requests(path, top=top)
+    for request, count in entries:
+        if client is not None:
+            status = client.open(request['path'], method=request['method'], query_string=request['query'], json=request['json']).status_code
+        else:
+            status = requests.request(request['method'], url.rstrip('/') + request['path'], params=request['query'], json=request['json']).status_code
+        succeeded += status == 200
+        print("{status} {method} {path} (x{count})".format(status=status, count=count, **request))
+    print("Replayed {n} requests ({succeeded} succeeded).".format(n=len(entries), succeeded=succeeded))
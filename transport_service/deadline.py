@@ -0,0 +1,80 @@
+"""Request deadlines.
+
+The deadline of a request is taken from its `X-Request-Timeout` header (in seconds), capped by the default timeout of its class (`REQUEST_TIMEOUT_<CLASS>`, for the classes of `transport_service.bulkhead`) or of all requests (`REQUEST_TIMEOUT`). Its remaining budget bounds the requests to Valhalla; once passed, the handling of the request stops with *504 Gateway Timeout*.
+"""
+
+import os
+import math
+import time
+from contextvars import ContextVar
+from .logging import mainLogger
+
+HEADER = 'X-Request-Timeout'
+
+_deadline = ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the deadline of the request has passed."""
+
+
+def set_timeout(timeout: float) -> None:
+    """Set the deadline of the current context, `timeout` seconds from now (None for no deadline)."""
+    _deadline.set(time.monotonic() + timeout if timeout is not None else None)
+
+
+def remaining() -> float:
+    """The remaining time until the deadline in seconds (None if there is no deadline)."""
+    deadline = _deadline.get()
+    return deadline - time.monotonic() if deadline is not None else None
+
+
+def check() -> None:
+    """Stop if the deadline has passed.
+
+    Raises:
+        DeadlineExceeded: If the deadline has passed.
+    """
+    budget = remaining()
+    if budget is not None and budget <= 0:
+        raise DeadlineExceeded()
+
+
+def default_timeout(request_class: str=None) -> float:
+    """The default timeout (in seconds) of a request class, or of all requests (None if not set)."""
+    timeout = os.getenv('REQUEST_TIMEOUT_' + request_class.upper()) if request_class is not None else None
+    timeout = timeout or os.getenv('REQUEST_TIMEOUT')
+    return float(timeout) if timeout else None
+
+
+def init_app(app):
+    """Set the deadline of the requests of a Flask app.
+
+    Arguments:
+        app (Flask): The app.
+    """
+    from flask import request, make_response
+    from .bulkhead import request_class
+
+    @app.before_request
+    def start_deadline():
+        timeout = default_timeout(request_class())
+        header = request.headers.get(HEADER)
+        if header:
+            try:
+                requested = float(header)
+            except ValueError:
+                return make_response({HEADER: ['Not a number.']}, 400)
+            if not math.isfinite(requested) or requested <= 0:
+                return make_response({HEADER: ['Must be a positive number.']}, 400)
+            timeout = min(requested, timeout) if timeout is not None else requested
+        set_timeout(timeout)
+
+    @app.teardown_request
+    def end_deadline(error=None):
+        _deadline.set(None)
+
+    @app.errorhandler(DeadlineExceeded)
+    def handle_deadline_exceeded(ex):
+        mainLogger.warning('Request deadline exceeded [path="%s"]', request.path)
+        return make_response({'error': 'Deadline exceeded.'}, 504)
@@ -0,0 +1,157 @@
+"""Service metrics, exposed (if the environment variable `METRICS` is `true`) in the Prometheus text format by `GET /metrics`.
+
+Metrics are kept per worker process; each one is exposed with a *pid* label, so that the metrics of the workers can be told apart (and summed) when scraped through the same address.
+"""
+
+import os
+import threading
+from flask import Blueprint, make_response
+
+
+class Metric:
+    """A metric with labeled values.
+
+    Attributes:
+        name (str): The metric name.
+        description (str): The metric help text.
+        type (str): The Prometheus metric type.
+    """
+
+    type = 'untyped'
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, **labels) -> float:
+        """Get the value of a label set."""
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self) -> list:
+        """Get the (name, labels, value) samples of the metric."""
+        with self._lock:
+            return [(self.name, dict(labels), value) for labels, value in self._values.items()]
+
+
+class Counter(Metric):
+    """A monotonically increasing metric."""
+
+    type = 'counter'
+
+    def inc(self, amount: float=1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A metric that can go up and down."""
+
+    type = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def inc(self, amount: float=1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float=1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """A metric counting observations (e.g. durations in seconds) in cumulative buckets.
+
+    Attributes:
+        buckets (tuple): The upper bounds of the buckets.
+    """
+
+    type = 'histogram'
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name: str, description: str, buckets: tuple=BUCKETS):
+        super().__init__(name, description)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # The bucket counts, followed by the sum and the count of the observations
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def get(self, **labels) -> float:
+        """Get the count of the observations of a label set."""
+        counts = self._values.get(tuple(sorted(labels.items())))
+        return counts[-1] if counts is not None else 0
+
+    def samples(self) -> list:
+        samples = []
+        with self._lock:
+            for labels, counts in self._values.items():
+                labels = dict(labels)
+                for bound, count in zip(self.buckets, counts):
+                    samples.append((self.name + '_bucket', {**labels, 'le': bound}, count))
+                samples.append((self.name + '_bucket', {**labels, 'le': '+Inf'}, counts[-1]))
+                samples.append((self.name + '_sum', labels, counts[-2]))
+                samples.append((self.name + '_count', labels, counts[-1]))
+        return samples
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def _register(cls, name: str, description: str, **kwargs):
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = cls(name, description, **kwargs)
+        return _registry[name]
+
+def counter(name: str, description: str) -> Counter:
+    """Get (or register) a counter."""
+    return _register(Counter, name, description)
+
+def gauge(name: str, description: str) -> Gauge:
+    """Get (or register) a gauge."""
+    return _register(Gauge, name, description)
+
+def histogram(name: str, description: str, buckets: tuple=Histogram.BUCKETS) -> Histogram:
+    """Get (or register) a histogram."""
+    return _register(Histogram, name, description, buckets=buckets)
+
+
+def _format_labels(labels: dict) -> str:
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in sorted(labels.items())) + '}'
+
+def exposition() -> str:
+    """Render the registered metrics in the Prometheus text format."""
+    pid = os.getpid()
+    lines = []
+    with _registry_lock:
+        metrics = list(_registry.values())
+    for metric in metrics:
+        lines.append('# HELP {} {}'.format(metric.name, metric.description))
+        lines.append('# TYPE {} {}'.format(metric.name, metric.type))
+        for name, labels, value in metric.samples():
+            lines.append('{}{} {}'.format(name, _format_labels({**labels, 'pid': pid}), value))
+    return '\n'.join(lines) + '\n'
+
+
+bp = Blueprint('metrics', __name__)
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose the metrics of this worker in the Prometheus text format."""
+    return make_response(exposition(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
@@ -0,0 +1,205 @@
+"""Statistical profiling of slow requests.
+
+While a profiled request is being handled, a background thread samples the stack of the thread handling it at a fixed interval; the samples are aggregated as collapsed stacks (`frame;frame;... count`, the input format of flame graph tools). A request is profiled if it is randomly sampled (with probability `PROFILING_RATE`), or, when `PROFILING_THRESHOLD` is set, always, being kept only if it lasted longer than the threshold. The most recent kept profiles are held in a ring buffer of each worker process, exposed through the admin endpoints (requiring the `ADMIN_TOKEN` bearer token):
+
+- `GET /admin/profiles`: the profiles (without stacks), slowest first,
+- `GET /admin/profiles/<id>`: the collapsed stacks of a profile, as plain text.
+"""
+
+import os
+import hmac
+import sys
+import time
+import random
+import threading
+from collections import Counter, deque
+from itertools import count
+from flask import Blueprint, g, request, make_response
+from .logging import mainLogger
+
+
+def collapse(frame) -> str:
+    """Collapse a stack (from the outermost frame to the given one) to a string of frames separated by semicolons."""
+    frames = []
+    while frame is not None:
+        frames.append('{}:{}'.format(frame.f_globals.get('__name__', '?'), frame.f_code.co_name))
+        frame = frame.f_back
+    return ';'.join(reversed(frames))
+
+
+class Sampler:
+    """Samples periodically the stacks of the registered threads.
+
+    Attributes:
+        interval (float): The sampling interval in seconds.
+    """
+
+    def __init__(self, interval: float=0.005):
+        self.interval = interval
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_running(self):
+        # The sampling thread does not survive forking (e.g. of preloaded gunicorn workers), thus it is started per process
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._threads:
+                    continue
+                frames = sys._current_frames()
+                for ident, stacks in self._threads.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[collapse(frame)] += 1
+
+    def start(self, ident: int=None) -> Counter:
+        """Start sampling a thread (default: the current thread).
+
+        Returns:
+            (Counter) The collapsed stacks of the thread, updated with the samples until `stop` is called.
+        """
+        stacks = Counter()
+        with self._lock:
+            self._ensure_running()
+            self._threads[ident or threading.get_ident()] = stacks
+        return stacks
+
+    def stop(self, ident: int=None):
+        """Stop sampling a thread (default: the current thread)."""
+        with self._lock:
+            self._threads.pop(ident or threading.get_ident(), None)
+
+
+class ProfileBuffer:
+    """A ring buffer of request profiles.
+
+    Attributes:
+        size (int): The maximum number of profiles.
+    """
+
+    def __init__(self, size: int=20):
+        self.size = size
+        self._profiles = deque(maxlen=size)
+        self._ids = count(1)
+        self._lock = threading.Lock()
+
+    def add(self, profile: dict) -> dict:
+        """Add a profile (evicting the oldest one, if full); an *id* is assigned to it."""
+        with self._lock:
+            profile['id'] = next(self._ids)
+            self._profiles.append(profile)
+        return profile
+
+    def list(self) -> list:
+        """Get the profiles, slowest first."""
+        with self._lock:
+            profiles = list(self._profiles)
+        return sorted(profiles, key=lambda profile: profile['duration_ms'], reverse=True)
+
+    def get(self, id_: int) -> dict:
+        """Get a profile by id (None if not in the buffer)."""
+        with self._lock:
+            return next((profile for profile in self._profiles if profile['id'] == id_), None)
+
+
+_buffer = ProfileBuffer()
+
+bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+def _unauthorized():
+    """Check the admin token of the request.
+
+    Returns:
+        (Response) The error response, or None if authorized.
+    """
+    token = os.getenv('ADMIN_TOKEN')
+    if not token:
+        return make_response({'error': 'Not found.'}, 404)
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), ('Bearer ' + token).encode()):
+        return make_response({'error': 'Unauthorized.'}, 401, {'WWW-Authenticate': 'Bearer'})
+    return None
+
+@bp.route('/profiles', methods=['GET'])
+def profiles():
+    """List the kept request profiles (without stacks), slowest first."""
+    error = _unauthorized()
+    if error is not None:
+        return error
+    return make_response({'profiles': [{attr: value for attr, value in profile.items() if attr != 'stacks'} for profile in _buffer.list()]}, 200)
+
+@bp.route('/profiles/<int:id_>', methods=['GET'])
+def profile(id_):
+    """Get the collapsed stacks of a request profile."""
+    error = _unauthorized()
+    if error is not None:
+        return error
+    profile = _buffer.get(id_)
+    if profile is None:
+        return make_response({'error': 'Profile not found.'}, 404)
+    stacks = '\n'.join('{} {}'.format(stack, samples) for stack, samples in profile['stacks'].most_common())
+    return make_response(stacks + '\n', 200, {'Content-Type': 'text/plain; charset=utf-8'})
+
+
+def init_app(app):
+    """Profile the requests of a Flask app, configured by the environment.
+
+    Environment:
+        PROFILING_RATE (float): The fraction of requests profiled (default: 0.01).
+        PROFILING_THRESHOLD (float): The duration in milliseconds above which all requests are profiled (default: not set).
+        PROFILING_INTERVAL (float): The sampling interval in milliseconds (default: 5).
+        PROFILING_BUFFER (int): The number of profiles kept (default: 20).
+
+    Arguments:
+        app (Flask): The app.
+    """
+    global _buffer
+    rate = float(os.getenv('PROFILING_RATE', 0.01))
+    threshold = os.getenv('PROFILING_THRESHOLD')
+    threshold = float(threshold) if threshold else None
+    sampler = Sampler(interval=float(os.getenv('PROFILING_INTERVAL', 5)) / 1000)
+    _buffer = ProfileBuffer(size=int(os.getenv('PROFILING_BUFFER', 20)))
+    mainLogger.info('Enabled profiling [rate=%s, threshold=%s]', rate, threshold)
+
+    @app.before_request
+    def start_profile():
+        if request.blueprint == 'admin':
+            return
+        sampled = random.random() < rate
+        if sampled or threshold is not None:
+            g.profile = (sampled, time.time(), time.perf_counter(), sampler.start())
+
+    @app.after_request
+    def tag_profile(response):
+        if g.get('profile') is not None:
+            g.profile_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def end_profile(error=None):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        sampler.stop()
+        sampled, start, perf_start, stacks = profile
+        duration = (time.perf_counter() - perf_start) * 1000
+        if sampled or duration >= threshold:
+            _buffer.add({
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status_code': g.get('profile_status'),
+                'start': start,
+                'duration_ms': round(duration, 3),
+                'samples': sum(stacks.values()),
+                'stacks': stacks
+            })
+
+    app.register_blueprint(bp)
@@ -0,0 +1,254 @@
+"""Request tracing.
+
+Each request is traced by a root span, with child spans for the form validation, the payload shaping, each Valhalla call and the response serialization. The trace context is read from the W3C `traceparent` header of the incoming request (if any) and propagated to Valhalla.
+
+Finished spans are handed to an exporter, configured by the environment variable `TRACING_EXPORTER`:
+
+- `log`: spans are logged (as JSON) by the `<APP_NAME>.tracing` logger,
+- `file`: spans are appended (as JSON lines) to the file given by `TRACING_FILE`,
+- `<module>:<class>`: spans are exported by an instance of a custom class, having an `export(span)` method (taking the span as dictionary).
+
+If not set (or `none`), tracing is disabled.
+"""
+
+import os
+import re
+import json
+import time
+import random
+import threading
+import importlib
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import wraps
+from .logging import mainLogger
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_current = ContextVar('span', default=None)
+
+
+class Span:
+    """A timed operation of a trace.
+
+    Attributes:
+        name (str): The operation name.
+        trace_id (str): The trace identifier (32 hex digits).
+        span_id (str): The span identifier (16 hex digits).
+        parent_id (str): The identifier of the parent span (None for root spans without remote parent).
+        attributes (dict): Attributes of the operation.
+        error (str): The error raised in the span (if any).
+    """
+
+    def __init__(self, name: str, trace_id: str=None, parent_id: str=None, **attributes):
+        self.name = name
+        self.trace_id = trace_id or '%032x' % random.getrandbits(128)
+        self.span_id = '%016x' % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.error = None
+        self.start = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+
+    @property
+    def traceparent(self) -> str:
+        """The W3C `traceparent` header value, for propagating the span as parent."""
+        return '00-{}-{}-01'.format(self.trace_id, self.span_id)
+
+    def set(self, **attributes):
+        """Set attributes of the span."""
+        self.attributes.update(attributes)
+
+    def finish(self):
+        """End the span and export it."""
+        self.duration = time.perf_counter() - self._start
+        exporter = get_exporter()
+        if exporter is not None:
+            try:
+                exporter.export(self.to_dict())
+            except Exception as e:
+                mainLogger.warning('Failed to export span [name="%s", error="%s"]', self.name, e)
+
+    def to_dict(self) -> dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+class LogExporter:
+    """Logs the spans as JSON."""
+
+    def __init__(self):
+        self.logger = mainLogger.getChild('tracing')
+
+    def export(self, span: dict):
+        self.logger.info(json.dumps(span))
+
+
+class FileExporter:
+    """Appends the spans as JSON lines to a file.
+
+    Attributes:
+        path (str): The file path.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: dict):
+        line = json.dumps(span) + '\n'
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line)
+
+
+_exporter = None
+_exporter_config = None
+_exporter_lock = threading.Lock()
+
+def get_exporter():
+    """Get the exporter configured by the environment.
+
+    Raises:
+        ValueError: If the environment variable `TRACING_EXPORTER` has an invalid value.
+
+    Returns:
+        (object) The exporter, or None if tracing is disabled.
+    """
+    global _exporter, _exporter_config
+    config = (os.getenv('TRACING_EXPORTER', 'none'), os.getenv('TRACING_FILE'))
+    if config == _exporter_config:
+        return _exporter
+    with _exporter_lock:
+        name, path = config
+        if name == 'none':
+            exporter = None
+        elif name == 'log':
+            exporter = LogExporter()
+        elif name == 'file':
+            if not path:
+                raise ValueError('TRACING_FILE is required for the "file" tracing exporter.')
+            exporter = FileExporter(path)
+        elif ':' in name:
+            module, attr = name.split(':', 1)
+            exporter = getattr(importlib.import_module(module), attr)()
+        else:
+            raise ValueError('Invalid tracing exporter "{}".'.format(name))
+        _exporter, _exporter_config = exporter, config
+        return exporter
+
+
+def enabled() -> bool:
+    """Whether tracing is enabled."""
+    return get_exporter() is not None
+
+
+def current_span():
+    """Get the active span (None if not tracing)."""
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Trace an operation as child of the active span.
+
+    Nothing is traced (and None is yielded) if there is no active span.
+
+    Yields:
+        (Span) The span.
+    """
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, trace_id=parent.trace_id, parent_id=parent.span_id, **attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.error = '{}: {}'.format(type(e).__name__, e)
+        raise
+    finally:
+        _current.reset(token)
+        child.finish()
+
+
+def traced(name: str):
+    """Decorator tracing each call of a function as a span."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def propagate(function):
+    """Wrap a function, so that it runs in (a copy of) the current context, i.e. as part of the active span and within the request deadline (e.g. when submitted to a thread pool)."""
+    context = copy_context()
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        # A context cannot be entered by concurrent calls, thus each one runs in its own copy
+        return context.copy().run(function, *args, **kwargs)
+    return wrapper
+
+
+def headers() -> dict:
+    """The headers propagating the active span to an upstream service."""
+    active = _current.get()
+    return {'traceparent': active.traceparent} if active is not None else {}
+
+
+def init_app(app):
+    """Trace the requests of a Flask app.
+
+    Arguments:
+        app (Flask): The app.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def start_trace():
+        if not enabled():
+            return
+        match = TRACEPARENT.match(request.headers.get('traceparent', '').strip().lower())
+        trace_id, parent_id = (match.group(1), match.group(2)) if match else (None, None)
+        rule = request.url_rule.rule if request.url_rule is not None else request.path
+        root = Span('{} {}'.format(request.method, rule), trace_id=trace_id, parent_id=parent_id, method=request.method, path=request.path)
+        _current.set(root)
+        g.trace = root
+
+    @app.after_request
+    def tag_trace(response):
+        root = g.get('trace')
+        if root is not None:
+            root.set(status_code=response.status_code)
+        return response
+
+    @app.teardown_request
+    def end_trace(error=None):
+        root = g.pop('trace', None)
+        if root is None:
+            return
+        if error is not None:
+            root.error = '{}: {}'.format(type(error).__name__, error)
+        _current.set(None)
+        root.finish()
+
+    make_response = app.make_response
+    def traced_make_response(rv):
+        if isinstance(rv, app.response_class):
+            return make_response(rv)
+        with span('serialize'):
+            return make_response(rv)
+    app.make_response = traced_make_response
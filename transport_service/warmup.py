@@ -0,0 +1,68 @@
+"""Selection of the requests replayed to warm the caches.
+
+Requests are read from a file of one request per line, either:
+
+- JSON lines, with the attributes *method* (default: GET), *path*, *query* (object or query string) and *json* (the request body), e.g. `{"method": "GET", "path": "/isoline/isochrone", "query": {"lat": 37.97, "lon": 23.72, "range-0": 10}}`,
+- access log lines (e.g. of gunicorn or nginx), from which the GET requests (`"GET /path?query HTTP/1.1"`) are taken.
+
+Identical requests are counted, and the most frequent are replayed first.
+"""
+
+import re
+import json
+from collections import Counter
+from urllib.parse import urlsplit, parse_qsl
+
+ACCESS_LOG_REQUEST = re.compile(r'"GET (\S+) HTTP/[0-9.]+"')
+
+
+def parse_line(line: str) -> dict:
+    """Parse a request line.
+
+    Returns:
+        (dict) The request (*method*, *path*, *query* as list of pairs, *json*), or None if the line is not a request.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith('{'):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(entry, dict) or 'path' not in entry:
+            return None
+        query = entry.get('query') or []
+        if isinstance(query, str):
+            query = parse_qsl(query)
+        elif isinstance(query, dict):
+            query = [(name, value) for name, values in query.items() for value in (values if isinstance(values, list) else [values])]
+        return {'method': entry.get('method', 'GET').upper(), 'path': entry['path'], 'query': [(str(name), str(value)) for name, value in query], 'json': entry.get('json')}
+    match = ACCESS_LOG_REQUEST.search(line)
+    if match is None:
+        return None
+    url = urlsplit(match.group(1))
+    return {'method': 'GET', 'path': url.path, 'query': parse_qsl(url.query), 'json': None}
+
+
+def read_requests(path: str, top: int=None) -> list:
+    """Read the most frequent requests of a file.
+
+    Arguments:
+        path (str): The requests file.
+        top (int): The number of requests to keep (default: all).
+
+    Returns:
+        (list) The distinct requests (see `parse_line`) with their count, most frequent first.
+    """
+    counts = Counter()
+    requests = {}
+    with open(path) as f:
+        for line in f:
+            request = parse_line(line)
+            if request is None:
+                continue
+            key = json.dumps(request, sort_keys=True)
+            counts[key] += 1
+            requests.setdefault(key, request)
+    return [(requests[key], count) for key, count in counts.most_common(top)]